@@ -1,4 +1,5 @@
 # Python Library Packages
+import heapq
 import networkx as nx
 import random as rand
 from random import choice
@@ -6,6 +7,7 @@ import copy
 import simengine as engine
 import simhelper as helper
 import simdefaults as defaults
+import graph_stats
 import random
 
 
@@ -53,6 +55,10 @@ spontaneous_forget_chance = 0.01  #Chance for node to forget
 spontaneous_acquisition = True  #Set to true - this is like a person getting the gossip from an outside source
 spontaneous_acquisition_chance = 0.01 #the internet exists!
 
+# Key under graph.graph where popularity_ranks keeps the popular and unpopular
+# nodes, with the node and edge counts they were found for
+POPULARITY_KEY = 'adv_gossip_config.popularity'
+
 # Whether or not a graph is considered finished if,
 # when spontaneous acquisition is not occurring,
 # information has spread to all nodes that can become
@@ -192,25 +198,42 @@ def get_pop_and_unpop_nodes(dict_cent):
      # get num for 10% of nodes
      ten_per_nodes = int(num_nodes * .1)
 
-     pop_nodes = dict()
-     unpop_nodes = dict()
+     # One selection each; ties go to the node listed first, as repeated
+     # min() / max() calls would pick them
+     pop_nodes = dict((node, dict_cent[node]) for node in heapq.nsmallest(ten_per_nodes, dict_cent, key=dict_cent.get))
+     unpop_nodes = dict((node, dict_cent[node]) for node in heapq.nlargest(ten_per_nodes, dict_cent, key=dict_cent.get))
 
-     for i in range(num_nodes):
-         if i < ten_per_nodes:
-             found_node = min(dict_cent, key=dict_cent.get)
-             pop_nodes[found_node] = dict_cent[found_node]
-             del dict_cent[found_node]
-     dict_cent.update(pop_nodes)
+     return pop_nodes, unpop_nodes
 
-     for i in range(num_nodes):
-         if i < ten_per_nodes:
-             found_node = max(dict_cent, key=dict_cent.get)
-             unpop_nodes[found_node] = dict_cent[found_node]
-             del dict_cent[found_node]
 
-     return pop_nodes, unpop_nodes
+####################################################################################
 
 
+
+####################################################################################
+'''
+Returns the popular and unpopular nodes of a graph (see get_pop_and_unpop_nodes).
+They are found once per graph and kept under graph.graph, so every start node and
+run reuses them; graph copies carry them along. They are found again if the
+number of nodes or edges has changed since.
+    Args:
+        graph: A networkx graph instance
+    Returns:
+        pop_nodes: A dictionary of the popular nodes
+        unpop_nodes: A dictionary of the unpopular nodes
+'''
+####################################################################################
+def popularity_ranks(graph):
+   stamp = (graph_stats.number_of_nodes(graph), graph_stats.number_of_edges(graph))
+   cached = graph.graph.get(POPULARITY_KEY)
+   if cached is None or cached[0] != stamp:
+      pop_nodes = dict()
+      unpop_nodes = dict()
+      if stamp[0] >= 3:
+         pop_nodes, unpop_nodes = get_pop_and_unpop_nodes(nx.degree_centrality(graph))
+      cached = (stamp, pop_nodes, unpop_nodes)
+      graph.graph[POPULARITY_KEY] = cached
+   return cached[1], cached[2]
 ####################################################################################
 
 
@@ -232,20 +255,13 @@ they are popular
 def set_talk_to_transmit_val(graph, node):
 
    attributes = []
-   dict_cent = nx.degree_centrality(graph)
-   num_nodes = len(dict_cent)
-
-   pop_nodes = dict()
-   unpop_nodes = dict()
+   pop_nodes, unpop_nodes = popularity_ranks(graph)
 
    if is_the_gossip_serious:
        transmit_chance = .5
    else:
        transmit_chance = .3
 
-   if num_nodes >= 3:
-      pop_nodes, unpop_nodes = get_pop_and_unpop_nodes(dict_cent = dict_cent)
-
    # grade
    r_n = random.randrange(0,13)
 
@@ -312,7 +328,7 @@ A logically sound place to put data processing is at the end of this method.
 ####################################################################################
 def simulation_driver():
     # Read in a graph
-    graph = nx.read_graphml('gosspp.graphml')
+    graph = helper.read_graph('gosspp.graphml')
     helper.output_graph_information(graph)
     type_of_gossip = gossip_type_determination()
     death_sc = False
@@ -331,6 +347,8 @@ def simulation_driver():
              if(print_round_output):
                  print(n + " won't pass gossip about themself.")
              continue
+    # Rank popularity once; every copy below starts with the ranks
+    popularity_ranks(graph)
     for n in graph.node:
         graphcopy = copy.deepcopy(graph)
 
@@ -737,11 +755,11 @@ def init(graph, node, sim_name):
    dict = nx.get_edge_attributes(graph, 'weight')
 
    # Write 1 weight to all edges
-   nx.set_edge_attributes(graph, 'weight', 1)
+   helper.create_edge_attribute(graph, 'weight', 1)
 
    # Restore initial edges
    for n1,n2 in dict:
-      graph.edge[n1][n2]['weight'] = dict[n1,n2]
+      helper.create_single_edge_attribute(graph, n1, n2, 'weight', dict[n1,n2])
 
 
    # Set an specific node
@@ -161,7 +161,7 @@ def simulation_driver():
     else:
         global num_nodes
         # Read in a graph
-        graph = nx.read_graphml('custom_graphs/xsmall_zombie_adv.graphml')
+        graph = helper.read_graph('custom_graphs/xsmall_zombie_adv.graphml')
         helper.output_graph_information(graph)
         num_nodes = helper.num_nodes(graph)
     
@@ -216,7 +216,7 @@ Runs a game where you can select a node to infect and watch the outcome.
 def zsim_game_runner():
    print '*' * 35 + '\nDESTROY ALL HUMANS IF POSSIBLE\n' + '*' * 35
    print 'The list of all nodes and their betweenness centrality: '
-   graph_game = nx.read_graphml('custom_graphs/small_zombie_adv.graphml')
+   graph_game = helper.read_graph('custom_graphs/small_zombie_adv.graphml')
    betweenness_dict = helper.betweenness_centrality(graph_game)
    helper.print_iterable_linebreak(helper.sort_dict_descending(betweenness_dict))
    node_selected = -1
@@ -429,7 +429,7 @@ def on_not_flagged(graph, graph_copy, node, run_name):
         handle_find_food(graph, node)
 
     # Deal with neighbors
-    for neighbor in nx.all_neighbors(graph, node):
+    for neighbor in helper.get_unique_neighbors_list(graph, node):
         if not graph.node[neighbor]['infected']:
             human_human_interaction(graph, node, neighbor, run_name)
             # If ever our currently considered node is dead, return
@@ -599,7 +599,7 @@ def will_spread(source, dest, graph, run_name):
         human_neighbor_count = 0
         zombie_neighbor_count = 0
 
-        for neighbor in nx.all_neighbors(graph, dest):
+        for neighbor in helper.get_unique_neighbors_list(graph, dest):
             if (graph.node[neighbor]['infected']):
                 zombie_neighbor_count += 1
             else:
@@ -754,11 +754,11 @@ def init(graph, node, sim_name):
     dict = nx.get_edge_attributes(graph, 'weight')
     
     # Write 1 weight to all edges
-    nx.set_edge_attributes(graph, 'weight', 1)
+    helper.create_edge_attribute(graph, 'weight', 1)
     
     # Restore initial edges
     for n1,n2 in dict:
-        graph.edge[n1][n2]['weight'] = dict[n1,n2]
+        helper.create_single_edge_attribute(graph, n1, n2, 'weight', dict[n1,n2])
     
     
     # Set a specific node
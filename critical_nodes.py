@@ -0,0 +1,281 @@
+import heapq
+import multiprocessing
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+import graph_index
+import graph_metrics
+import iot_spy as config
+import simengine as engine
+
+
+
+# Data collection dictionaries of iot_spy that a simulated evaluation must not touch
+COUNTER_NAMES = ['total_broadcasts_sent', 'total_broadcasts_received_successfully',
+                 'total_broadcasts_received_overall', 'total_interference_failures',
+                 'current_broadcasts_sent', 'current_broadcasts_received_successfully',
+                 'current_broadcasts_received_overall', 'current_interference_failures']
+
+
+
+####################################################################################
+'''
+Finds a small set of devices whose removal pushes the information spread of an IoT
+graph below a threshold. Candidates come from candidate_nodes, and devices are
+chosen greedily, each time the one whose removal lowers the spread the most, with
+lazy (CELF) re-evaluation: a candidate's last measured drop is kept in a priority
+queue and only the candidates at the top are measured again after each choice,
+since a drop measured earlier is taken as an upper bound of the drop now. The
+stale candidates at the top are measured a batch at a time on a pool of processes;
+the batch size, not the number of processes, decides which are measured, so the
+result does not depend on the pool. The search stops early if the candidates run
+out.
+    Args:
+        graph: A networkx graph instance.
+        threshold: The spread to get below (iot_spy.graph_disconnect_level_threshold
+                   if None)
+        candidates: The devices to choose from, or None for candidate_nodes
+        num_candidates: How many top devices of each heuristic candidate_nodes takes
+        traffic: A dictionary of per-device traffic for candidate_nodes, or None
+        spread: 'reachability' (reachability_spread) or 'simulation'
+                (simulated_spread), the spread every removal set is measured with
+        processes: The number of worker processes (all CPUs if None, serial if 1)
+        max_removals: The most devices to remove, or None for no limit
+        seed: The seed of the sampled betweenness in candidate_nodes
+        batch_size: The most stale candidates measured together
+
+    Returns:
+        A tuple of the devices removed, in the order chosen, the spread after each
+        removal, and the number of spreads measured
+'''
+####################################################################################
+def find_critical_nodes(graph, threshold=None, candidates=None, num_candidates=20, traffic=None,
+                        spread='reachability', processes=None, max_removals=None, seed=None, batch_size=8):
+    if threshold is None:
+        threshold = config.graph_disconnect_level_threshold
+    if candidates is None:
+        candidates = candidate_nodes(graph, num_candidates, traffic, seed)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes == 1:
+        _init_worker(graph, spread)
+        try:
+            return _lazy_greedy(map, candidates, threshold, max_removals, batch_size)
+        finally:
+            _init_worker(None, None)
+    pool = multiprocessing.Pool(processes, _init_worker, (graph, spread))
+    try:
+        return _lazy_greedy(pool.map, candidates, threshold, max_removals, batch_size)
+    finally:
+        pool.terminate()
+        pool.join()
+####################################################################################
+
+
+
+####################################################################################
+'''
+Ranks the devices worth trying to remove: the articulation points of the graph
+(with edge directions ignored), then the top devices by sampled betweenness and,
+if given, by traffic, taken from each ranking in turn.
+    Args:
+        graph: A networkx graph instance.
+        num_candidates: How many top devices of each ranking to take
+        traffic: A dictionary of per-device traffic, such as
+                 iot_spy.total_broadcasts_received_overall, or None
+        seed: The seed of the sampled betweenness
+
+    Returns:
+        A list of candidate devices, without duplicates
+'''
+####################################################################################
+def candidate_nodes(graph, num_candidates=20, traffic=None, seed=None):
+    betweenness, error_bound = graph_metrics.approx_betweenness_centrality(graph, seed=seed)
+    rankings = [sorted(graph, key=lambda node: -betweenness[node])]
+    if traffic is not None:
+        rankings.append(sorted(graph, key=lambda node: -traffic.get(node, 0)))
+
+    articulation_points = set(nx.articulation_points(graph.to_undirected()))
+    candidates = [node for node in rankings[0] if node in articulation_points]
+    chosen = set(candidates)
+    for i in range(num_candidates):
+        for ranking in rankings:
+            if i < len(ranking) and ranking[i] not in chosen:
+                candidates.append(ranking[i])
+                chosen.add(ranking[i])
+    return candidates
+####################################################################################
+
+
+
+####################################################################################
+'''
+The information spread a simulation converges to once every device has passed on
+what it has: device v ends up with the information of every device u it can be
+reached from, so the spread is the number of reachable (u, v) pairs over the
+square of the number of devices, as on_finished_simulation measures it. Strongly
+connected components are found on the neighbor index, and reachable sets are
+accumulated as bitsets over the condensation in reverse topological order.
+    Args:
+        graph: A networkx graph instance.
+        removed_nodes: Devices to leave out
+
+    Returns:
+        The converged information spread
+'''
+####################################################################################
+def reachability_spread(graph, removed_nodes=()):
+    index = graph_index.get_neighbor_index(graph)
+    alive = index['alive'].copy()
+    for node in removed_nodes:
+        if node in index['position']:
+            alive[index['position'][node]] = False
+    num_alive = int(alive.sum())
+    if num_alive == 0:
+        return 0.0
+
+    num_nodes = len(alive)
+    offsets, neighbors = index['out']
+    sources = np.repeat(np.arange(num_nodes), np.diff(offsets))
+    keep = alive[sources] & alive[neighbors]
+    sources = sources[keep]
+    targets = neighbors[keep]
+    adjacency = csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(num_nodes, num_nodes))
+    num_components, labels = connected_components(adjacency, directed=True, connection='strong')
+    labels = labels.astype(np.int64)
+
+    # The condensation, as CSR rows of distinct component edges
+    component_sources = labels[sources]
+    component_targets = labels[targets]
+    between = component_sources != component_targets
+    keys = np.unique(component_sources[between] * num_components + component_targets[between])
+    dag_sources = keys // num_components
+    dag_targets = keys - dag_sources * num_components
+    dag_offsets = np.zeros(num_components + 1, dtype=np.int64)
+    np.cumsum(np.bincount(dag_sources, minlength=num_components), out=dag_offsets[1:])
+
+    # Member bitsets and sizes of the components of live devices
+    reach = [0] * num_components
+    sizes = np.bincount(labels[alive], minlength=num_components)
+    for bit, component in enumerate(labels[alive].tolist()):
+        reach[component] |= 1 << bit
+
+    # Kahn's algorithm gives a topological order; it is walked backwards
+    in_degrees = np.bincount(dag_targets, minlength=num_components)
+    order = np.flatnonzero(in_degrees == 0).tolist()
+    dag_targets = dag_targets.tolist()
+    dag_offsets = dag_offsets.tolist()
+    in_degrees = in_degrees.tolist()
+    for component in order:
+        for target in dag_targets[dag_offsets[component]:dag_offsets[component + 1]]:
+            in_degrees[target] -= 1
+            if in_degrees[target] == 0:
+                order.append(target)
+    for component in reversed(order):
+        for target in dag_targets[dag_offsets[component]:dag_offsets[component + 1]]:
+            reach[component] |= reach[target]
+
+    reached_pairs = sum(int(sizes[component]) * config.popcount(reach[component])
+                        for component in range(num_components) if sizes[component])
+    return reached_pairs / float(num_alive ** 2)
+####################################################################################
+
+
+
+####################################################################################
+'''
+The information spread of one iot_spy simulation run on a graph without some
+devices. Each device starts with only its own information, and rounds are run
+until finished_hook ends the run. The iot_spy data collection dictionaries are
+swapped out for the run and put back afterwards.
+    Args:
+        graph: A networkx graph instance.
+        removed_nodes: Devices to leave out
+
+    Returns:
+        The information spread at the end of the run
+'''
+####################################################################################
+def simulated_spread(graph, removed_nodes=()):
+    removed_nodes = set(removed_nodes)
+    nodes = [node for node in graph.node if node not in removed_nodes]
+    if not nodes:
+        return 0.0
+    g = graph.__class__()
+    g.add_nodes_from((node, dict(graph.node[node])) for node in nodes)
+    g.add_edges_from((node, neighbor) for node in nodes for neighbor in graph.edge[node]
+                     if neighbor not in removed_nodes)
+    for node in g.node:
+        g.node[node]['broadcast_delay'] = 0
+    config.reset_information(g)
+
+    saved = dict((name, getattr(config, name)) for name in COUNTER_NAMES)
+    saved['last_update_round'] = config.last_update_round
+    try:
+        for name in COUNTER_NAMES:
+            setattr(config, name, dict.fromkeys(g, 0))
+        config.last_update_round = 0
+        config.init(g, 'critical_nodes')
+        round_num = 0
+        while not config.finished_hook(g, round_num, 'critical_nodes'):
+            round_num += 1
+            engine.round(g, round_num, 'critical_nodes')
+    finally:
+        for name, value in saved.iteritems():
+            setattr(config, name, value)
+
+    everyone = config.everyone_mask(g)
+    has_information_bits = sum(config.popcount(g.node[node]['has'] & everyone) for node in g.node)
+    return has_information_bits / float(len(g) ** 2)
+####################################################################################
+
+
+
+SPREAD_FUNCTIONS = {
+    'reachability': reachability_spread,
+    'simulation': simulated_spread,
+}
+
+_worker_graph = None
+_worker_spread = None
+
+def _init_worker(graph, spread):
+    global _worker_graph, _worker_spread
+    _worker_graph = graph
+    _worker_spread = spread
+
+def _measure(removed_nodes):
+    return SPREAD_FUNCTIONS[_worker_spread](_worker_graph, removed_nodes)
+
+def _lazy_greedy(map_function, candidates, threshold, max_removals, batch_size):
+    # Queue entries are (-drop, rank, node, number of removals when measured,
+    # spread measured); ranks break ties in candidate order
+    current = map_function(_measure, [()])[0]
+    removed = []
+    spreads = []
+    measured = 1
+    queue = []
+    for rank, (node, spread) in enumerate(zip(candidates, map_function(_measure, [(node,) for node in candidates]))):
+        queue.append((spread - current, rank, node, 0, spread))
+    measured += len(candidates)
+    heapq.heapify(queue)
+
+    while queue and current >= threshold and (max_removals is None or len(removed) < max_removals):
+        if queue[0][3] == len(removed):
+            entry = heapq.heappop(queue)
+            removed.append(entry[2])
+            current = entry[4]
+            spreads.append(current)
+            continue
+        stale = []
+        while queue and queue[0][3] != len(removed) and len(stale) < batch_size:
+            stale.append(heapq.heappop(queue))
+        results = map_function(_measure, [tuple(removed) + (entry[2],) for entry in stale])
+        measured += len(stale)
+        for entry, spread in zip(stale, results):
+            heapq.heappush(queue, (spread - current, entry[1], entry[2], len(removed), spread))
+    return removed, spreads, measured
@@ -0,0 +1,124 @@
+import numpy as np
+
+import graph_binary
+import ingest
+
+
+
+# Fields a device list can have after the device name
+DEVICE_FIELDS = ['x', 'y', 'z', 'range']
+
+# Key under the stored graph attributes listing the store's fields
+FIELDS_KEY = 'device_fields'
+
+
+
+####################################################################################
+'''
+Reads an iot/*.csv style device list (name, then the given fields) into a columnar
+device store: the device names and one float array per field, parsed by
+ingest.read_device_rows (devices in the order they first appear, a device listed
+twice keeping its last row).
+    Args:
+        path: The device list file
+        fields: The field names after the device name, e.g. ['x', 'y', 'range']
+
+    Returns:
+        A device store: a dictionary with 'names', 'fields' and an array per field
+'''
+####################################################################################
+def read_device_csv(path, fields):
+    names, values = ingest.read_device_rows(path, fields)
+    store = {'names': names, 'fields': list(fields)}
+    for k, field in enumerate(fields):
+        store[field] = values[:, k].copy()
+    return store
+####################################################################################
+
+
+
+####################################################################################
+'''
+Writes a device store in the binary CSR format of graph_binary, as a graph of
+devices without edges whose node columns are the fields, so that it can be
+memory-mapped back with load_device_store.
+    Args:
+        path: The file to write
+        store: A device store
+'''
+####################################################################################
+def write_device_store(path, store):
+    num_devices = len(store['names'])
+    node_columns = dict((field, np.asarray(store[field], dtype=float)) for field in store['fields'])
+    graph_binary.write_csr(path, store['names'], np.zeros(num_devices + 1, dtype=np.int64),
+                           np.zeros(0, dtype=np.int64), False, node_columns,
+                           graph_attrs={FIELDS_KEY: store['fields']})
+####################################################################################
+
+
+
+####################################################################################
+'''
+Opens a device store written by write_device_store. The field arrays are read-only
+views of a memory map of the file; only the names are decoded.
+    Args:
+        path: The file to open
+
+    Returns:
+        A device store
+'''
+####################################################################################
+def load_device_store(path):
+    csr = graph_binary.load_csr(path)
+    fields = [graph_binary._attr_name(field) for field in csr['graph'][FIELDS_KEY]]
+    store = {'names': graph_binary.column_values(csr, 'node_ids', csr['node_ids']), 'fields': fields}
+    for field in fields:
+        store[field] = csr['columns']['node.' + field]
+    return store
+####################################################################################
+
+
+
+####################################################################################
+'''
+Opens a device list, either a store written by write_device_store or a CSV file.
+    Args:
+        path: The file to open
+        fields: The fields of a CSV file; a store must have them all
+
+    Returns:
+        A device store
+'''
+####################################################################################
+def open_devices(path, fields):
+    with open(path, 'rb') as f:
+        stored = f.read(len(graph_binary.MAGIC)) == graph_binary.MAGIC
+    if not stored:
+        return read_device_csv(path, fields)
+    store = load_device_store(path)
+    missing = [field for field in fields if field not in store['fields']]
+    if missing:
+        raise ValueError(path + ' has no ' + ', '.join(missing) + ' field')
+    return store
+####################################################################################
+
+
+
+####################################################################################
+'''
+The coordinates of some devices as one array.
+    Args:
+        store: A device store
+        positions: The store positions of the devices, or None for all of them
+        fields: The coordinate fields, in order
+
+    Returns:
+        An (N, len(fields)) float array
+'''
+####################################################################################
+def device_points(store, positions=None, fields=('x', 'y')):
+    columns = [np.asarray(store[field]) for field in fields]
+    if positions is not None:
+        columns = [column[positions] for column in columns]
+    return np.column_stack(columns) if columns[0].size else np.zeros((0, len(fields)))
+####################################################################################
@@ -0,0 +1,416 @@
+#! /usr/bin/env python
+import argparse
+import json
+import mmap
+import struct
+from itertools import izip
+
+import networkx as nx
+import numpy as np
+
+import graph_index
+import graph_stats
+import graphml_stream
+import ingest
+
+
+
+# File layout: MAGIC, the header length as a little-endian uint64, a JSON header,
+# then every array section, each starting on an ALIGNMENT byte boundary so that
+# it can be viewed in place from a memory map
+MAGIC = 'RMCSR\x00\x01\n'
+ALIGNMENT = 64
+
+# Column types: numeric columns are stored as one array, string columns as the
+# UTF-8 bytes of all values plus an offsets array; columns mixing types store
+# each value as JSON text. Columns with missing values also get a 'present' mask.
+COLUMN_DTYPES = {'bool': '|b1', 'int': '<i8', 'float': '<f8'}
+STRING_TYPES = ['str', 'unicode', 'json']
+
+
+
+####################################################################################
+'''
+Writes a graph in the binary CSR format. Rows of the CSR arrays must be sorted and
+free of duplicates (as graph_index.csr_from_edges builds them); undirected graphs
+list every edge in both rows.
+    Args:
+        path: The file to write
+        nodes: The node ids, in position order
+        offsets: The CSR offsets array (successors for directed graphs)
+        neighbors: The CSR neighbors array
+        directed: True for a directed graph
+        node_columns: A dictionary from attribute name to a list of values per node
+                      (None where a node lacks the attribute)
+        edge_columns: A dictionary from attribute name to a list of values per
+                      entry of the neighbors array
+        in_csr: The predecessor (offsets, neighbors) of a directed graph
+        graph_attrs: A dictionary of JSON-serializable graph attributes
+'''
+####################################################################################
+def write_csr(path, nodes, offsets, neighbors, directed, node_columns={}, edge_columns={},
+              in_csr=None, graph_attrs={}):
+    sections = []
+    header = {'version': 1, 'directed': bool(directed), 'num_nodes': len(nodes),
+              'num_entries': len(neighbors), 'graph': graph_attrs,
+              'node_attrs': {}, 'edge_attrs': {}, 'sections': {}}
+    sections.append(('offsets', np.asarray(offsets, dtype='<i8')))
+    sections.append(('neighbors', np.asarray(neighbors, dtype='<i8')))
+    if directed:
+        if in_csr is None:
+            num_nodes = len(nodes)
+            sources = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(offsets))
+            in_csr = graph_index.csr_from_edges(num_nodes, neighbors, sources)
+        sections.append(('in_offsets', np.asarray(in_csr[0], dtype='<i8')))
+        sections.append(('in_neighbors', np.asarray(in_csr[1], dtype='<i8')))
+    header['node_ids'] = _add_column(sections, 'node_ids', nodes)
+    for attr, values in node_columns.iteritems():
+        header['node_attrs'][attr] = _add_column(sections, 'node.' + attr, values)
+    for attr, values in edge_columns.iteritems():
+        header['edge_attrs'][attr] = _add_column(sections, 'edge.' + attr, values)
+
+    # Lay the sections out after the header. The header records their offsets,
+    # so it is laid out again until it fits before the first section.
+    start = 0
+    while True:
+        position = start
+        for name, array in sections:
+            header['sections'][name] = {'dtype': array.dtype.str, 'count': len(array), 'offset': position}
+            position = _aligned(position + array.nbytes)
+        text = json.dumps(header)
+        if len(MAGIC) + 8 + len(text) <= start:
+            break
+        start = _aligned(len(MAGIC) + 8 + len(text))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(text)))
+        f.write(text)
+        for name, array in sections:
+            f.write('\0' * (header['sections'][name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+####################################################################################
+
+
+
+####################################################################################
+'''
+Writes a networkx graph in the binary CSR format, with every node and edge
+attribute as a typed column.
+    Args:
+        path: The file to write
+        graph: A networkx graph instance (not a multigraph)
+'''
+####################################################################################
+def write_graph_csr(path, graph):
+    if graph.is_multigraph():
+        raise nx.NetworkXError('The CSR format does not store multigraphs')
+    nodes = list(graph)
+    position = dict((node, i) for i, node in enumerate(nodes))
+    adj = graph.succ if graph.is_directed() else graph.adj
+    sources, targets = graph_index.edge_arrays(nodes, position, adj)
+    order = np.argsort(sources * max(len(nodes), 1) + targets, kind='mergesort')
+    offsets, neighbors = graph_index.csr_from_edges(len(nodes), sources, targets)
+
+    node_columns = {}
+    for i, node in enumerate(nodes):
+        for attr, value in graph.node[node].iteritems():
+            node_columns.setdefault(attr, [None] * len(nodes))[i] = value
+    edge_data = [data for node in nodes for data in adj[node].itervalues()]
+    edge_columns = {}
+    for entry, j in enumerate(order.tolist()):
+        for attr, value in edge_data[j].iteritems():
+            edge_columns.setdefault(attr, [None] * len(edge_data))[entry] = value
+
+    graph_attrs = {}
+    for key, value in graph.graph.iteritems():
+        if key in [graph_index.INDEX_KEY, graph_stats.STATS_KEY]:
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        graph_attrs[key] = value
+    write_csr(path, nodes, offsets, neighbors, graph.is_directed(), node_columns, edge_columns,
+              graph_attrs=graph_attrs)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Opens a binary CSR file. Every array is a read-only view of a shared memory map
+of the file, so loading takes no copies and processes that load the same file
+share its pages.
+    Args:
+        path: The file to open
+
+    Returns:
+        A dictionary with the header fields, 'offsets' and 'neighbors' (plus
+        'in_offsets' and 'in_neighbors' for directed graphs) and 'columns', the
+        raw sections of the node id and attribute columns
+'''
+####################################################################################
+def load_csr(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise IOError(path + ' is not a binary CSR graph file')
+        length = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(length))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    csr = dict(header)
+    arrays = {}
+    for name, section in header['sections'].iteritems():
+        arrays[name] = np.frombuffer(mapped, dtype=section['dtype'], count=section['count'],
+                                     offset=section['offset'])
+    for name in ['offsets', 'neighbors', 'in_offsets', 'in_neighbors']:
+        if name in arrays:
+            csr[name] = arrays[name]
+    csr['columns'] = arrays
+    return csr
+####################################################################################
+
+
+
+####################################################################################
+'''
+Decodes a column of a loaded CSR file into a list of Python values.
+    Args:
+        csr: A loaded CSR file (see load_csr)
+        name: 'node_ids', 'node.<attribute>' or 'edge.<attribute>'
+        column_type: The column type recorded in the header
+
+    Returns:
+        A list of values, None where a value is missing
+'''
+####################################################################################
+def column_values(csr, name, column_type):
+    arrays = csr['columns']
+    if column_type in STRING_TYPES:
+        data = arrays[name + '.data'].tobytes()
+        bounds = arrays[name + '.offsets'].tolist()
+        values = [data[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+        if column_type == 'unicode':
+            values = [value.decode('utf-8') for value in values]
+        elif column_type == 'json':
+            values = [_decode_json(value) if value else None for value in values]
+    else:
+        values = arrays[name].tolist()
+    if name + '.present' in arrays:
+        values = [value if present else None
+                  for value, present in zip(values, arrays[name + '.present'].tolist())]
+    return values
+####################################################################################
+
+
+
+####################################################################################
+'''
+Builds a networkx graph from a loaded CSR file and attaches a neighbor index that
+views the file's CSR arrays directly, so neighbor queries need no rebuild.
+    Args:
+        csr: A loaded CSR file (see load_csr)
+
+    Returns:
+        A networkx Graph or DiGraph
+'''
+####################################################################################
+def csr_to_networkx(csr):
+    nodes = column_values(csr, 'node_ids', csr['node_ids'])
+    g = nx.DiGraph() if csr['directed'] else nx.Graph()
+    g.graph.update(csr['graph'])
+
+    node_data = [{} for node in nodes]
+    for attr, column_type in csr['node_attrs'].iteritems():
+        for data, value in zip(node_data, column_values(csr, 'node.' + attr, column_type)):
+            if value is not None:
+                data[_attr_name(attr)] = value
+
+    # The node and adjacency dictionaries are filled in directly, which is much
+    # faster than add_nodes_from/add_edges_from; as there, both directions of
+    # an edge share one data dictionary
+    succ = g.succ if csr['directed'] else g.adj
+    pred = g.pred if csr['directed'] else g.adj
+    for node, data in izip(nodes, node_data):
+        g.node[node] = data
+        succ[node] = {}
+        pred[node] = {}
+
+    offsets = csr['offsets']
+    neighbors = csr['neighbors']
+    sources = np.repeat(np.arange(len(nodes), dtype=np.int64), np.diff(offsets))
+    entries = np.arange(len(neighbors))
+    if not csr['directed']:
+        # Each undirected edge is listed in both rows; keep one of them
+        entries = entries[sources <= neighbors]
+    edge_data = [{} for i in range(len(entries))]
+    for attr, column_type in csr['edge_attrs'].iteritems():
+        values = column_values(csr, 'edge.' + attr, column_type)
+        for data, i in izip(edge_data, entries.tolist()):
+            if values[i] is not None:
+                data[_attr_name(attr)] = values[i]
+
+    for data, u, v in izip(edge_data, sources[entries].tolist(), neighbors[entries].tolist()):
+        succ[nodes[u]][nodes[v]] = data
+        pred[nodes[v]][nodes[u]] = data
+
+    in_csr = None
+    if csr['directed']:
+        in_csr = (csr['in_offsets'], csr['in_neighbors'])
+    g.graph[graph_index.INDEX_KEY] = graph_index.index_from_csr(nodes, (offsets, neighbors), in_csr)
+    return g
+####################################################################################
+
+
+
+####################################################################################
+'''
+Reads a binary CSR file into a networkx graph.
+    Args:
+        path: The file to read
+
+    Returns:
+        A networkx Graph or DiGraph
+'''
+####################################################################################
+def read_csr_graph(path):
+    return csr_to_networkx(load_csr(path))
+####################################################################################
+
+
+
+####################################################################################
+'''
+Writes the graph arrays produced by the ingest and graphml_stream modules in the
+binary CSR format.
+    Args:
+        path: The file to write
+        arrays: A graph arrays dictionary (see ingest.ingest_edge_list), with the
+                graph attributes under 'graph' if it has any
+'''
+####################################################################################
+def write_graph_arrays(path, arrays):
+    write_csr(path, arrays['nodes'], arrays['offsets'], arrays['neighbors'], arrays['directed'],
+              arrays['node_columns'], arrays['edge_columns'], graph_attrs=arrays.get('graph', {}))
+####################################################################################
+
+
+
+####################################################################################
+'''
+Converters to the binary CSR format. Edge lists ('u v [w ...]' lines, or CSV rows)
+and iot/*.csv device lists are read in blocks by the ingest module without going
+through networkx; see ingest.ingest_edge_list and ingest.ingest_devices for the
+arguments.
+'''
+####################################################################################
+def graphml_to_csr(graphml_path, csr_path):
+    write_graph_arrays(csr_path, graphml_stream.read_graphml_arrays(graphml_path))
+
+def edge_list_to_csr(edge_list_path, csr_path, directed=False, delimiter=None, nodetype=str,
+                     attr_names=(), attr_types=None):
+    write_graph_arrays(csr_path, ingest.ingest_edge_list(edge_list_path, directed, delimiter, nodetype,
+                                                         attr_names, attr_types))
+
+def csv_to_csr(csv_path, csr_path, directed=False, attr_names=(), attr_types=None):
+    edge_list_to_csr(csv_path, csr_path, directed, ',', str, attr_names, attr_types)
+
+def devices_to_csr(csv_path, csr_path, fields, radius=None):
+    write_graph_arrays(csr_path, ingest.ingest_devices(csv_path, fields, radius))
+####################################################################################
+
+
+
+def _attr_name(attr):
+    # JSON gives unicode strings; plain ones go back to str
+    try:
+        return attr.encode('ascii')
+    except UnicodeEncodeError:
+        return attr
+
+def _aligned(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+def _column_type(values):
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, bool) for value in present):
+        return 'bool'
+    if all(isinstance(value, (int, long)) and not isinstance(value, bool) for value in present):
+        if all(-2**63 <= value < 2**63 for value in present):
+            return 'int'
+    if all(isinstance(value, (int, long, float)) and not isinstance(value, bool) for value in present):
+        return 'float'
+    if all(isinstance(value, str) for value in present):
+        return 'str'
+    if all(isinstance(value, basestring) for value in present):
+        return 'unicode'
+    return 'json'
+
+def _add_column(sections, name, values):
+    # Appends the sections of one column and returns its type
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'bif':
+        column_type = {'b': 'bool', 'i': 'int', 'f': 'float'}[values.dtype.kind]
+        sections.append((name, values.astype(COLUMN_DTYPES[column_type])))
+        return column_type
+    values = list(values)
+    column_type = _column_type(values)
+    if any(value is None for value in values):
+        sections.append((name + '.present', np.array([value is not None for value in values], dtype='|b1')))
+    if column_type in STRING_TYPES:
+        encoded = [_encode_string(value, column_type) for value in values]
+        bounds = np.zeros(len(encoded) + 1, dtype='<i8')
+        np.cumsum([len(value) for value in encoded], out=bounds[1:])
+        sections.append((name + '.data', np.array(bytearray(''.join(encoded)), dtype='|u1')))
+        sections.append((name + '.offsets', bounds))
+    else:
+        default = {'bool': False, 'int': 0, 'float': 0.0}[column_type]
+        filled = [default if value is None else value for value in values]
+        sections.append((name, np.array(filled, dtype=COLUMN_DTYPES[column_type])))
+    return column_type
+
+def _encode_string(value, column_type):
+    if value is None:
+        return ''
+    if column_type == 'json':
+        return json.dumps(value)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+def _decode_json(text):
+    value = json.loads(text)
+    if isinstance(value, unicode):
+        return _attr_name(value)
+    return value
+
+
+
+####################################################################################
+'''
+Converts a GraphML file, an edge list or a device list to the binary CSR format.
+'''
+####################################################################################
+def main():
+    parser = argparse.ArgumentParser(description='Convert a graph to the binary CSR format.')
+    parser.add_argument('source', help='a .graphml file, an edge list (.csv or whitespace separated) or a device list')
+    parser.add_argument('destination', help='the .csr file to write')
+    parser.add_argument('--directed', action='store_true', help='read an edge list as directed')
+    parser.add_argument('--int-ids', action='store_true', help='read edge list node ids as integers')
+    parser.add_argument('--attrs', nargs='*', default=[], help='names of the extra edge list fields')
+    parser.add_argument('--devices', nargs='*', help='read a device list with these fields after the name, e.g. x y range')
+    parser.add_argument('--radius', type=float, help='the broadcast range of a device list without a range field')
+    args = parser.parse_args()
+    if args.devices:
+        devices_to_csr(args.source, args.destination, args.devices, args.radius)
+    elif args.source.endswith('.graphml'):
+        graphml_to_csr(args.source, args.destination)
+    else:
+        delimiter = ',' if args.source.endswith('.csv') else None
+        edge_list_to_csr(args.source, args.destination, args.directed, delimiter,
+                         int if args.int_ids else str, args.attrs)
+####################################################################################
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import numpy as np
+
+
+
+# Key under graph.graph where the cached neighbor index lives
+INDEX_KEY = 'neighbor_index'
+
+
+
+####################################################################################
+'''
+Builds a compressed sparse row (CSR) neighbor index for a graph. Every node gets an
+integer position, and each view stores an offsets array and a neighbors array so
+that the neighbors of the node at position i are neighbors[offsets[i]:offsets[i+1]],
+sorted by position. Directed graphs get separate 'out', 'in' and 'all' (union of
+successors and predecessors, without duplicates) views; for undirected graphs all
+three views are the same arrays.
+    Args:
+        graph: A networkx graph instance.
+
+    Returns:
+        A dictionary holding the node table and the CSR views.
+'''
+####################################################################################
+def build_neighbor_index(graph):
+    nodes = list(graph)
+    position = dict((node, i) for i, node in enumerate(nodes))
+    num_nodes = len(nodes)
+
+    index = {}
+    index['nodes'] = nodes
+    index['labels'] = np.empty(num_nodes, dtype=object)
+    index['labels'][:] = nodes
+    index['position'] = position
+    index['directed'] = graph.is_directed()
+    index['alive'] = np.ones(num_nodes, dtype=bool)
+    index['num_alive'] = num_nodes
+
+    if graph.is_directed():
+        out_src, out_dst = edge_arrays(nodes, position, graph.succ)
+        in_src, in_dst = edge_arrays(nodes, position, graph.pred)
+        index['out'] = csr_from_edges(num_nodes, out_src, out_dst)
+        index['in'] = csr_from_edges(num_nodes, in_src, in_dst)
+        index['all'] = csr_from_edges(num_nodes,
+                                      np.concatenate([out_src, in_src]),
+                                      np.concatenate([out_dst, in_dst]))
+    else:
+        src, dst = edge_arrays(nodes, position, graph.adj)
+        csr = csr_from_edges(num_nodes, src, dst)
+        index['out'] = csr
+        index['in'] = csr
+        index['all'] = csr
+    _freeze(index)
+    return index
+####################################################################################
+
+
+
+####################################################################################
+'''
+Builds a neighbor index around existing CSR arrays (such as the memory-mapped
+arrays of a binary CSR file) instead of walking the graph. Rows must be sorted and
+free of duplicates.
+    Args:
+        nodes: The list of nodes, in position order
+        out_csr: The (offsets, neighbors) of the successors, or of all neighbors for
+                 an undirected graph
+        in_csr: The (offsets, neighbors) of the predecessors of a directed graph,
+                or None for an undirected graph
+
+    Returns:
+        A dictionary holding the node table and the CSR views.
+'''
+####################################################################################
+def index_from_csr(nodes, out_csr, in_csr=None):
+    num_nodes = len(nodes)
+    index = {}
+    index['nodes'] = nodes
+    index['labels'] = np.empty(num_nodes, dtype=object)
+    index['labels'][:] = nodes
+    index['position'] = dict((node, i) for i, node in enumerate(nodes))
+    index['directed'] = in_csr is not None
+    index['alive'] = np.ones(num_nodes, dtype=bool)
+    index['num_alive'] = num_nodes
+    index['out'] = out_csr
+    if in_csr is None:
+        index['in'] = out_csr
+        index['all'] = out_csr
+    else:
+        out_offsets, out_neighbors = out_csr
+        in_offsets, in_neighbors = in_csr
+        positions = np.arange(num_nodes, dtype=np.int64)
+        index['in'] = in_csr
+        index['all'] = csr_from_edges(num_nodes,
+                                      np.concatenate([np.repeat(positions, np.diff(out_offsets)),
+                                                      np.repeat(positions, np.diff(in_offsets))]),
+                                      np.concatenate([out_neighbors, in_neighbors]))
+    _freeze(index)
+    return index
+####################################################################################
+
+
+
+####################################################################################
+'''
+Flattens an adjacency dictionary into parallel source/destination position arrays.
+    Args:
+        nodes: The list of nodes, in position order
+        position: A dictionary from node to position
+        adj: An adjacency dictionary (graph.adj, graph.succ or graph.pred)
+
+    Returns:
+        Two integer arrays, sources and destinations
+'''
+####################################################################################
+def edge_arrays(nodes, position, adj):
+    degrees = np.fromiter((len(adj[node]) for node in nodes), dtype=np.int64, count=len(nodes))
+    num_entries = int(degrees.sum())
+    src = np.repeat(np.arange(len(nodes), dtype=np.int64), degrees)
+    dst = np.fromiter((position[w] for node in nodes for w in adj[node]),
+                      dtype=np.int64, count=num_entries)
+    return src, dst
+####################################################################################
+
+
+
+####################################################################################
+'''
+Builds one CSR view from source/destination position arrays. Duplicate pairs are
+collapsed and every row is sorted.
+    Args:
+        num_nodes: The number of positions
+        src: An integer array of source positions
+        dst: An integer array of destination positions
+
+    Returns:
+        A tuple (offsets, neighbors) of integer arrays
+'''
+####################################################################################
+def csr_from_edges(num_nodes, src, dst):
+    keys = np.unique(np.asarray(src, dtype=np.int64) * num_nodes + np.asarray(dst, dtype=np.int64))
+    rows = keys // max(num_nodes, 1)
+    neighbors = keys - rows * num_nodes
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=offsets[1:])
+    return offsets, neighbors
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns the cached neighbor index of a graph, building it on first use. An index
+whose live node count no longer matches the graph (nodes were added or removed
+without going through simhelper.modify_graph) is rebuilt. Edges changed directly
+on the graph are not detected, so such edits must be followed by
+invalidate_neighbor_index.
+    Args:
+        graph: A networkx graph instance.
+
+    Returns:
+        The neighbor index dictionary of the graph.
+'''
+####################################################################################
+def get_neighbor_index(graph):
+    index = graph.graph.get(INDEX_KEY)
+    if index is None or index['num_alive'] != len(graph):
+        index = build_neighbor_index(graph)
+        graph.graph[INDEX_KEY] = index
+    return index
+####################################################################################
+
+
+
+####################################################################################
+'''
+Drops the cached neighbor index of a graph so that the next query rebuilds it.
+Must be called after any edge change made outside simhelper.modify_graph.
+    Args:
+        graph: A networkx graph instance.
+'''
+####################################################################################
+def invalidate_neighbor_index(graph):
+    graph.graph.pop(INDEX_KEY, None)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Patches the cached neighbor index after nodes were removed from the graph. Removed
+positions are masked out rather than compacted, so removal costs O(removed). The
+mask is copied before it is changed, so an index handed out earlier is never
+modified.
+    Args:
+        graph: A networkx graph instance.
+        removed_nodes: The nodes that were removed from the graph
+'''
+####################################################################################
+def remove_nodes_from_index(graph, removed_nodes):
+    index = graph.graph.get(INDEX_KEY)
+    if index is None:
+        return
+    patched = dict(index)
+    patched['alive'] = index['alive'].copy()
+    for node in removed_nodes:
+        i = index['position'].get(node)
+        if i is not None and patched['alive'][i]:
+            patched['alive'][i] = False
+            patched['num_alive'] -= 1
+    graph.graph[INDEX_KEY] = patched
+####################################################################################
+
+
+
+####################################################################################
+'''
+Copies a neighbor index for a copy of its graph. The CSR arrays are read-only and
+shared; the dictionary and live node mask are the copy's own.
+    Args:
+        index: A neighbor index dictionary
+
+    Returns:
+        The copied neighbor index dictionary
+'''
+####################################################################################
+def copy_index(index):
+    copied = dict(index)
+    copied['alive'] = index['alive'].copy()
+    return copied
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns the positions of a node's neighbors as a slice of the CSR arrays.
+    Args:
+        graph: A networkx graph instance.
+        node: A node for which we will get neighbors.
+        view: 'out' (successors), 'in' (predecessors) or 'all' (both, once each)
+
+    Returns:
+        An integer array of neighbor positions
+'''
+####################################################################################
+def neighbor_positions(graph, node, view='all'):
+    index = get_neighbor_index(graph)
+    offsets, neighbors = index[view]
+    i = index['position'][node]
+    positions = neighbors[offsets[i]:offsets[i + 1]]
+    if index['num_alive'] != len(index['nodes']):
+        positions = positions[index['alive'][positions]]
+    return positions
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns a list of a node's neighbors, read from the cached neighbor index.
+    Args:
+        graph: A networkx graph instance.
+        node: A node for which we will get neighbors.
+        view: 'out' (successors), 'in' (predecessors) or 'all' (both, once each)
+
+    Returns:
+        A list of the neighbors of the node, without duplicates
+'''
+####################################################################################
+def neighbor_list(graph, node, view='all'):
+    index = get_neighbor_index(graph)
+    return index['labels'][neighbor_positions(graph, node, view)].tolist()
+####################################################################################
+
+
+
+def _freeze(index):
+    # The CSR arrays are shared between graph copies, so nothing may write to them
+    for view in ['out', 'in', 'all']:
+        for array in index[view]:
+            array.flags.writeable = False
@@ -1,11 +1,25 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import tempfile
+from collections import deque
+
 import networkx as nx
 
+import graphml_stream
+
 # Done:
 # density, betweenness, closeness_centrality, connectivity, centrality, clustering
 
 # Extra:
 # num_nodes, num_edges, degree_histogram_frequency,
 
+# Approximate (sampled) variants, for graphs too large for the exact versions:
+# betweenness, closeness_centrality, clustering
+
 # To Do:
 # add opportunity for other parameters for the graph measures that can
 # add secruity to these methods
@@ -15,6 +29,8 @@ import networkx as nx
 dictionary_to_write_out = {}
 # the graph to run program on
 graph_to_read = "simpletest.graphml"
+# where full_run_through keeps computed metrics between runs
+metrics_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics_cache')
 
 #
 # def main():
@@ -35,28 +51,60 @@ graph_to_read = "simpletest.graphml"
 def read_in_graph(graph):
    # Read in a graph
    try:
-      simulation_graph = nx.read_graphml(graph_to_read)
+      simulation_graph = graphml_stream.read_graphml(graph_to_read)
       return simulation_graph
    except IOError:
       print("Error reading in the Graph - Exiting Now")
       exit(-1)
 
 
-def full_run_through(graph):
+def full_run_through(graph, approximate=False, epsilon=0.05, delta=0.1, processes=None,
+                     use_cache=True, cache_dir=None):
 
-   # set the variable simulation_graph as the passed in graph object
+   # Work out the shared intermediates once (components, degrees), then the
+   # path and clustering metrics, which split their source nodes into chunks
+   # over a process pool, and finally every metric from the shared results.
+   # Exact metrics already in the on-disk cache for this graph are read back
+   # instead of being computed.
    simulation_graph = graph
-   num_nodes = find_number_nodes(simulation_graph)
-   num_edges = find_number_edges(simulation_graph)
-   dict_nodes_and_betweenness = find_graph_betweenness(simulation_graph)
-   density = find_graph_density(simulation_graph)
-   degree_freq = find_graph_degree_frequency(simulation_graph)
-   connectivity = find_graph_connected(simulation_graph)
-   centrality = find_graph_centrality(simulation_graph)
-   closeness = find_graph_closeness_centrality(simulation_graph)
-   avg_clustering = find_avg_clustering_of_graph(simulation_graph)
-   sub_graph_count = find_subgraph_count(simulation_graph)
-   disjoint = find_if_graph_is_disjoint(simulation_graph)
+   plan = METRIC_PLAN
+   if approximate:
+      plan = [entry for entry in plan if entry[2] not in HEAVY_METRIC_FUNCTIONS]
+   fingerprints = {}
+   cache = {}
+   if use_cache:
+      to_compute = []
+      for entry in plan:
+         fingerprint = _entry_fingerprint(simulation_graph, entry, fingerprints)
+         if fingerprint not in cache:
+            cache[fingerprint] = load_metrics_cache(fingerprint, cache_dir)
+         cached = cache[fingerprint].get(metric_cache_key(entry))
+         if cached is None:
+            to_compute.append(entry)
+         else:
+            dictionary_to_write_out[entry[0]] = _decode_value(cached)
+      plan = to_compute
+
+   shared = {}
+   for name in shared_intermediates_needed(plan):
+      shared[name] = INTERMEDIATES[name](simulation_graph)
+
+   if approximate:
+      find_graph_betweenness_approx(simulation_graph, epsilon, delta)
+      find_graph_closeness_centrality_approx(simulation_graph, epsilon, delta)
+      find_avg_clustering_of_graph_approx(simulation_graph, epsilon, delta)
+   elif any(entry[2] in HEAVY_METRIC_FUNCTIONS for entry in plan):
+      shared.update(run_heavy_metrics(simulation_graph, processes))
+
+   changed = set()
+   for entry in plan:
+      dictionary_to_write_out[entry[0]] = entry[2](simulation_graph, shared)
+      if use_cache:
+         fingerprint = _entry_fingerprint(simulation_graph, entry, fingerprints)
+         cache[fingerprint][metric_cache_key(entry)] = _encode_value(dictionary_to_write_out[entry[0]])
+         changed.add(fingerprint)
+   for fingerprint in changed:
+      save_metrics_cache(fingerprint, cache[fingerprint], cache_dir)
 
    return dictionary_to_write_out
 
@@ -90,7 +138,7 @@ def find_graph_betweenness(graph):
    return d
 
 def find_graph_density(graph):
-   d = nx.betweenness_centrality(graph)
+   d = nx.density(graph)
    dictionary_to_write_out["Density: "] = d
    return d
 
@@ -147,6 +195,558 @@ def find_if_graph_is_disjoint(graph):
    return d
 
 
+# Approximate metrics
+#
+# Each sampled metric takes an error budget epsilon and a failure probability
+# delta, draws a number of samples that depends on them (and on the vertex
+# diameter for betweenness) but not on the number of nodes, and returns the
+# values together with the error bound actually achieved.  When the sample
+# would cost as much as the exact computation the exact value is computed and
+# the bound is 0.
+#
+# Cost, in pure Python: betweenness makes about 1500 shortest path draws at the
+# defaults, each a bidirectional BFS stopped where the two searches meet.  On
+# small-world graphs that touches a small part of the graph (a 10^5-node
+# preferential attachment graph takes under two seconds), but on large-diameter
+# graphs such as grids and device graphs a draw nears a full BFS and the draws
+# grow with log2 of the diameter (a 300x300 grid takes minutes).  Closeness
+# makes ln(2/delta)/(2 epsilon^2) full BFS passes, 600 at the defaults and 150
+# at epsilon=0.1, at about 0.2 seconds a pass per 10^5 nodes: minutes to tens
+# of minutes for 10^5-10^6 nodes, so raise epsilon for a quick look.
+# Clustering draws 15000 wedges at its defaults and takes well under a second.
+
+def sample_size(num_events, epsilon, delta):
+    # Samples needed so that num_events means of [0, 1] variables are all
+    # within epsilon of their expectation with probability 1 - delta
+    return int(math.ceil(math.log(2.0 * num_events / delta) / (2.0 * epsilon ** 2)))
+
+def sample_error_bound(num_events, num_samples, delta):
+    # Inverse of sample_size: the epsilon reached by num_samples samples
+    return math.sqrt(math.log(2.0 * num_events / delta) / (2.0 * num_samples))
+
+def path_sample_size(vertex_diameter, epsilon, delta):
+    # Riondato-Kornaropoulos: shortest paths through at most vertex_diameter
+    # nodes have VC dimension at most floor(log2(vertex_diameter - 2)) + 1, so
+    # this many uniformly drawn shortest paths put every node's betweenness
+    # within epsilon with probability 1 - delta, whatever the number of nodes
+    vc_dimension = int(math.floor(math.log(vertex_diameter - 2, 2))) + 1
+    return int(math.ceil(0.5 / epsilon ** 2 * (vc_dimension + math.log(1.0 / delta))))
+
+def _vertex_diameter_bound(graph):
+    # The most nodes a shortest path can hold, in O(N + E).  Undirected: a BFS
+    # from any node of a component reaches all of it within its eccentricity
+    # e, and the component's diameter is at most 2e.  Directed distances have
+    # no such bound, so the largest weak component's size is used.
+    if graph.is_directed():
+        return max(len(component) for component in nx.weakly_connected_components(graph))
+    adj = graph.adj
+    seen = set()
+    bound = 1
+    for start in graph:
+        if start in seen:
+            continue
+        seen.add(start)
+        frontier = [start]
+        size = 1
+        eccentricity = 0
+        while frontier:
+            next_frontier = []
+            for v in frontier:
+                for w in adj[v]:
+                    if w not in seen:
+                        seen.add(w)
+                        next_frontier.append(w)
+            if next_frontier:
+                eccentricity += 1
+                size += len(next_frontier)
+            frontier = next_frontier
+        bound = max(bound, min(2 * eccentricity + 1, size))
+    return bound
+
+def _accumulate_pivot_dependencies(graph, source, betweenness):
+    # Brandes' single source step: BFS from source counting shortest paths,
+    # then walk back adding each node's pair dependency to betweenness.
+    # Returns the BFS distances from source.
+    adj = graph.adj
+    stack = []
+    preds = {source: []}
+    sigma = {source: 1.0}
+    dist = {source: 0}
+    queue = deque([source])
+    while queue:
+        v = queue.popleft()
+        stack.append(v)
+        next_dist = dist[v] + 1
+        sigma_v = sigma[v]
+        for w in adj[v]:
+            if w not in dist:
+                dist[w] = next_dist
+                sigma[w] = 0.0
+                preds[w] = []
+                queue.append(w)
+            if dist[w] == next_dist:
+                sigma[w] += sigma_v
+                preds[w].append(v)
+    dependency = dict.fromkeys(stack, 0.0)
+    while stack:
+        w = stack.pop()
+        coeff = (1.0 + dependency[w]) / sigma[w]
+        for v in preds[w]:
+            dependency[v] += sigma[v] * coeff
+        if w != source:
+            betweenness[w] += dependency[w]
+    return dist
+
+def _random_shortest_path(graph, source, target, rng):
+    # The inner nodes of a shortest path from source to target drawn uniformly
+    # among all of them ([] when target is unreachable).  A balanced
+    # bidirectional BFS grows whichever search has the lighter frontier, one
+    # level at a time, counting shortest paths; every shortest path crosses
+    # the level where the searches first meet at exactly one node, so one is
+    # drawn by picking a meeting node and walking back on both sides, each
+    # step weighted by path counts.
+    if graph.is_directed():
+        links = [graph.succ, graph.pred]
+    else:
+        links = [graph.adj, graph.adj]
+    dist = [{source: 0}, {target: 0}]
+    count = [{source: 1}, {target: 1}]
+    frontier = [[source], [target]]
+    meeting = []
+    while not meeting:
+        if not frontier[0] or not frontier[1]:
+            return []
+        side = 0 if (sum(len(links[0][v]) for v in frontier[0]) <=
+                     sum(len(links[1][v]) for v in frontier[1])) else 1
+        own_dist = dist[side]
+        own_count = count[side]
+        next_frontier = []
+        for v in frontier[side]:
+            next_dist = own_dist[v] + 1
+            count_v = own_count[v]
+            for w in links[side][v]:
+                if w not in own_dist:
+                    own_dist[w] = next_dist
+                    own_count[w] = 0
+                    next_frontier.append(w)
+                if own_dist[w] == next_dist:
+                    own_count[w] += count_v
+        frontier[side] = next_frontier
+        meeting = [w for w in next_frontier if w in dist[1 - side]]
+
+    middle = _weighted_choice(meeting, [count[0][w] * count[1][w] for w in meeting], rng)
+    path = [middle]
+    for side in [0, 1]:
+        # The forward search is walked back along in-edges, the backward one
+        # along out-edges
+        back = links[1 - side]
+        node = middle
+        while dist[side][node] > 0:
+            step = [w for w in back[node] if dist[side].get(w) == dist[side][node] - 1]
+            node = _weighted_choice(step, [count[side][w] for w in step], rng)
+            path.append(node)
+    return [node for node in path if node != source and node != target]
+
+def _weighted_choice(items, weights, rng):
+    x = rng.random() * sum(weights)
+    for item, weight in zip(items, weights):
+        x -= weight
+        if x < 0:
+            return item
+    return items[-1]
+
+def _sample_pivots(graph, num_pivots, seed):
+    nodes = list(graph)
+    if num_pivots >= len(nodes):
+        return nodes
+    return random.Random(seed).sample(nodes, num_pivots)
+
+def approx_betweenness_centrality(graph, epsilon=0.05, delta=0.1, seed=None):
+    # Shortest path sampling (Riondato-Kornaropoulos): draw random node pairs
+    # and one uniform shortest path between each, and count how often every
+    # node is inside one.  The number of draws depends on epsilon, delta and
+    # the vertex diameter only (see path_sample_size); when it reaches the
+    # number of nodes, Brandes from every node is no dearer and is exact.
+    # Values are normalized like nx.betweenness_centrality.
+    # Returns (betweenness dictionary, error bound on every value at once).
+    # The bound is absolute, not relative: normalized betweenness averages
+    # about (average distance - 1) / (n - 2), so on large sparse graphs most
+    # values are far below any practical epsilon and the bound says nothing
+    # about them, only about the few central nodes.  Ranking the top nodes is
+    # still reliable; pass an epsilon near the values of interest otherwise.
+    n = len(graph)
+    betweenness = dict.fromkeys(graph, 0.0)
+    if n <= 2:
+        return betweenness, 0.0
+    vertex_diameter = _vertex_diameter_bound(graph)
+    if vertex_diameter <= 2:
+        return betweenness, 0.0 # No shortest path has an inner node
+    num_samples = path_sample_size(vertex_diameter, epsilon, delta)
+    if num_samples >= n:
+        for source in graph:
+            _accumulate_pivot_dependencies(graph, source, betweenness)
+        scale = 1.0 / ((n - 1) * (n - 2))
+        for v in betweenness:
+            betweenness[v] *= scale
+        return betweenness, 0.0
+    rng = random.Random(seed)
+    nodes = list(graph)
+    for i in range(num_samples):
+        source, target = rng.sample(nodes, 2)
+        for v in _random_shortest_path(graph, source, target, rng):
+            betweenness[v] += 1
+    # The draws estimate the average over the n(n - 1) ordered pairs; networkx
+    # leaves out the pairs a node is an end of, n - 2 instead of n
+    scale = n / (float(num_samples) * (n - 2))
+    for v in betweenness:
+        betweenness[v] *= scale
+    return betweenness, epsilon * n / (n - 2.0)
+
+def approx_closeness_centrality(graph, epsilon=0.05, delta=0.1, seed=None):
+    # Sampled-BFS closeness (Eppstein-Wang): one BFS from each of k random
+    # pivots gives every node's distance to that pivot; the mean over the
+    # pivots estimates the node's average distance.  Directed graphs walk the
+    # edges backwards, since closeness uses the distance *from* a node.
+    # k = sample_size(1, epsilon, delta) does not grow with the graph, so the
+    # guarantee is per node: each node's average distance, as a fraction of
+    # the graph diameter, is within the returned bound with probability
+    # 1 - delta.  Holding it for every node at once would take log(n) times
+    # more pivots (see sample_error_bound(n, k, delta) for what k reaches).
+    # The bound is on the sampled average distances, not on the closeness
+    # values computed from them.
+    # Returns (closeness dictionary, error bound).
+    n = len(graph)
+    closeness = dict.fromkeys(graph, 0.0)
+    if n <= 1:
+        return closeness, 0.0
+    adj = graph.pred if graph.is_directed() else graph.adj
+    pivots = _sample_pivots(graph, sample_size(1, epsilon, delta), seed)
+    total_dist = dict.fromkeys(graph, 0)
+    reached = dict.fromkeys(graph, 0)
+    for source in pivots:
+        dist = {source: 0}
+        queue = deque([source])
+        while queue:
+            v = queue.popleft()
+            for w in adj[v]:
+                if w not in dist:
+                    dist[w] = dist[v] + 1
+                    total_dist[w] += dist[w]
+                    reached[w] += 1
+                    queue.append(w)
+    k = len(pivots)
+    pivot_set = set(pivots)
+    for v in closeness:
+        if total_dist[v] > 0:
+            # (reachable / total distance) * (reachable / (n - 1)), with both
+            # fractions estimated over the pivots other than v itself
+            other_pivots = k - 1 if v in pivot_set else k
+            closeness[v] = (reached[v] / float(total_dist[v])) * (reached[v] / float(other_pivots))
+    if k == n:
+        return closeness, 0.0
+    return closeness, sample_error_bound(1, k, delta)
+
+def approx_average_clustering(graph, epsilon=0.01, delta=0.1, seed=None):
+    # Wedge sampling: pick a random node and a random pair of its neighbours
+    # and check whether the pair is connected.  The fraction of closed wedges
+    # is an unbiased estimate of nx.average_clustering (nodes of degree < 2
+    # count as 0).  Returns (average clustering, error bound).
+    if graph.is_directed():
+        raise nx.NetworkXError('Clustering algorithms are not defined for directed graphs.')
+    nodes = list(graph)
+    if len(nodes) == 0:
+        return 0.0, 0.0
+    rng = random.Random(seed)
+    adj = graph.adj
+    num_samples = sample_size(1, epsilon, delta)
+    closed = 0
+    for i in range(num_samples):
+        v = rng.choice(nodes)
+        neighbors = [w for w in adj[v] if w != v]
+        if len(neighbors) < 2:
+            continue
+        u, w = rng.sample(neighbors, 2)
+        if w in adj[u]:
+            closed += 1
+    return closed / float(num_samples), sample_error_bound(1, num_samples, delta)
+
+def _approx_result(values, error_bound, delta, bound_name='error_bound'):
+    return {'value': values, bound_name: error_bound, 'confidence': 1.0 - delta}
+
+def find_graph_betweenness_approx(graph, epsilon=0.05, delta=0.1, seed=None):
+    d, error_bound = approx_betweenness_centrality(graph, epsilon, delta, seed)
+    dictionary_to_write_out["Betweenness (approx): "] = _approx_result(d, error_bound, delta)
+    return d
+
+def find_graph_closeness_centrality_approx(graph, epsilon=0.05, delta=0.1, seed=None):
+    d, error_bound = approx_closeness_centrality(graph, epsilon, delta, seed)
+    # The bound is on each node's average distance over the diameter
+    dictionary_to_write_out["Closeness Centrality (approx):"] = _approx_result(d, error_bound, delta,
+                                                                               'average_distance_error_bound')
+    return d
+
+def find_avg_clustering_of_graph_approx(graph, epsilon=0.01, delta=0.1, seed=None):
+    d, error_bound = approx_average_clustering(graph, epsilon, delta, seed)
+    dictionary_to_write_out["Clustering of Graph (approx):"] = _approx_result(d, error_bound, delta)
+    return d
+
+
+# Metric plan
+#
+# full_run_through computes every metric from a small set of shared
+# intermediates, each built once: the connected components, the node
+# degrees, and the BFS trees from every source (which give both betweenness
+# and closeness).  The BFS trees and the clustering coefficients are the
+# heavy part, so their source nodes are split into chunks and run on a
+# process pool; the graph reaches the workers through the pool initializer.
+
+def _components(graph):
+    return [set(c) for c in nx.connected_components(graph)]
+
+def _degrees(graph):
+    return dict(graph.degree_iter())
+
+INTERMEDIATES = {
+    'components': _components,
+    'degrees': _degrees,
+}
+
+def _degree_histogram(degrees):
+    histogram = [0] * (max(degrees.values()) + 1) if degrees else []
+    for d in degrees.itervalues():
+        histogram[d] += 1
+    return histogram
+
+def _degree_centrality(graph, degrees):
+    s = 1.0 / (len(graph) - 1.0)
+    return dict((v, d * s) for v, d in degrees.iteritems())
+
+def _is_connected(graph, components):
+    if len(graph) == 0:
+        raise nx.NetworkXPointlessConcept('Connectivity is undefined for the null graph.')
+    return len(components) == 1
+
+def _path_metrics_chunk(graph, sources):
+    # Betweenness dependencies and closeness for a chunk of sources, sharing
+    # one BFS per source
+    betweenness = dict.fromkeys(graph, 0.0)
+    closeness = {}
+    n = len(graph)
+    for source in sources:
+        dist = _accumulate_pivot_dependencies(graph, source, betweenness)
+        total = sum(dist.itervalues())
+        closeness[source] = 0.0
+        if total > 0 and n > 1:
+            # Same as nx.closeness_centrality, normalized
+            closeness[source] = ((len(dist) - 1.0) / total) * ((len(dist) - 1.0) / (n - 1))
+    return betweenness, closeness
+
+def _clustering_chunk(graph, sources):
+    # Local clustering of each source, like nx.clustering (self loops ignored)
+    adj = graph.adj
+    clustering = {}
+    for v in sources:
+        neighbors = set(adj[v]) - set([v])
+        d = len(neighbors)
+        if d < 2:
+            clustering[v] = 0.0
+            continue
+        links = sum(len(neighbors.intersection(adj[w])) for w in neighbors)
+        clustering[v] = links / float(d * (d - 1))
+    return clustering
+
+_worker_graph = None
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+CHUNK_FUNCTIONS = {
+    'paths': _path_metrics_chunk,
+    'clustering': _clustering_chunk,
+}
+
+def _run_chunk(task):
+    name, sources = task
+    return name, CHUNK_FUNCTIONS[name](_worker_graph, sources)
+
+def _chunks(nodes, num_chunks):
+    size = max(1, int(math.ceil(len(nodes) / float(max(num_chunks, 1)))))
+    return [nodes[i:i + size] for i in range(0, len(nodes), size)]
+
+def run_heavy_metrics(graph, processes=None):
+    # Runs the chunked path and clustering work, on a pool of processes
+    # (serially when processes is 1) and combines the chunks into the shared
+    # 'betweenness', 'closeness' and 'clustering' intermediates
+    if graph.is_directed():
+        raise nx.NetworkXError('Clustering algorithms are not defined for directed graphs.')
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    nodes = list(graph)
+    tasks = []
+    for name in ['paths', 'clustering']:
+        for chunk in _chunks(nodes, 4 * processes):
+            tasks.append((name, chunk))
+
+    if processes == 1:
+        _init_worker(graph)
+        try:
+            results = map(_run_chunk, tasks)
+        finally:
+            _init_worker(None)
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (graph,))
+        try:
+            results = pool.map(_run_chunk, tasks, 1)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    betweenness = dict.fromkeys(graph, 0.0)
+    closeness = {}
+    clustering = {}
+    for name, result in results:
+        if name == 'paths':
+            partial_betweenness, partial_closeness = result
+            for v, value in partial_betweenness.iteritems():
+                betweenness[v] += value
+            closeness.update(partial_closeness)
+        else:
+            clustering.update(result)
+
+    # Normalized like nx.betweenness_centrality
+    n = len(graph)
+    if n > 2:
+        scale = 1.0 / ((n - 1) * (n - 2))
+        for v in betweenness:
+            betweenness[v] *= scale
+    return {'betweenness': betweenness, 'closeness': closeness, 'clustering': clustering}
+
+def _average_clustering(graph, shared):
+    if len(graph) == 0:
+        raise ZeroDivisionError('average clustering of the null graph')
+    return sum(shared['clustering'].itervalues()) / len(graph)
+
+# (key in dictionary_to_write_out, inputs used, metric, version).  The inputs
+# are shared intermediates, plus 'weights' for metrics that read edge weights.
+# Bump a metric's version when its output changes so cached values are redone.
+METRIC_PLAN = [
+    ("Number of Nodes:", [], lambda g, shared: g.number_of_nodes(), 1),
+    ("Number of edges:", [], lambda g, shared: g.number_of_edges(), 1),
+    ("Betweenness: ", ['betweenness'], lambda g, shared: shared['betweenness'], 1),
+    ("Density: ", [], lambda g, shared: nx.density(g), 1),
+    ("Degree Frequency: ", ['degrees'], lambda g, shared: _degree_histogram(shared['degrees']), 1),
+    ("Node Connectivity: ", ['components'], lambda g, shared: _is_connected(g, shared['components']), 1),
+    ("Graph Centrality:", ['degrees'], lambda g, shared: _degree_centrality(g, shared['degrees']), 1),
+    ("Closeness Centrality:", ['closeness'], lambda g, shared: shared['closeness'], 1),
+    ("Clustering of Graph:", ['clustering'], _average_clustering, 1),
+    ("Number of graphs:", ['components'], lambda g, shared: len(shared['components']), 1),
+    ("Disjoint: ", ['components'], lambda g, shared: len(shared['components']) > 1, 1),
+]
+
+# Metrics replaced by their sampled variants when approximating
+HEAVY_METRIC_FUNCTIONS = set(entry[2] for entry in METRIC_PLAN
+                             if set(entry[1]) & set(['betweenness', 'closeness', 'clustering']))
+
+def shared_intermediates_needed(plan):
+    # The cheap intermediates (those in INTERMEDIATES) used by the plan
+    needed = []
+    for entry in plan:
+        for name in entry[1]:
+            if name in INTERMEDIATES and name not in needed:
+                needed.append(name)
+    return needed
+
+
+
+# Metrics cache
+#
+# Exact metric results are stored as JSON under metrics_cache_dir, one file
+# per graph fingerprint: a SHA-1 of the topology, and of the edge weights too
+# for metrics that read them.  Entries are keyed by metric and version, so
+# editing a graph only recomputes the metrics whose inputs changed and a
+# version bump only recomputes that metric.
+
+def graph_fingerprint(graph, weights=False):
+    # Independent of node and edge order; undirected edges are stored with
+    # their ends sorted
+    digest = hashlib.sha1()
+    digest.update('directed' if graph.is_directed() else 'undirected')
+    for node in sorted(repr(v) for v in graph):
+        digest.update('n' + node + '\n')
+    edges = []
+    for u, nbrs in graph.adj.iteritems():
+        for v, data in nbrs.iteritems():
+            ends = (repr(u), repr(v))
+            if not graph.is_directed():
+                if ends[0] > ends[1]:
+                    continue
+            edge = 'e' + ends[0] + ' ' + ends[1]
+            if weights:
+                edge += ' ' + repr(data.get('weight'))
+            edges.append(edge)
+    for edge in sorted(edges):
+        digest.update(edge + '\n')
+    return digest.hexdigest()
+
+def _encode_value(value):
+    # JSON objects only have string keys, so node dictionaries are kept as
+    # lists of [node, value] pairs
+    if isinstance(value, dict):
+        return {'pairs': [[k, _encode_value(v)] for k, v in value.iteritems()]}
+    return value
+
+def _decode_node(node):
+    # JSON turns tuple nodes (e.g. grid coordinates) into lists
+    if isinstance(node, list):
+        return tuple(_decode_node(part) for part in node)
+    if isinstance(node, unicode):
+        try:
+            return node.encode('ascii')
+        except UnicodeEncodeError:
+            return node
+    return node
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return dict((_decode_node(k), _decode_value(v)) for k, v in value['pairs'])
+    return value
+
+def _entry_fingerprint(graph, entry, fingerprints):
+    # The fingerprint a plan entry is cached under, memoized in fingerprints
+    weights = 'weights' in entry[1]
+    if weights not in fingerprints:
+        fingerprints[weights] = graph_fingerprint(graph, weights)
+    return fingerprints[weights]
+
+def metric_cache_key(entry):
+    return entry[0] + '|v' + str(entry[3])
+
+def load_metrics_cache(fingerprint, cache_dir=None):
+    # The cached entries of one fingerprint ({} when there are none)
+    path = os.path.join(cache_dir or metrics_cache_dir, fingerprint + '.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def save_metrics_cache(fingerprint, entries, cache_dir=None):
+    # Written to a temporary file of its own and renamed, so readers never
+    # see half a file and concurrent writers never share one
+    cache_dir = cache_dir or metrics_cache_dir
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    path = os.path.join(cache_dir, fingerprint + '.json')
+    handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w') as f:
+            json.dump(entries, f)
+        os.rename(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+
 #
 # # Run the main method
 # if __name__ == "__main__":
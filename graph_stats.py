@@ -0,0 +1,253 @@
+import heapq
+
+import networkx as nx
+
+
+
+# Key under graph.graph where the cached statistics live
+STATS_KEY = 'graph_stats.cache'
+
+
+
+####################################################################################
+'''
+Builds the statistics of a graph from scratch: node and edge counts, the multiset of
+edge weights (with min/max heaps over its distinct values), every node's degree and
+the degree histogram. Connectivity is left unknown until it is first asked for.
+    Args:
+        graph: A networkx graph instance.
+
+    Returns:
+        A statistics dictionary.
+'''
+####################################################################################
+def build_graph_stats(graph):
+    stats = {}
+    stats['num_nodes'] = graph.number_of_nodes()
+    stats['num_edges'] = 0
+    stats['directed'] = graph.is_directed()
+    stats['weight_counts'] = {}
+    stats['max_heap'] = []
+    stats['min_heap'] = []
+    stats['degree'] = dict((node, 0) for node in graph)
+    stats['degree_histogram'] = {}
+    stats['components'] = None
+    for u, v, data in graph.edges_iter(data=True):
+        stats['num_edges'] += 1
+        _add_weight(stats, data.get('weight'))
+        stats['degree'][u] += 1
+        stats['degree'][v] += 1
+    for node in stats['degree']:
+        _histogram_add(stats, stats['degree'][node], 1)
+    return stats
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns the cached statistics of a graph, building them on first use. Statistics
+whose node count no longer matches the graph are rebuilt; edges or weights changed
+without going through simhelper must be followed by invalidate_graph_stats.
+    Args:
+        graph: A networkx graph instance.
+
+    Returns:
+        The statistics dictionary of the graph.
+'''
+####################################################################################
+def get_graph_stats(graph):
+    stats = graph.graph.get(STATS_KEY)
+    if stats is None or stats['num_nodes'] != graph.number_of_nodes():
+        stats = build_graph_stats(graph)
+        graph.graph[STATS_KEY] = stats
+    return stats
+####################################################################################
+
+
+
+####################################################################################
+'''
+Drops the cached statistics of a graph so that the next query rebuilds them.
+    Args:
+        graph: A networkx graph instance.
+'''
+####################################################################################
+def invalidate_graph_stats(graph):
+    graph.graph.pop(STATS_KEY, None)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Statistics queries. Each runs in O(1), except max/min weight which discard stale
+heap entries (amortized O(log n)) and connectivity which recomputes the components
+only after an edge or node removal.
+'''
+####################################################################################
+def max_weight(graph):
+    stats = get_graph_stats(graph)
+    heap = stats['max_heap']
+    while heap and stats['weight_counts'].get(-heap[0], 0) == 0:
+        heapq.heappop(heap)
+    return -heap[0] if heap else float('-inf')
+
+def min_weight(graph):
+    stats = get_graph_stats(graph)
+    heap = stats['min_heap']
+    while heap and stats['weight_counts'].get(heap[0], 0) == 0:
+        heapq.heappop(heap)
+    return heap[0] if heap else float('inf')
+
+def number_of_nodes(graph):
+    return get_graph_stats(graph)['num_nodes']
+
+def number_of_edges(graph):
+    return get_graph_stats(graph)['num_edges']
+
+def density(graph):
+    # Same definition as nx.density
+    stats = get_graph_stats(graph)
+    n = stats['num_nodes']
+    m = stats['num_edges']
+    if m == 0 or n <= 1:
+        return 0.0
+    if stats['directed']:
+        return m / float(n * (n - 1))
+    return m * 2.0 / (n * (n - 1))
+
+def degree_histogram(graph):
+    # Same layout as nx.degree_histogram: entry d counts the nodes of degree d
+    histogram = get_graph_stats(graph)['degree_histogram']
+    if not histogram:
+        return []
+    return [histogram.get(d, 0) for d in range(max(histogram) + 1)]
+
+def is_connected(graph):
+    # Undirected graphs only, like nx.is_connected
+    if graph.is_directed():
+        raise nx.NetworkXNotImplemented('not implemented for directed type')
+    stats = get_graph_stats(graph)
+    if stats['num_nodes'] == 0:
+        raise nx.NetworkXPointlessConcept('Connectivity is undefined for the null graph.')
+    if stats['components'] is None:
+        _build_components(stats, graph)
+    return stats['components']['count'] == 1
+####################################################################################
+
+
+
+####################################################################################
+'''
+Mutation records. simhelper calls these around every change it makes, so attached
+statistics stay current; they do nothing for graphs without statistics.
+    record_edge_removal must be called before the edge is removed, the others after
+    the change is made.
+'''
+####################################################################################
+def record_edge_addition(graph, u, v):
+    stats = graph.graph.get(STATS_KEY)
+    if stats is None:
+        return
+    stats['num_edges'] += 1
+    _add_weight(stats, graph.edge[u][v].get('weight'))
+    _change_degree(stats, u, 1)
+    _change_degree(stats, v, 1)
+    if stats['components'] is not None:
+        _union(stats['components'], u, v)
+
+def record_edge_removal(graph, u, v):
+    stats = graph.graph.get(STATS_KEY)
+    if stats is None:
+        return
+    stats['num_edges'] -= 1
+    _remove_weight(stats, graph.edge[u][v].get('weight'))
+    _change_degree(stats, u, -1)
+    _change_degree(stats, v, -1)
+    stats['components'] = None
+
+def record_node_addition(graph, node):
+    stats = graph.graph.get(STATS_KEY)
+    if stats is None:
+        return
+    stats['num_nodes'] += 1
+    stats['degree'][node] = 0
+    _histogram_add(stats, 0, 1)
+    if stats['components'] is not None:
+        stats['components']['parent'][node] = node
+        stats['components']['count'] += 1
+
+def record_node_removal(graph, node):
+    # Called before the node is removed; accounts for its incident edges too
+    stats = graph.graph.get(STATS_KEY)
+    if stats is None:
+        return
+    incident = graph.edges(node)
+    if graph.is_directed():
+        incident += [(u, v) for u, v in graph.in_edges(node) if u != v]
+    for u, v in incident:
+        record_edge_removal(graph, u, v)
+    _histogram_add(stats, stats['degree'].pop(node), -1)
+    stats['num_nodes'] -= 1
+    stats['components'] = None
+
+def record_weight_change(graph, u, v, new_weight):
+    # Called before the new weight is written
+    stats = graph.graph.get(STATS_KEY)
+    if stats is None:
+        return
+    _remove_weight(stats, graph.edge[u][v].get('weight'))
+    _add_weight(stats, new_weight)
+####################################################################################
+
+
+
+def _add_weight(stats, weight):
+    if weight is None:
+        return
+    counts = stats['weight_counts']
+    counts[weight] = counts.get(weight, 0) + 1
+    if counts[weight] == 1:
+        heapq.heappush(stats['max_heap'], -weight)
+        heapq.heappush(stats['min_heap'], weight)
+
+def _remove_weight(stats, weight):
+    if weight is None:
+        return
+    stats['weight_counts'][weight] -= 1
+    if stats['weight_counts'][weight] == 0:
+        del stats['weight_counts'][weight]
+
+def _histogram_add(stats, degree, count):
+    histogram = stats['degree_histogram']
+    histogram[degree] = histogram.get(degree, 0) + count
+    if histogram[degree] == 0:
+        del histogram[degree]
+
+def _change_degree(stats, node, change):
+    degree = stats['degree'][node]
+    _histogram_add(stats, degree, -1)
+    _histogram_add(stats, degree + change, 1)
+    stats['degree'][node] = degree + change
+
+def _build_components(stats, graph):
+    components = {'parent': dict((node, node) for node in graph), 'count': graph.number_of_nodes()}
+    for u, v in graph.edges_iter():
+        _union(components, u, v)
+    stats['components'] = components
+
+def _find(parent, node):
+    root = node
+    while parent[root] != root:
+        root = parent[root]
+    while parent[node] != root:
+        parent[node], node = root, parent[node]
+    return root
+
+def _union(components, u, v):
+    root_u = _find(components['parent'], u)
+    root_v = _find(components['parent'], v)
+    if root_u != root_v:
+        components['parent'][root_u] = root_v
+        components['count'] -= 1
@@ -0,0 +1,315 @@
+from array import array
+import xml.etree.cElementTree as ElementTree
+
+import networkx as nx
+import numpy as np
+from networkx.readwrite.graphml import GraphML
+
+import ingest
+
+
+
+# GraphML element tags, with their namespace as iterparse reports them
+GRAPHML_TAGS = dict((name, '{%s}%s' % (GraphML.NS_GRAPHML, name))
+                    for name in ['key', 'default', 'graph', 'node', 'edge', 'data', 'port', 'hyperedge'])
+
+# Typed array codes used to collect numeric columns while parsing
+ARRAY_CODES = {int: 'l', long: 'l', float: 'd', bool: 'b'}
+
+
+
+####################################################################################
+'''
+Reads a GraphML file like nx.read_graphml, with the same attribute types, defaults
+and graph attributes, but parses it incrementally: every node and edge is added to
+the graph as soon as its element ends and the element is then discarded, so the
+whole document is never held in memory. Files this reader does not handle (yFiles
+data, ports, nested graphs, parallel edges) are handed to nx.read_graphml.
+    Args:
+        path: The GraphML file
+        node_type: The type node ids are converted to
+
+    Returns:
+        A networkx Graph or DiGraph (or a multigraph from nx.read_graphml)
+'''
+####################################################################################
+def read_graphml(path, node_type=str):
+    try:
+        return _build_graph(path, node_type)
+    except _Unsupported:
+        return nx.read_graphml(path, node_type)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Reads a GraphML file straight into graph arrays, without building a networkx
+graph. Attribute values are converted to their key's type as they are parsed and
+collected in typed arrays (numeric keys) or lists (string keys). Repeated edges
+keep the last occurrence's attributes.
+    Args:
+        path: The GraphML file
+        node_type: The type node ids are converted to
+
+    Returns:
+        A graph arrays dictionary (see ingest.ingest_edge_list) with 'node_columns'
+        and 'edge_columns' holding an array of values per attribute (an object
+        array with None for missing values when not every node or edge has it),
+        plus 'graph', the graph attributes
+
+    Raises:
+        NotImplementedError: For GraphML this reader does not handle (yFiles
+                             data, ports, nested graphs); read_graphml reads those
+'''
+####################################################################################
+def read_graphml_arrays(path, node_type=str):
+    try:
+        return _build_arrays(path, node_type)
+    except _Unsupported as error:
+        raise NotImplementedError(path + ': ' + str(error) + ' are not supported by '
+                                  'read_graphml_arrays; use read_graphml')
+####################################################################################
+
+
+
+def _build_arrays(path, node_type):
+    # The collecting loop of read_graphml_arrays
+    positions = {}
+    nodes = []
+    node_columns = {}
+    sources = array('l')
+    targets = array('l')
+    edge_columns = {}
+    graph = {}
+    directed = False
+
+    def position(node):
+        if node not in positions:
+            positions[node] = len(nodes)
+            nodes.append(node)
+        return positions[node]
+
+    for item in _graphml_items(path):
+        kind = item[0]
+        if kind == 'node':
+            node = position(node_type(item[1]))
+            for name, value in item[2].iteritems():
+                _add_value(node_columns, name, node, value)
+        elif kind == 'edge':
+            source, target, data = item[1:]
+            sources.append(position(node_type(source)))
+            targets.append(position(node_type(target)))
+            for name, value in data.iteritems():
+                _add_value(edge_columns, name, len(sources) - 1, value)
+        elif kind == 'graph':
+            directed = item[1]
+            graph.update(item[2])
+        else:
+            graph.update(item[1])
+
+    node_columns = dict((name, _column_array(column, len(nodes)))
+                        for name, column in node_columns.iteritems())
+    names = list(edge_columns)
+    columns = [_column_array(edge_columns.pop(name), len(sources)) for name in names]
+    edges = [np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)]
+    del sources, targets
+    offsets, neighbors, columns = ingest.edges_to_csr(len(nodes), edges, columns, directed)
+    return {'nodes': nodes, 'directed': directed, 'offsets': offsets, 'neighbors': neighbors,
+            'node_columns': node_columns, 'edge_columns': dict(zip(names, columns)), 'graph': graph}
+
+
+
+####################################################################################
+'''
+Parses a GraphML file incrementally, yielding the first graph's contents as they
+are read:
+    ('graph', directed, attrs) when the graph starts, attrs holding the
+        'node_default' and 'edge_default' dictionaries
+    ('node', id, data) and ('edge', source, target, data) for every node and edge,
+        with data typed as nx.read_graphml types it ('id' holds an edge's id)
+    ('attrs', data) for the graph's own data elements, at the end of the graph
+Processed elements are cleared and detached, so memory stays flat however large
+the file is.
+    Args:
+        path: The GraphML file
+'''
+####################################################################################
+def _graphml_items(path):
+    graph_tag, node_tag, edge_tag, data_tag, key_tag = [GRAPHML_TAGS[name] for name in
+                                                        ['graph', 'node', 'edge', 'data', 'key']]
+    keys = {}
+    defaults = {}
+    graph = None
+    directed = False
+    with open(path, 'rb') as f:
+        for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+            tag = element.tag
+            if event == 'start':
+                if tag == graph_tag:
+                    if graph is not None:
+                        # A nested graph; the end of the first graph ends the parse
+                        raise _Unsupported('nested graphs')
+                    graph = element
+                    directed = element.get('edgedefault') == 'directed'
+                    yield 'graph', directed, _graph_defaults(keys, defaults)
+                elif tag == GRAPHML_TAGS['hyperedge']:
+                    raise nx.NetworkXError('GraphML reader does not support hyperedges')
+                elif tag == GRAPHML_TAGS['port']:
+                    raise _Unsupported('ports')
+                continue
+
+            # Data elements are read with their node, edge or graph
+            if tag == data_tag:
+                continue
+            if tag == key_tag:
+                _read_key(element, keys, defaults)
+                continue
+            if graph is None:
+                continue
+            if tag == node_tag:
+                yield 'node', element.get('id'), _decode_data(element.findall(data_tag), keys)
+            elif tag == edge_tag:
+                edge_directed = element.get('directed')
+                if directed and edge_directed == 'false':
+                    raise nx.NetworkXError('directed=false edge found in directed graph.')
+                if not directed and edge_directed == 'true':
+                    raise nx.NetworkXError('directed=true edge found in undirected graph.')
+                data = _decode_data(element.findall(data_tag), keys)
+                edge_id = element.get('id')
+                if edge_id:
+                    data['id'] = edge_id
+                if edge_id is None:
+                    data.pop('key', None)
+                yield 'edge', element.get('source'), element.get('target'), data
+            elif tag == graph_tag:
+                # Only the graph's own data elements are left in it. As with
+                # nx.read_graphml, the first graph of a file is the one read.
+                yield 'attrs', _decode_data(element.findall(data_tag), keys)
+                return
+            else:
+                continue
+            element.clear()
+            graph.remove(element)
+####################################################################################
+
+
+
+class _Unsupported(Exception):
+    # Raised for GraphML features left to nx.read_graphml, naming the feature
+    pass
+
+def _build_graph(path, node_type):
+    # The node and adjacency dictionaries are filled in directly, as in
+    # graph_binary.csr_to_networkx
+    graph = None
+    for item in _graphml_items(path):
+        kind = item[0]
+        if kind == 'node':
+            node = node_type(item[1])
+            if node in graph.node:
+                graph.node[node].update(item[2])
+            else:
+                _new_node(graph, node, item[2])
+        elif kind == 'edge':
+            u = node_type(item[1])
+            v = node_type(item[2])
+            for node in [u, v]:
+                if node not in graph.node:
+                    _new_node(graph, node, {})
+            succ = graph.succ if graph.is_directed() else graph.adj
+            pred = graph.pred if graph.is_directed() else graph.adj
+            if v in succ[u]:
+                # Parallel edges make nx.read_graphml return a multigraph
+                raise _Unsupported('parallel edges')
+            succ[u][v] = item[3]
+            pred[v][u] = item[3]
+        elif kind == 'graph':
+            graph = nx.DiGraph() if item[1] else nx.Graph()
+            graph.graph.update(item[2])
+        else:
+            graph.graph.update(item[1])
+    return graph
+
+def _new_node(graph, node, data):
+    graph.node[node] = data
+    if graph.is_directed():
+        graph.succ[node] = {}
+        graph.pred[node] = {}
+    else:
+        graph.adj[node] = {}
+
+def _read_key(element, keys, defaults):
+    # Same interpretation as networkx's GraphMLReader.find_graphml_keys
+    key_id = element.get('id')
+    attr_type = element.get('attr.type')
+    attr_name = element.get('attr.name')
+    if element.get('yfiles.type') is not None:
+        attr_name = element.get('yfiles.type')
+        attr_type = 'yfiles'
+    if attr_type is None:
+        attr_type = 'string'
+    if attr_name is None:
+        raise nx.NetworkXError('Unknown key for id %s in file.' % key_id)
+    keys[key_id] = {'name': attr_name, 'type': GraphML.python_type[attr_type], 'for': element.get('for')}
+    default = element.find(GRAPHML_TAGS['default'])
+    if default is not None:
+        defaults[key_id] = default.text
+
+def _graph_defaults(keys, defaults):
+    attrs = {'node_default': {}, 'edge_default': {}}
+    for key_id, value in defaults.iteritems():
+        key = keys[key_id]
+        if key['for'] in ['node', 'edge']:
+            attrs[key['for'] + '_default'][key['name']] = key['type'](value)
+    return attrs
+
+def _decode_data(data_elements, keys):
+    data = {}
+    for data_element in data_elements:
+        key_id = data_element.get('key')
+        if key_id not in keys:
+            raise nx.NetworkXError('Bad GraphML data: no key %s' % key_id)
+        if len(data_element):
+            # yFiles graphics data
+            raise _Unsupported('yFiles data elements')
+        text = data_element.text
+        if text is None:
+            continue
+        data_type = keys[key_id]['type']
+        if data_type is bool:
+            data[keys[key_id]['name']] = GraphML.convert_bool[text]
+        else:
+            data[keys[key_id]['name']] = data_type(text)
+    return data
+
+def _add_value(columns, name, position, value):
+    # Columns hold the positions that have a value and the values, typed
+    # arrays for numbers and lists for anything else
+    if name not in columns:
+        code = ARRAY_CODES.get(type(value))
+        columns[name] = (array('l'), array(code) if code else [])
+    column_positions, values = columns[name]
+    if isinstance(values, array):
+        try:
+            if ARRAY_CODES.get(type(value)) == values.typecode:
+                values.append(value)
+                column_positions.append(position)
+                return
+        except OverflowError:
+            pass
+        values = list(values)
+        columns[name] = (column_positions, values)
+    column_positions.append(position)
+    values.append(value)
+
+def _column_array(column, length):
+    column_positions, values = column
+    column_positions = np.array(column_positions, dtype=np.int64)
+    if isinstance(values, array):
+        values = np.array(values, dtype={'l': np.int64, 'd': np.float64, 'b': bool}[values.typecode])
+        if np.array_equal(column_positions, np.arange(length)):
+            return values
+    column = np.empty(length, dtype=object)
+    column[column_positions] = list(values)
+    return column
@@ -0,0 +1,387 @@
+import numpy as np
+
+import spatial_index
+
+
+
+# Bytes of text parsed per block
+block_bytes = 1 << 24
+
+# Comment characters: a line is cut at the first of them, as nx.read_edgelist
+# cuts lines at '#', so comment lines, indented comments and trailing comments
+# are all skipped
+COMMENT_PREFIXES = ('#', '%')
+
+# Integers from this magnitude up are not all exactly representable as float64
+FLOAT_EXACT_LIMIT = 2 ** 53
+
+
+
+####################################################################################
+'''
+Reads an edge list (SNAP-style 'u v [w ...]' lines, or CSV rows with delimiter=',')
+in blocks, without building a networkx graph. Each block is parsed with one split
+and vectorized conversions; node ids are numbered as they are first seen. Repeated
+edges are collapsed, the last occurrence's attributes winning as they would with
+add_edge, and undirected graphs get every edge in both rows.
+    Args:
+        path: The edge list file
+        directed: True to read the edges as directed
+        delimiter: None for whitespace separated fields, or a one-character delimiter
+        nodetype: str, or int to read numeric node ids as integers
+        attr_names: Names of the fields after the two endpoints
+        attr_types: The type of each of those fields (int, float or str); float
+                    by default
+
+    Returns:
+        A graph arrays dictionary: 'nodes', 'directed', CSR 'offsets' and
+        'neighbors', and 'edge_columns', one array per attribute aligned with
+        'neighbors'
+'''
+####################################################################################
+def ingest_edge_list(path, directed=False, delimiter=None, nodetype=str, attr_names=(),
+                     attr_types=None):
+    if attr_types is None:
+        attr_types = [float] * len(attr_names)
+    num_fields = 2 + len(attr_names)
+    if nodetype is int and all(attr_type in [int, float] for attr_type in attr_types):
+        return _ingest_numeric_edge_list(path, directed, delimiter, attr_names, attr_types)
+    labels = {}
+    sources = []
+    targets = []
+    columns = [[] for name in attr_names]
+    for fields in read_field_blocks(path, num_fields, delimiter):
+        ends = number_labels(labels, np.concatenate([fields[:, 0], fields[:, 1]]), nodetype)
+        sources.append(ends[:len(fields)])
+        targets.append(ends[len(fields):])
+        for column, field, attr_type in zip(columns, fields[:, 2:].T, attr_types):
+            column.append(convert_field(field, attr_type))
+
+    nodes = [None] * len(labels)
+    for label, i in labels.iteritems():
+        nodes[i] = label
+    sources = _concatenate(sources, np.int64)
+    targets = _concatenate(targets, np.int64)
+    columns = [_concatenate(column, _field_dtype(attr_type)) for column, attr_type in zip(columns, attr_types)]
+    offsets, neighbors, columns = edges_to_csr(len(nodes), [sources, targets], columns, directed)
+    return {'nodes': nodes, 'directed': directed, 'offsets': offsets, 'neighbors': neighbors,
+            'node_columns': {}, 'edge_columns': dict(zip(attr_names, columns))}
+####################################################################################
+
+
+
+def _ingest_numeric_edge_list(path, directed, delimiter, attr_names, attr_types):
+    # Integer node ids and numeric attributes: every block is parsed by numpy in
+    # one call and the ids are numbered in sorted order at the end. With a float
+    # attribute the whole block is parsed as floats, which hold ids exactly only
+    # up to 2**53; a block with larger ids is split and its ids parsed as int64.
+    num_fields = 2 + len(attr_names)
+    dtype = np.float64 if float in attr_types else np.int64
+    sources = []
+    targets = []
+    columns = [[] for name in attr_names]
+    for text, num_rows in _read_text_blocks(path, delimiter):
+        block = _parse_numbers(path, text, num_rows, num_fields, dtype)
+        if not len(block):
+            continue
+        ends = block[:, :2]
+        if dtype is np.float64 and np.abs(ends).max() >= FLOAT_EXACT_LIMIT:
+            ends = np.array(text.split()).reshape(-1, num_fields)[:, :2].astype(np.int64)
+        sources.append(ends[:, 0].astype(np.int64))
+        targets.append(ends[:, 1].astype(np.int64))
+        for k, attr_type in enumerate(attr_types):
+            columns[k].append(block[:, 2 + k].astype(_field_dtype(attr_type)))
+    sources = _concatenate(sources, np.int64)
+    targets = _concatenate(targets, np.int64)
+    columns = [_concatenate(column, _field_dtype(attr_type)) for column, attr_type in zip(columns, attr_types)]
+    nodes = np.unique(np.concatenate([sources, targets]))
+    edges = [np.searchsorted(nodes, sources), np.searchsorted(nodes, targets)]
+    del sources, targets
+    offsets, neighbors, columns = edges_to_csr(len(nodes), edges, columns, directed)
+    return {'nodes': nodes.tolist(), 'directed': directed, 'offsets': offsets, 'neighbors': neighbors,
+            'node_columns': {}, 'edge_columns': dict(zip(attr_names, columns))}
+
+
+
+####################################################################################
+'''
+Reads an iot/*.csv style device list (name, coordinates and optionally a range per
+device) with read_device_rows and connects the devices with spatial_index, giving the graphs
+iot_spy.iot_graph (per-device ranges, directed) and iot_spy.iot_graph_xyz (one
+radius, undirected) build, as compact arrays. A device listed twice keeps its
+last row, as in those functions.
+    Args:
+        path: The device list file
+        fields: The field names after the device name, e.g. ['x', 'y', 'range'] or
+                ['x', 'y', 'z']; 'range' gives every device its own range
+        radius: The broadcast range shared by all devices when there is no 'range'
+                field
+
+    Returns:
+        A graph arrays dictionary (see ingest_edge_list) whose 'node_columns'
+        hold the device fields
+'''
+####################################################################################
+def ingest_devices(path, fields, radius=None):
+    nodes, values = read_device_rows(path, fields)
+    node_columns = dict((field, values[:, k]) for k, field in enumerate(fields))
+
+    coordinates = values[:, [k for k, field in enumerate(fields) if field != 'range']]
+    directed = 'range' in fields
+    if directed:
+        edges = list(spatial_index.variable_radius_pairs(coordinates, node_columns['range']))
+    else:
+        edges = list(spatial_index.fixed_radius_pairs(coordinates, radius))
+    offsets, neighbors, columns = edges_to_csr(len(nodes), edges, [], directed)
+    return {'nodes': nodes, 'directed': directed, 'offsets': offsets, 'neighbors': neighbors,
+            'node_columns': node_columns, 'edge_columns': {}}
+####################################################################################
+
+
+
+####################################################################################
+'''
+Reads the rows of an iot/*.csv style device list (name, then the given fields) a
+block at a time. Devices are numbered in the order they first appear, which is
+the order iot_spy adds them to a graph, and a device listed twice keeps its last
+row.
+    Args:
+        path: The device list file
+        fields: The field names after the device name
+
+    Returns:
+        The device names, and an (N, len(fields)) float array of their fields
+'''
+####################################################################################
+def read_device_rows(path, fields):
+    labels = {}
+    positions = []
+    rows = []
+    for block in read_field_blocks(path, 1 + len(fields), ','):
+        distinct, first, inverse = np.unique(block[:, 0], return_index=True, return_inverse=True)
+        distinct = distinct.tolist()
+        numbers = np.empty(len(distinct), dtype=np.int64)
+        for k in np.argsort(first).tolist():
+            numbers[k] = labels.setdefault(distinct[k], len(labels))
+        positions.append(numbers[inverse])
+        rows.append(block[:, 1:].astype(float))
+
+    names = [None] * len(labels)
+    for label, i in labels.iteritems():
+        names[i] = label
+    values = np.zeros((len(names), len(fields)))
+    for position, row in zip(positions, rows):
+        values[position] = row
+    return names, values
+####################################################################################
+
+
+
+####################################################################################
+'''
+Yields the rows of a delimited text file as blocks of fields. Each block is about
+block_bytes of text, split in one call into an (rows, num_fields) array of
+strings. Blank lines and comments (see COMMENT_PREFIXES) are skipped.
+    Args:
+        path: The file to read
+        num_fields: The number of fields on every line
+        delimiter: None for whitespace, or a one-character delimiter
+
+    Returns:
+        A generator of string arrays
+'''
+####################################################################################
+def read_field_blocks(path, num_fields, delimiter=None):
+    for text, num_rows in _read_text_blocks(path, delimiter):
+        tokens = text.split()
+        if len(tokens) != num_rows * num_fields:
+            raise ValueError(path + ': expected ' + str(num_fields) + ' fields on every line')
+        if tokens:
+            yield np.array(tokens).reshape(-1, num_fields)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Like read_field_blocks, for files of numbers only: each block is parsed by numpy
+straight from the text, without splitting it into Python strings.
+    Args:
+        path: The file to read
+        num_fields: The number of fields on every line
+        delimiter: None for whitespace, or a one-character delimiter
+        dtype: The numpy type to parse the fields as
+
+    Returns:
+        A generator of (rows, num_fields) arrays
+'''
+####################################################################################
+def read_number_blocks(path, num_fields, delimiter=None, dtype=np.float64):
+    for text, num_rows in _read_text_blocks(path, delimiter):
+        values = _parse_numbers(path, text, num_rows, num_fields, dtype)
+        if len(values):
+            yield values
+####################################################################################
+
+
+
+def _parse_numbers(path, text, num_rows, num_fields, dtype):
+    values = np.fromstring(text, dtype=dtype, sep=' ')
+    if len(values) != num_rows * num_fields:
+        raise ValueError(path + ': expected ' + str(num_fields) + ' numbers on every line')
+    return values.reshape(-1, num_fields)
+
+
+
+def _strip_comment(line):
+    # The line up to its first comment character, ending in a newline
+    cuts = [line.find(prefix) for prefix in COMMENT_PREFIXES if prefix in line]
+    if not cuts:
+        return line
+    return line[:min(cuts)] + '\n'
+
+def _read_text_blocks(path, delimiter):
+    # Blocks of whole lines with comments removed and the delimiter turned into
+    # spaces, with their number of non-blank lines (whitespace-only lines are
+    # blank, as for nx.read_edgelist)
+    with open(path, 'rb') as f:
+        while True:
+            lines = f.readlines(block_bytes)
+            if not lines:
+                return
+            text = ''.join(lines)
+            if any(prefix in text for prefix in COMMENT_PREFIXES):
+                lines = map(_strip_comment, lines)
+                text = ''.join(lines)
+            num_rows = sum(map(bool, map(str.strip, lines)))
+            if delimiter is not None:
+                text = text.replace(delimiter, ' ')
+            yield text, num_rows
+
+
+
+####################################################################################
+'''
+Numbers node ids: ids already in labels keep their number, new ones are numbered in
+order. Only the distinct ids of the block go through the dictionary.
+    Args:
+        labels: A dictionary from node id to number, updated in place
+        tokens: A string array of node ids
+        nodetype: str, or int to store the ids as integers
+
+    Returns:
+        An integer array with the number of each token
+'''
+####################################################################################
+def number_labels(labels, tokens, nodetype=str):
+    if nodetype is int:
+        tokens = tokens.astype(np.int64)
+    distinct, inverse = np.unique(tokens, return_inverse=True)
+    numbers = np.fromiter((labels.setdefault(label, len(labels)) for label in distinct.tolist()),
+                          dtype=np.int64, count=len(distinct))
+    return numbers[inverse]
+####################################################################################
+
+
+
+####################################################################################
+'''
+Builds sorted, duplicate-free CSR arrays from edge arrays, carrying edge attribute
+columns along. For a repeated edge the last occurrence is kept. Undirected edges
+are put in one orientation so that u-v and v-u collapse, and are then placed in
+both rows directly rather than by sorting a mirrored copy, so that no array of
+twice the edge count is needed on top of the result.
+    Args:
+        num_nodes: The number of nodes
+        edges: A list [sources, targets] of integer arrays; it is emptied so that
+               the arrays can be freed as soon as they are used up
+        columns: A list of attribute arrays, one value per edge
+        directed: False to collapse and mirror undirected edges
+
+    Returns:
+        offsets, neighbors and the list of attribute arrays aligned with neighbors
+'''
+####################################################################################
+def edges_to_csr(num_nodes, edges, columns, directed):
+    sources, targets = edges
+    del edges[:]
+    if not directed:
+        swap = sources > targets
+        sources[swap], targets[swap] = targets[swap], sources[swap]
+        del swap
+    width = max(num_nodes, 1)
+    keys = sources * width + targets
+    del sources, targets
+    keys, columns = _last_of_each(keys, columns)
+    sources = keys // width
+    keys -= sources * width
+    targets = keys
+    del keys
+
+    forward_count = np.bincount(sources, minlength=num_nodes)
+    if directed:
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(forward_count, out=offsets[1:])
+        return offsets, targets, columns
+
+    # Row r lists its smaller neighbors (from edges (u, r)) and then its larger
+    # ones (from edges (r, v), self loop included), so rows come out sorted
+    mirror = sources != targets
+    back_rows = targets[mirror]
+    back_neighbors = sources[mirror]
+    order = np.argsort(back_rows * width + back_neighbors)
+    back_rows = back_rows[order]
+    back_neighbors = back_neighbors[order]
+    back_count = np.bincount(back_rows, minlength=num_nodes)
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(back_count + forward_count, out=offsets[1:])
+
+    back_positions = offsets[back_rows] + _rank_in_row(back_rows, back_count)
+    forward_positions = offsets[sources] + back_count[sources] + _rank_in_row(sources, forward_count)
+    del back_rows
+    neighbors = np.empty(offsets[-1], dtype=np.int64)
+    neighbors[back_positions] = back_neighbors
+    neighbors[forward_positions] = targets
+    placed = []
+    for column in columns:
+        values = np.empty(offsets[-1], dtype=column.dtype)
+        values[back_positions] = column[mirror][order]
+        values[forward_positions] = column
+        placed.append(values)
+    return offsets, neighbors, placed
+####################################################################################
+
+
+
+def convert_field(field, field_type):
+    # Vectorized conversion of a string array
+    if field_type is str:
+        return field
+    return field.astype(_field_dtype(field_type))
+
+def _field_dtype(field_type):
+    return {int: np.int64, float: np.float64}.get(field_type, object)
+
+def _concatenate(arrays, dtype):
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(arrays)
+
+def _rank_in_row(rows, counts):
+    # Position of each entry among the entries of its row, for rows sorted
+    starts = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    return np.arange(len(rows)) - starts[rows]
+
+def _last_of_each(keys, columns):
+    # Sorts the edge keys, keeping the last of equal edges. Without attributes
+    # any copy will do, and sorting the keys alone is faster.
+    if not columns:
+        keys.sort()
+        return keys[np.concatenate([keys[1:] != keys[:-1], [True]])], []
+    order = np.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    order = order[last]
+    return keys[last], [column[order] for column in columns]
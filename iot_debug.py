@@ -33,24 +33,19 @@ def test_graph_cross():
     for node in g:
         g.node[node]['online'] = True # Each node should be online at first
         g.node[node]['broadcast_delay'] = 0
-        for hasnode in g:
-            g.node[node]['has_' + hasnode] = False # Every node should not have each other's information
     
     ug = helper.to_directed(g)
-    
-    for u in ug.edge:
-        for v in ug.edge[u]:
-            ug.edge[u][v]['broadcast_information'] = None
+    config.reset_information(ug) # Every node should not have each other's information
     
     return ug
 
 
 g = test_graph_cross()
-# 'has_1' is odd in this context, but whatever
-g.node['2']['has_1'] = True
-g.node['3']['has_1'] = True
-g.node['4']['has_1'] = True
-g.node['5']['has_1'] = True
+# Node 1's information everywhere but at node 1 is odd in this context, but whatever
+config.give_information(g, '2', '1')
+config.give_information(g, '3', '1')
+config.give_information(g, '4', '1')
+config.give_information(g, '5', '1')
 
 config.before_round_start(g, [], [], [], [], 'run_name')
 
@@ -1,14 +1,23 @@
 # Python Library Packages
 import networkx as nx
+import numpy as np
 import random as rand
 import sys
 import copy
-import csv
+import multiprocessing
+from itertools import izip
 
 # Cyclical dependency to main
 import simengine as engine # < Driver in config requires this
 import simhelper as helper
 import simdefaults as defaults
+import critical_nodes
+import device_store
+import graph_index
+import graph_stats
+import mobility
+import robustness
+import spatial_index
 
 
 #######################
@@ -33,10 +42,66 @@ rand_extra = 3
 
 csv_file = 'iot/r.csv'
 
+# The step between the radii of radius_sweep
 radius_step = 5
 
 graph_disconnect_level_threshold = 0.50
 
+# After the first simulation, only the components that lost nodes are simulated
+# again; every other component keeps the state it finished the last one with
+warm_start_removals = True
+
+# Choose the nodes to remove with critical_nodes.find_critical_nodes, a lazy greedy
+# search for the fewest nodes that bring the spread below the threshold, rather
+# than a random traffic threshold
+critical_node_search = False
+
+# Devices move between rounds when a trajectory file of round,node,x,y rows is
+# given (see mobility.read_trajectory), or else, when mobility_speed is above zero,
+# by the random waypoint model: each device heads for a random point at
+# mobility_speed per round and pauses up to mobility_max_pause rounds there.
+# Moving devices are simulated from scratch after every removal.
+mobility_trajectory = None
+mobility_speed = 0.0
+mobility_max_pause = 0
+
+# Before each simulation, bound the spread it can reach by which nodes can reach
+# which (critical_nodes.reachability_spread), and stop without simulating once the
+# bound is below graph_disconnect_level_threshold. Not used with moving devices.
+reachability_bound = True
+
+# After the first simulation, print how the graph's connectivity falls as nodes
+# are removed at random, by degree and by traffic (see robustness.removal_curves),
+# to show where along the removals full simulations are worth running
+percolation_report = True
+
+# Keys under graph.graph of the information bit numbering: each node's 'has'
+# attribute is an integer whose bit i is set when it has the information that
+# originated at information_nodes[i]
+INFORMATION_BITS_KEY = 'information_bits'
+INFORMATION_NODES_KEY = 'information_nodes'
+
+# Each node's 'lacks' attribute is a bitset of the information at least one of
+# its out-neighbors does not have. It only ever loses bits, when neighbors receive
+# information: nodes that received something are collected under
+# LACKS_CHANGED_KEY, their in-neighbors are then marked stale (LACKS_STALE_KEY)
+# and recomputed when they next broadcast. LACKS_STAMP_KEY holds the node, edge
+# and information counts the bitsets were built for.
+LACKS_CHANGED_KEY = 'lacks_changed'
+LACKS_STALE_KEY = 'lacks_stale'
+LACKS_STAMP_KEY = 'lacks_stamp'
+
+# A node broadcasts the same information on all of its out-edges, so a round's
+# broadcasts are kept per node rather than on the edges: BROADCASTS_KEY holds an
+# (epoch, {node: information}) scratch buffer, which only counts while its epoch
+# is the graph's BROADCAST_EPOCH_KEY. Ending a round moves the epoch on, which
+# discards every broadcast without clearing anything. RECEIVED_ROUND_KEY holds
+# the number of the last round whose receptions were all resolved at once by
+# receive_broadcasts, which on_node then skips.
+BROADCASTS_KEY = 'broadcasts'
+BROADCAST_EPOCH_KEY = 'broadcast_epoch'
+RECEIVED_ROUND_KEY = 'received_round'
+
 #######################
 # Global data         #
 #######################
@@ -64,6 +129,16 @@ current_graph_information_spread = 1.0 # The spread of information across the wh
 
 graph_information_spread = []
 
+# The reachability bound that stopped the driver before simulating, or None.
+# It is an upper bound, not a measured spread, so it is kept apart from the above
+reachability_spread_bound = None
+
+# The finished graphs of the last simulation, one per run
+finished_graphs = []
+
+# The percolation curves of the first simulation's graph, by removal strategy
+percolation_curves = {}
+
 
 
 val_total = 0
@@ -79,12 +154,14 @@ A logically sound place to put data processing is at the end of this method.
 '''
 ####################################################################################
 def simulation_driver():
-    global total_broadcasts_sent, total_broadcasts_received_successfully, total_broadcasts_received_overall, total_interference_failures
-    global current_broadcasts_sent, current_broadcasts_received_successfully, current_broadcasts_received_overall, current_interference_failures
-    global all_nodes_removed, nodes_to_remove
+    global all_nodes_removed, nodes_to_remove, current_graph_information_spread
+    global reachability_spread_bound
+    reachability_spread_bound = None
     
     # First read in a graph with initial
     graph = iot_graph(csv_file)
+    if (mobility_trajectory is not None or mobility_speed > 0):
+        track_mobility(graph, csv_file)
     
     # Output graph information
     helper.output_graph_information(graph)
@@ -92,29 +169,35 @@ def simulation_driver():
     # Store number of nodes in graph for later use (possibly)
     num_nodes = helper.num_nodes(graph)
     simulation_iteration = -1
+    affected_nodes = None
     while (current_graph_information_spread >= graph_disconnect_level_threshold):
         # More specifically, what index graph_information_spread index contains
         # the information spread chance of this current simulation
         simulation_iteration += 1
         
-        # Initialize total dictionaries
-        for node in graph.node:
-            # Total dictionaries
-            total_broadcasts_sent[node] = 0
-            total_broadcasts_received_successfully[node] = 0
-            total_broadcasts_received_overall[node] = 0
-            total_interference_failures[node] = 0
-            # Current dictionaries
-            current_broadcasts_sent[node] = 0
-            current_broadcasts_received_successfully[node] = 0
-            current_broadcasts_received_overall[node] = 0
-            current_interference_failures[node] = 0
-        
         # Simulation name will be something like "iot_p_10"
         sim_name = 'iot_' + csv_file[:len(csv_file)-4]
         
-        init(graph, sim_name)
-        engine.simulate(graph, num_runs, sim_name)
+        # No simulation can spread information further than it can ever travel.
+        # The bound reads the neighbor index, which removals patch rather than
+        # drop, so it is cheap to recompute each iteration.
+        if (reachability_bound and mobility.MOBILITY_KEY not in graph.graph):
+            bound = critical_nodes.reachability_spread(graph)
+            if (bound < graph_disconnect_level_threshold):
+                print '*' * 40
+                print 'Skipping the simulation: the graph information spread can be at most ' + \
+                str(helper.percent(bound, 1.00)) + '%!'
+                print '*' * 40
+                reachability_spread_bound = bound
+                break
+        
+        if (warm_start_removals and affected_nodes is not None and mobility.MOBILITY_KEY not in graph.graph):
+            warm_simulate(graph, finished_graphs, affected_nodes, sim_name)
+        else:
+            # Initialize total dictionaries
+            reset_counters(graph.node)
+            init(graph, sim_name)
+            engine.simulate(graph, num_runs, sim_name)
 
         print '*' * 40
         print 'This is the end of the simulation. Current graph information spread: ' + \
@@ -122,14 +205,23 @@ def simulation_driver():
         + '%!'
         print '*' * 40
         
+        if (percolation_report and simulation_iteration == 0):
+            report_percolation(graph)
+        
+        affected_nodes = removal_affected_nodes(graph, nodes_to_remove)
         helper.modify_graph_nodes(graph, [], nodes_to_remove)
         all_nodes_removed += nodes_to_remove
         nodes_to_remove = []
         
     
-    print 'The following nodes were removed to separate the graph to ' + \
-        str(helper.percent(graph_information_spread[simulation_iteration], 1.00)) \
-        + '% information spread:\n'
+    if (reachability_spread_bound is not None):
+        print 'The following nodes were removed to separate the graph to at most ' + \
+            str(helper.percent(reachability_spread_bound, 1.00)) \
+            + '% information spread (a reachability bound):\n'
+    else:
+        print 'The following nodes were removed to separate the graph to ' + \
+            str(helper.percent(graph_information_spread[simulation_iteration], 1.00)) \
+            + '% information spread:\n'
         
     for node in all_nodes_removed:
         print node
@@ -139,8 +231,131 @@ def simulation_driver():
 
 ####################################################################################
 '''
-Take a CSV file with x,y coordinates and a range for each node and determine 
-what nodes will be connected.
+Computes and prints the percolation curves of a graph (see robustness), with the
+traffic of the last simulation, and the fraction of nodes each removal order has
+to remove to bring the pair connectivity below graph_disconnect_level_threshold.
+The curves are kept in percolation_curves.
+    Args:
+        graph: A networkx graph instance.
+'''
+####################################################################################
+def report_percolation(graph):
+    global percolation_curves
+    percolation_curves = robustness.removal_curves(graph, total_broadcasts_received_overall)
+    print 'Percolation (fraction removed: largest component, pair connectivity):'
+    for strategy in robustness.STRATEGIES:
+        if strategy not in percolation_curves:
+            continue
+        curve = percolation_curves[strategy]
+        critical = robustness.critical_fraction(curve, graph_disconnect_level_threshold)
+        print '>' + strategy.ljust(8) + ' below threshold after removing ' + \
+            (str(helper.percent(critical, 1.00)) + '%' if critical is not None else 'every node')
+        step = max(1, (len(curve) - 1) // 10)
+        print '   ' + ', '.join('%.2f: %.2f, %.2f' % point for point in curve[:-1:step])
+    print ''
+####################################################################################
+
+
+
+####################################################################################
+'''
+Sets the total and current data collection counters of the given nodes to zero.
+    Args:
+        nodes: The nodes whose counters are reset
+'''
+####################################################################################
+def reset_counters(nodes):
+    global total_broadcasts_sent, total_broadcasts_received_successfully, total_broadcasts_received_overall, total_interference_failures
+    global current_broadcasts_sent, current_broadcasts_received_successfully, current_broadcasts_received_overall, current_interference_failures
+    for node in nodes:
+            # Total dictionaries
+            total_broadcasts_sent[node] = 0
+            total_broadcasts_received_successfully[node] = 0
+            total_broadcasts_received_overall[node] = 0
+            total_interference_failures[node] = 0
+            # Current dictionaries
+            current_broadcasts_sent[node] = 0
+            current_broadcasts_received_successfully[node] = 0
+            current_broadcasts_received_overall[node] = 0
+            current_interference_failures[node] = 0
+####################################################################################
+
+
+
+####################################################################################
+'''
+Finds the nodes whose simulation is affected by removing some nodes: every node
+weakly connected to one of them. Information never crosses between components,
+so every other component finishes a simulation exactly as it did before.
+    Args:
+        graph: A networkx graph instance, before the removal.
+        removed_nodes: The nodes about to be removed
+
+    Returns:
+        A set of the nodes of every component holding a removed node
+'''
+####################################################################################
+def removal_affected_nodes(graph, removed_nodes):
+    affected = set(node for node in removed_nodes if node in graph.node)
+    stack = list(affected)
+    while stack:
+        for neighbor in helper.get_unique_neighbors_list(graph, stack.pop()):
+            if neighbor not in affected:
+                affected.add(neighbor)
+                stack.append(neighbor)
+    return affected
+####################################################################################
+
+
+
+####################################################################################
+'''
+Simulates a graph after a node removal starting from the last simulation's state.
+Only the components that held removed nodes are simulated again, on a graph of
+their own; every other node keeps the information and counters it finished the
+last simulation with. Each run's result is then combined with the matching run
+of the last simulation and handed to on_finished_simulation, as engine.simulate
+would have done for the whole graph.
+    Args:
+        graph: A networkx graph instance, after the removal.
+        previous_graphs: The finished graphs of the last simulation, one per run
+        affected_nodes: removal_affected_nodes of the removal
+        sim_name: The name of the current simulation
+'''
+####################################################################################
+def warm_simulate(graph, previous_graphs, affected_nodes, sim_name):
+    nodes = [node for node in graph.node if node in affected_nodes]
+    reset_counters(nodes)
+
+    # Numbered like the whole graph, so the bitsets of both graphs combine as is
+    part = graph.__class__()
+    part.add_nodes_from((node, dict(graph.node[node])) for node in nodes)
+    part.add_edges_from((node, neighbor) for node in nodes for neighbor in graph.edge[node])
+    reset_information(part, graph)
+    init(part, sim_name)
+
+    graphs = []
+    for run_num, previous in enumerate(previous_graphs):
+        graph_instance = copy.deepcopy(part)
+        engine.run(graph_instance, sim_name + '_r' + str(run_num + 1))
+
+        finished = graph.__class__()
+        finished.graph[INFORMATION_NODES_KEY] = graph_instance.graph[INFORMATION_NODES_KEY]
+        finished.graph[INFORMATION_BITS_KEY] = graph_instance.graph[INFORMATION_BITS_KEY]
+        for node in graph.node:
+            source = graph_instance if node in part.node else previous
+            finished.add_node(node, source.node[node])
+        finished.add_edges_from(graph.edges_iter())
+        graphs.append(finished)
+    on_finished_simulation(len(graphs), graphs, sim_name)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Take a CSV file with x,y coordinates and a range for each node, or a device store
+of them (see device_store), and determine what nodes will be connected.
     Args:
         __csvfile__: A CSV file passed that we are to read
         range: The maximum broadcast range
@@ -150,50 +365,23 @@ def iot_graph(__csvfile__):
     # New graph
     g = nx.DiGraph()
    
-   # Open csvfile in rb mode
-    csvfile = open(__csvfile__, 'rb')
-   
-    # Create attributes for the csv file
-    csv_fields = ['node_name', 'x', 'y', 'range']
-    
-    # Create a csv
-    csv_reader = csv.DictReader(csvfile, fieldnames=csv_fields)
+    # Read the nodes' coordinates and ranges as columns
+    store = device_store.open_devices(__csvfile__, ['x', 'y', 'range'])
+    g.add_nodes_from(store['names'])
     
-    csv_data = {}
-    
-    #print csv_reader
-    for row in csv_reader:
-        g.add_node(row['node_name'])
-        csv_data[row['node_name']] = {}
-        csv_data[row['node_name']]['x']     = float(row['x'])
-        csv_data[row['node_name']]['y']     = float(row['y'])
-        csv_data[row['node_name']]['range'] = float(row['range'])
-    
-    csvfile.close()
-    
-    import math
-    for node in g.node:
-        for node2 in g.node:
-            if node is not node2:
-                distance = math.sqrt(
-                                     (csv_data[node]['x'] - csv_data[node2]['x'])**2
-                                    +(csv_data[node]['y'] - csv_data[node2]['y'])**2
-                                    )
-                if (distance <= csv_data[node]['range']):
-                    g.add_edge(node, node2)
+    # Connect each node to every node within its range, looked up in a KD-tree
+    nodes = list(g.node)
+    positions = store_positions(store, nodes)
+    points = device_store.device_points(store, positions, ('x', 'y'))
+    ranges = np.asarray(store['range'])[positions]
+    sources, targets = spatial_index.variable_radius_pairs(points, ranges)
+    g.add_edges_from((nodes[i], nodes[j]) for i, j in izip(sources.tolist(), targets.tolist()))
     
     
     for node in g.node:
         g.node[node]['online'] = True # Each node should be online at first
         g.node[node]['broadcast_delay'] = 0
-        for hasnode in g.node:
-            g.node[node]['has_' + hasnode] = False # Every node should not have each other's information
-    
-    
-    # Set broadcast information to None on every edge
-    for u in g.edge:
-        for v in g.edge[u]:
-            g.edge[u][v]['broadcast_information'] = None
+    reset_information(g) # Every node should not have each other's information
             
     return g
 ####################################################################################
@@ -210,62 +398,193 @@ given a broadcast range.
 '''
 ####################################################################################
 def iot_graph_xyz(__csvfile__, range):
-    # New graph
+    return iot_graphs_xyz(__csvfile__, [range])[range]
+####################################################################################
+
+
+
+####################################################################################
+'''
+Take a CSV file with x,y,z coordinates and build its graph for several broadcast
+ranges. The pairs of nodes within the largest range are found once, sorted by
+distance, and each range's edges are a prefix of them.
+    Args:
+        __csvfile__: A CSV file passed that we are to read
+        ranges: The broadcast ranges
+
+    Returns:
+        A dictionary from each range to its graph
+'''
+####################################################################################
+def iot_graphs_xyz(__csvfile__, ranges):
+    names, nodes, points = read_xyz_csv(__csvfile__)
+    pair_distances = spatial_index.sorted_pair_distances(points, max(ranges))
+    return dict((range, xyz_graph(names, nodes, pair_distances, range)) for range in ranges)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Reads a CSV file of node names and x,y,z coordinates, or a device store of them
+(see device_store).
+    Args:
+        __csvfile__: A CSV file passed that we are to read
+
+    Returns:
+        The node names in the order of the file, which is the order graphs add
+        them in, the nodes in the order a graph lists them, and an array of their
+        (x, y, z) points
+'''
+####################################################################################
+def read_xyz_csv(__csvfile__):
+    store = device_store.open_devices(__csvfile__, ['x', 'y', 'z'])
+    names = store['names']
+
+    # The order a graph lists the nodes in
     g = nx.Graph()
-   
-   # Open csvfile in rb mode
-    csvfile = open(__csvfile__, 'rb')
-   
-    # Create attributes for the csv file
-    csv_fields = ['node_name', 'x', 'y', 'z']
-    
-    # Create a csv
-    csv_reader = csv.DictReader(csvfile, fieldnames=csv_fields)
-    
-    csv_data = {}
-    
-    #print csv_reader
-    for row in csv_reader:
-        g.add_node(row['node_name'])
-        csv_data[row['node_name']] = {}
-        csv_data[row['node_name']]['x'] = float(row['x'])
-        csv_data[row['node_name']]['y'] = float(row['y'])
-        csv_data[row['node_name']]['z'] = float(row['z'])
-    
-    csvfile.close()
-    
-    import math
-    for node in g.node:
-        for node2 in g.node:
-            if node is not node2:
-                distance = math.sqrt(
-                                     (csv_data[node]['x'] - csv_data[node2]['x'])**2
-                                    +(csv_data[node]['y'] - csv_data[node2]['y'])**2
-                                    +(csv_data[node]['z'] - csv_data[node2]['z'])**2
-                                    )
-                if (distance <= range):
-                    g.add_edge(node, node2)
+    g.add_nodes_from(names)
+    nodes = list(g.node)
+
+    points = device_store.device_points(store, store_positions(store, nodes), ('x', 'y', 'z'))
+    return names, nodes, points
+####################################################################################
+
+
+
+####################################################################################
+'''
+The positions in a device store of some of its devices.
+    Args:
+        store: A device store (see device_store)
+        nodes: Device names
+
+    Returns:
+        An integer array of the devices' positions, in the order of nodes
+'''
+####################################################################################
+def store_positions(store, nodes):
+    position = dict((name, i) for i, name in enumerate(store['names']))
+    return np.array([position[node] for node in nodes], dtype=np.int64)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Lets the devices of an iot_graph graph move between rounds, as set by
+mobility_trajectory, mobility_speed and mobility_max_pause (see
+mobility.track_devices).
+    Args:
+        graph: A networkx graph instance built by iot_graph
+        __csvfile__: The CSV file or device store it was built from
+'''
+####################################################################################
+def track_mobility(graph, __csvfile__):
+    store = device_store.open_devices(__csvfile__, ['x', 'y', 'range'])
+    nodes = list(graph.node)
+    positions = store_positions(store, nodes)
+    trajectory = None
+    if (mobility_trajectory is not None):
+        trajectory = mobility.read_trajectory(mobility_trajectory)
+    mobility.track_devices(graph, nodes, device_store.device_points(store, positions, ('x', 'y')),
+                           np.asarray(store['range'])[positions], trajectory, mobility_speed, mobility_max_pause)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Builds the graph of the nodes within one broadcast range of each other.
+    Args:
+        names: The node names, in the order they are added
+        nodes: The list of nodes, in the order of the points
+        pair_distances: spatial_index.sorted_pair_distances of the points, for a
+                        range at least as large
+        range: The maximum broadcast range
+
+    Returns:
+        A directed graph, with an edge each way between nodes in range
+'''
+####################################################################################
+def xyz_graph(names, nodes, pair_distances, range):
+    g = nx.Graph()
+    g.add_nodes_from(names)
+
+    # Connect every pair of nodes within range
+    firsts, seconds = spatial_index.pairs_within(pair_distances, range)
+    g.add_edges_from((nodes[i], nodes[j]) for i, j in izip(firsts.tolist(), seconds.tolist()))
                     
     for node in g.node:
         g.node[node]['online'] = True # Each node should be online at first
         g.node[node]['broadcast_delay'] = 0
-        for hasnode in g.node:
-            g.node[node]['has_' + hasnode] = False # Every node should not have each other's information
     
     # Turn the undirected graph into a directed graph
     ug = helper.to_directed(g)
-    
-    # Set broadcast information to None on every edge
-    for u in ug.edge:
-        for v in ug.edge[u]:
-            ug.edge[u][v]['broadcast_information'] = None
-            
+    reset_information(ug) # Every node should not have each other's information
             
     return ug
 ####################################################################################
 
 
 
+####################################################################################
+'''
+Simulates the graph of a CSV file of x,y,z coordinates for every broadcast range
+from radius_step up to a largest range, in steps of radius_step. The graphs share
+one sorted list of pair distances (see iot_graphs_xyz), and each range is built
+and simulated once, by simulated_spread of critical_nodes, on a pool of processes.
+    Args:
+        __csvfile__: A CSV file passed that we are to read
+        max_range: The largest broadcast range
+        processes: The number of worker processes (all CPUs if None, serial if 1)
+
+    Returns:
+        A dictionary from each range to its number of edges and information spread
+'''
+####################################################################################
+def radius_sweep(__csvfile__, max_range, processes=None):
+    ranges = []
+    range = radius_step
+    while range <= max_range:
+        ranges.append(range)
+        range += radius_step
+    if not ranges:
+        return {}
+    names, nodes, points = read_xyz_csv(__csvfile__)
+    sweep = (names, nodes, spatial_index.sorted_pair_distances(points, ranges[-1]))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes == 1:
+        _init_sweep_worker(sweep)
+        try:
+            results = map(_sweep_range, ranges)
+        finally:
+            _init_sweep_worker(None)
+    else:
+        pool = multiprocessing.Pool(processes, _init_sweep_worker, (sweep,))
+        try:
+            results = pool.map(_sweep_range, ranges, 1)
+        finally:
+            pool.terminate()
+            pool.join()
+    return dict(zip(ranges, results))
+
+_sweep = None
+
+def _init_sweep_worker(sweep):
+    global _sweep
+    _sweep = sweep
+
+def _sweep_range(range):
+    names, nodes, pair_distances = _sweep
+    graph = xyz_graph(names, nodes, pair_distances, range)
+    return graph_stats.number_of_edges(graph), critical_nodes.simulated_spread(graph)
+####################################################################################
+
+
+
 ####################################################################################
 '''
 Hook for changing the graph at the beginning of the round. Note that this takes place
@@ -281,11 +600,23 @@ before the graph is copied in the engine.
 '''
 ####################################################################################
 def before_round_start(graph, add_edge_list, remove_edge_list, add_node_list, remove_node_list, round_num, run_name):
+    update_lacks(graph)
+    everyone = everyone_mask(graph)
     for node in graph.node:
         if (graph.node[node]['broadcast_delay'] <= 0): # <= for safety (although it shouldn't matter)
-            create_broadcast(graph, node)
+            create_broadcast(graph, node, everyone)
         else:
             graph.node[node]['broadcast_delay'] -= 1
+
+    # Devices move once the round's broadcasts are made, and the engine then
+    # changes the edges. A node gaining out-edges may lack more than before.
+    if mobility.MOBILITY_KEY in graph.graph:
+        mobility.move_step(graph, round_num, add_edge_list, remove_edge_list)
+        stale = graph.graph[LACKS_STALE_KEY]
+        for node, neighbor in add_edge_list:
+            graph.node[node]['lacks'] = (1 << len(graph.graph[INFORMATION_NODES_KEY])) - 1
+            stale.add(node)
+        stale.update(node for node, neighbor in remove_edge_list)
 ####################################################################################
 
 
@@ -296,36 +627,20 @@ Hook for creating a broadcast from a given node.
     Args:
         graph: A networkx graph instance.
         node: The node we are creating a broadcast from
+        everyone: everyone_mask(graph), if already known
 '''
 ####################################################################################
-def create_broadcast(graph, node):
+def create_broadcast(graph, node, everyone=None):
     global current_broadcasts_sent
-    for information in graph.node:
-        if (graph.node[node]['has_' + information]):
-            if (will_broadcast(graph, node, information)):
-                current_broadcasts_sent[node] += 1 # << DATA COLLECTION
-                for edge_to in graph.edge[node]:
-                    graph.edge[node][edge_to]['broadcast_information'] = information
-####################################################################################
-
-
-
-####################################################################################
-'''
-Hook for determining whether or not a node will broadcast a given bit of information.
-    Args:
-        graph: A networkx graph instance.
-        node: A given node we are considering
-        information: The bit of information (origin node) that we are considering transmitting
-'''
-####################################################################################
-def will_broadcast(graph, node, information):
-    for neighbor in helper.get_neighbors(graph, node):
-        if not graph.node[neighbor]['has_' + information]:
-            if neighbor in graph.edge[node]:
-                return True # We only need ONE neighbor to not have the information
-                            # to transmit the information
-    return False
+    if everyone is None:
+        update_lacks(graph)
+        everyone = everyone_mask(graph)
+    # Every bit of information some out-neighbor lacks is broadcast, as one
+    # neighbor lacking it is enough; the node ends up transmitting the last of them
+    lacking = graph.node[node]['has'] & node_lacks(graph, node) & everyone
+    if lacking:
+        current_broadcasts_sent[node] += popcount(lacking) # << DATA COLLECTION
+        round_broadcasts(graph)[node] = graph.graph[INFORMATION_NODES_KEY][lacking.bit_length() - 1]
 ####################################################################################
 
 
@@ -347,8 +662,9 @@ def post_graph_modification(graph, add_edge_list, add_node_list, run_name):
 
 ####################################################################################
 '''
-Handles a special node (or multiple special nodes). It is up to the user to define
-this hook's behavior, otherwise the correct move would be to pass.
+Handles a special node (or multiple special nodes). Here every node's receptions
+for the round are resolved at once (see receive_broadcasts), before the engine
+calls on_node for each node.
     Args:
         graph: A networkx graph instance.
         graphcopy: An unedited copy of the networkx graph instance.
@@ -357,7 +673,8 @@ this hook's behavior, otherwise the correct move would be to pass.
 '''
 ####################################################################################
 def special_node_handle(graph, graph_copy, round_num, run_name):
-    pass
+    receive_broadcasts(graph, graph_copy, round_num)
+    graph.graph[RECEIVED_ROUND_KEY] = round_num
 ####################################################################################
 
 
@@ -377,6 +694,10 @@ For every node, deal with the transmission of information.
 ####################################################################################
 def on_node(graph, graph_copy, node, round_num, run_name, max_receiving_transmissions=max_receiving_transmissions, debug=SIM_DEBUG):
     global last_update_round, current_broadcasts_received_overall, current_broadcasts_received_successfully
+    # Receptions already resolved for the whole round by special_node_handle
+    if graph.graph.get(RECEIVED_ROUND_KEY) == round_num:
+        return
+
     # Check that this node is online before continuing
     if not graph_copy.node[node]['online']:
         return
@@ -388,20 +709,19 @@ def on_node(graph, graph_copy, node, round_num, run_name, max_receiving_transmis
     # Figure out what transmissions are being broadcasted by neighbors
     transmission_list = []
     for neighbor in neighbors_list:
-        if node in graph_copy.edge[neighbor]:
-            if (graph_copy.node[neighbor]['online'] and graph_copy.edge[neighbor][node]['broadcast_information'] is not None):
-                current_broadcasts_received_overall[node] += 1 # << DATA COLLECTION
-                transmission_list.append(graph_copy.edge[neighbor][node]['broadcast_information'])
+        information = broadcast_information(graph_copy, neighbor, node)
+        if (graph_copy.node[neighbor]['online'] and information is not None):
+            current_broadcasts_received_overall[node] += 1 # << DATA COLLECTION
+            transmission_list.append(information)
             
     # Can we make use of incoming transmissions, or are broadcasts interfering?
     if (len(transmission_list) <= max_receiving_transmissions): # We're fine
         for information in transmission_list:
             current_broadcasts_received_successfully[node] += 1 # << DATA COLLECTION
-            if not graph.node[node]['has_' + information]:
+            if give_information(graph, node, information):
                 last_update_round = round_num
                 if (debug):
                     print node + ' receives ' + information
-                graph.node[node]['has_' + information] = True
             
     else: # We have too many incoming transmissions
         if (debug):
@@ -428,7 +748,7 @@ def broadcast_delay(graph, graph_copy, node, neighbors_list):
     neighbors_count = len(neighbors_list)
     for neighbor in neighbors_list:
         if node in graph.edge[neighbor]:
-            if (graph_copy.edge[neighbor][node]['broadcast_information'] is not None and graph_copy.node[neighbor]['online']):
+            if (broadcast_information(graph_copy, neighbor, node) is not None and graph_copy.node[neighbor]['online']):
                 if (graph.node[neighbor]['broadcast_delay'] == 0):
                     current_interference_failures[neighbor] += 1
                     graph.node[neighbor]['broadcast_delay'] = rand.randint(1, neighbors_count + rand_extra)
@@ -436,6 +756,85 @@ def broadcast_delay(graph, graph_copy, node, neighbors_list):
 
 
 
+####################################################################################
+'''
+Resolves every node's receptions for a round at once, with array operations on the
+neighbor index instead of a walk over each receiver's neighbors. The adjacency rows
+of the online broadcasting nodes give one entry per transmission, and counting the
+entries per receiver (the product of the broadcasting vector and the adjacency)
+gives each receiver's number of incoming transmissions. Receivers with at most
+max_receiving_transmissions of them get the information; every sender heard by a
+receiver with more backs off, over the range of the first such receiver in node
+order. The back-off delays are drawn one by one in the order broadcast_delay draws
+them, so with the same random.seed both paths give the same delays.
+    Args:
+        graph: A networkx graph instance.
+        graph_copy: Another networkx graph instance which is the deep copy of graph.
+        round_num: The current round number
+        max_receiving_transmissions: The most transmissions a node can receive at once
+'''
+####################################################################################
+def receive_broadcasts(graph, graph_copy, round_num, max_receiving_transmissions=max_receiving_transmissions):
+    global last_update_round, current_broadcasts_received_overall, current_broadcasts_received_successfully
+    global current_interference_failures
+    index = graph_index.get_neighbor_index(graph)
+    labels = index['labels']
+    broadcasts = round_broadcasts(graph_copy)
+    senders = np.array([index['position'][node] for node in broadcasts
+                        if node in graph_copy.node and graph_copy.node[node]['online']], dtype=np.int64)
+    if len(senders) == 0:
+        return
+
+    # One entry per transmission, gathered from the senders' CSR rows
+    offsets, neighbors = index['out']
+    lengths = offsets[senders + 1] - offsets[senders]
+    starts = offsets[senders] - (np.cumsum(lengths) - lengths)
+    receivers = neighbors[np.repeat(starts, lengths) + np.arange(lengths.sum())]
+    transmitters = np.repeat(senders, lengths)
+
+    # Removed and offline nodes receive nothing
+    heard = np.unique(receivers)
+    listening = np.zeros(len(labels), dtype=bool)
+    listening[heard] = [labels[i] in graph_copy.node and graph_copy.node[labels[i]]['online'] for i in heard]
+    keep = listening[receivers]
+    receivers = receivers[keep]
+    transmitters = transmitters[keep]
+
+    counts = np.bincount(receivers, minlength=len(labels))
+    for i in np.flatnonzero(counts):
+        current_broadcasts_received_overall[labels[i]] += int(counts[i]) # << DATA COLLECTION
+
+    received = counts[receivers] <= max_receiving_transmissions
+    for receiver, transmitter in izip(labels[receivers[received]], labels[transmitters[received]]):
+        current_broadcasts_received_successfully[receiver] += 1 # << DATA COLLECTION
+        if give_information(graph, receiver, broadcasts[transmitter]):
+            last_update_round = round_num
+
+    # Back-offs are drawn receiver by receiver in node order, and over each
+    # receiver's neighbors in neighbor list order, as on_node and broadcast_delay
+    # draw them, so both paths give the same delays from one rand.seed
+    colliding = ~received
+    if not colliding.any():
+        return
+    heard_from = {}
+    for receiver, transmitter in izip(receivers[colliding].tolist(), transmitters[colliding].tolist()):
+        heard_from.setdefault(receiver, set()).add(transmitter)
+    all_offsets, all_neighbors = index['all']
+    for receiver in sorted(heard_from):
+        row = all_neighbors[all_offsets[receiver]:all_offsets[receiver + 1]]
+        if index['num_alive'] != len(index['nodes']):
+            row = row[index['alive'][row]]
+        for neighbor in row.tolist():
+            if neighbor not in heard_from[receiver]:
+                continue
+            transmitter = labels[neighbor]
+            if graph.node[transmitter]['broadcast_delay'] == 0:
+                current_interference_failures[transmitter] += 1 # << DATA COLLECTION
+                graph.node[transmitter]['broadcast_delay'] = rand.randint(1, len(row) + rand_extra)
+####################################################################################
+
+
+
 ####################################################################################
 '''
 Hook for dealing with addition/removal of nodes at the end of a round.
@@ -450,8 +849,8 @@ Hook for dealing with addition/removal of nodes at the end of a round.
 '''
 ####################################################################################
 def after_round_end(graph, add_edge_list, remove_edge_list, add_node_list, remove_node_list, round_num, run_name):
-    for e in graph.edges():
-        graph.edge[e[0]][e[1]]['broadcast_information'] = None
+    # Discards the round's broadcasts
+    graph.graph[BROADCAST_EPOCH_KEY] = graph.graph.get(BROADCAST_EPOCH_KEY, 0) + 1
 ####################################################################################
 
 
@@ -467,7 +866,7 @@ Init method. This currently only starts each node with its own information.
 ####################################################################################
 def init(graph, sim_name):
     for node in graph.node:
-        graph.node[node]['has_' + node] = True
+        give_information(graph, node, node)
 ####################################################################################
 
    
@@ -488,10 +887,10 @@ Determines whether or not a graph is finished.
 def finished_hook(graph, round_num, run_name):
     if (helper.exceeded_round_no_update_limit(last_update_round, round_num, max_rounds_no_update)):
         return -1
+    everyone = everyone_mask(graph)
     for node in graph.node:
-        for information in graph.node:
-            if not graph.node[node]['has_' + information]:
-                return 0 # Return that there is an incomplete graph
+        if graph.node[node]['has'] & everyone != everyone:
+            return 0 # Return that there is an incomplete graph
     # If we reached this point, all nodes have every bit of information
     return 1
 ####################################################################################
@@ -550,7 +949,7 @@ was designed for dealing with looking at differences across the whole simulation
 '''
 ####################################################################################
 def on_finished_simulation(num_runs, graphs, sim_name):
-    global nodes_to_remove
+    global nodes_to_remove, finished_graphs
     
     global current_graph_information_spread
     global graph_information_spread
@@ -576,20 +975,22 @@ def on_finished_simulation(num_runs, graphs, sim_name):
     
     avg_tbr_o = sim_tbr_o / (num_runs * nodes)
     
-    for node in graphs[0].node:
-        
-        threshold_tbr_o = rand.randint( avg_tbr_o, (2 * avg_tbr_o) )
-        if (total_broadcasts_received_overall[node] >= threshold_tbr_o):
-            nodes_to_remove.append(node)
+    if (critical_node_search):
+        nodes_to_remove += critical_nodes.find_critical_nodes(graphs[0], traffic=total_broadcasts_received_overall)[0]
+    else:
+        for node in graphs[0].node:
+            
+            threshold_tbr_o = rand.randint( avg_tbr_o, (2 * avg_tbr_o) )
+            if (total_broadcasts_received_overall[node] >= threshold_tbr_o):
+                nodes_to_remove.append(node)
             
     
     # Get current_graph_information
     for graph in graphs:
+        everyone = everyone_mask(graph)
+        total_information_bits += len(graph.node) ** 2
         for node in graph.node:
-            for ibit in graph.node:
-                total_information_bits += 1
-                if (graph.node[node]['has_' + ibit]):
-                    has_information_bits += 1
+            has_information_bits += popcount(graph.node[node]['has'] & everyone)
     current_graph_information_spread = has_information_bits / float(total_information_bits)
     
     mbcs = str(helper.get_max_in_dict(total_broadcasts_sent))
@@ -609,6 +1010,7 @@ def on_finished_simulation(num_runs, graphs, sim_name):
         
     print '\nCurrent graph information spread:' + str(current_graph_information_spread) + '\n'
     graph_information_spread.append(current_graph_information_spread)
+    finished_graphs = graphs
     print '\n'
 ####################################################################################
 
@@ -628,3 +1030,148 @@ def heartbeat(current_time, last_heartbeat, round_num, run_name):
     print '[' + str(current_time) + ']: ' + str(run_name) + ' still alive. Last heartbeat was ' \
             + str(last_heartbeat) + ' seconds ago.\nCurrent round is ' + str(round_num) + '. Round ' + str(last_update_round) + ' was last graph update.'
 ####################################################################################
+
+
+
+####################################################################################
+'''
+Numbers the information of every node of a graph and clears what each node has:
+node attribute 'has' becomes an empty bitset. Receiving information sets one bit,
+and checking what a node is missing is a single AND.
+    Args:
+        graph: A networkx graph instance.
+        numbered_like: Another graph whose numbering is copied, if given
+'''
+####################################################################################
+def reset_information(graph, numbered_like=None):
+    if numbered_like is None:
+        graph.graph[INFORMATION_NODES_KEY] = list(graph.node)
+        graph.graph[INFORMATION_BITS_KEY] = dict((node, i) for i, node in enumerate(graph.node))
+    else:
+        graph.graph[INFORMATION_NODES_KEY] = list(numbered_like.graph[INFORMATION_NODES_KEY])
+        graph.graph[INFORMATION_BITS_KEY] = dict(numbered_like.graph[INFORMATION_BITS_KEY])
+    for node in graph.node:
+        graph.node[node]['has'] = 0
+    graph.graph[LACKS_STAMP_KEY] = None
+####################################################################################
+
+
+
+####################################################################################
+'''
+Information bitset queries and updates.
+    has_information: Whether node has the information that originated at information
+    give_information: Gives node that information; returns True if it was new
+    everyone_mask: The bits of the information of every node still in the graph
+    popcount: The number of set bits of a bitset
+'''
+####################################################################################
+def information_bit(graph, information):
+    bits = graph.graph[INFORMATION_BITS_KEY]
+    if information not in bits:
+        # Information of a node added after the numbering
+        bits[information] = len(graph.graph[INFORMATION_NODES_KEY])
+        graph.graph[INFORMATION_NODES_KEY].append(information)
+    return 1 << bits[information]
+
+def has_information(graph, node, information):
+    return graph.node[node]['has'] & information_bit(graph, information) != 0
+
+def give_information(graph, node, information):
+    bit = information_bit(graph, information)
+    if graph.node[node]['has'] & bit:
+        return False
+    graph.node[node]['has'] |= bit
+    graph.graph.setdefault(LACKS_CHANGED_KEY, set()).add(node)
+    return True
+
+def everyone_mask(graph):
+    for node in graph.node:
+        information_bit(graph, node)
+    mask = (1 << len(graph.graph[INFORMATION_NODES_KEY])) - 1
+    for i, node in enumerate(graph.graph[INFORMATION_NODES_KEY]):
+        if node not in graph.node:
+            mask &= ~(1 << i) # Information of a removed node no longer counts
+    return mask
+
+def popcount(bits):
+    return bin(bits).count('1')
+####################################################################################
+
+
+
+####################################################################################
+'''
+Marks the nodes whose 'lacks' bitset may have lost bits since the last call: the
+in-neighbors of every node that received information. When nodes, edges or
+numbered information were added or removed, every node is marked instead.
+    Args:
+        graph: A networkx graph instance.
+'''
+####################################################################################
+def update_lacks(graph):
+    # Edge counts come from the maintained statistics rather than a full count
+    stamp = (graph.number_of_nodes(), graph_stats.number_of_edges(graph), len(graph.graph[INFORMATION_NODES_KEY]))
+    if graph.graph.get(LACKS_STAMP_KEY) != stamp:
+        # Start from every bit; node_lacks only ever clears bits
+        for node in graph.node:
+            graph.node[node]['lacks'] = (1 << stamp[2]) - 1
+        graph.graph[LACKS_STALE_KEY] = set(graph.node)
+    else:
+        stale = graph.graph[LACKS_STALE_KEY]
+        for node in graph.graph.get(LACKS_CHANGED_KEY, ()):
+            if node in graph.node:
+                stale.update(helper.get_in_neighbors_list(graph, node))
+    graph.graph[LACKS_CHANGED_KEY] = set()
+    graph.graph[LACKS_STAMP_KEY] = stamp
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns the bitset of information at least one of a node's out-neighbors lacks,
+recomputing it first if update_lacks marked it stale.
+    Args:
+        graph: A networkx graph instance.
+        node: A networkx node instance.
+'''
+####################################################################################
+def node_lacks(graph, node):
+    stale = graph.graph[LACKS_STALE_KEY]
+    if node in stale:
+        previous = graph.node[node]['lacks']
+        lacks = 0
+        for neighbor in helper.get_out_neighbors_list(graph, node):
+            lacks |= previous & ~graph.node[neighbor]['has']
+            if lacks == previous:
+                break # Nothing was lost
+        graph.node[node]['lacks'] = lacks
+        stale.discard(node)
+    return graph.node[node]['lacks']
+####################################################################################
+
+
+
+####################################################################################
+'''
+Broadcast state of the current round.
+    round_broadcasts: The {node: information} buffer of the nodes broadcasting this
+                      round, started afresh once the round's epoch has passed
+    broadcast_information: The information sender transmits to receiver this round,
+                           or None
+'''
+####################################################################################
+def round_broadcasts(graph):
+    epoch = graph.graph.get(BROADCAST_EPOCH_KEY, 0)
+    stamped = graph.graph.get(BROADCASTS_KEY)
+    if stamped is None or stamped[0] != epoch:
+        stamped = (epoch, {})
+        graph.graph[BROADCASTS_KEY] = stamped
+    return stamped[1]
+
+def broadcast_information(graph, sender, receiver):
+    if receiver not in graph.edge[sender]:
+        return None
+    return round_broadcasts(graph).get(sender)
+####################################################################################
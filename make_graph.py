@@ -1,110 +1,525 @@
 #! /usr/bin/env python
-import csv
+import math
+import multiprocessing
 import os # OS for filename split
 import networkx as nx
-import random as rand
+import numpy as np
+from itertools import imap, izip
+from xml.sax.saxutils import escape, quoteattr
 
+import ingest
 import simhelper as helper
+import spatial_index
 
 # Large Graph
 num_nodes = 1000
 num_edges = 500
 seed        = 15203968721
 
+# Edges (and nodes) generated per chunk by the streaming generator
+chunk_size  = 100000
+
+# Attribute schemas for generated graphs: (name, distribution, params), with the
+# distributions of helper.draw_attribute_values
+NORMAL_EDGE_SCHEMA = [('weight', 'uniform', {'low': 1, 'high': 9})]
+
+ZOMBIE_NODE_SCHEMA = [
+    # Food points is in kCal, drop below 0 and an agent will die
+    # 52,500 calories is the amount of calories eating 2,500 calroies
+    # over the course of 3 weeks. Assume everyone is pretty well-fed.
+    ('food', 'uniform', {'low': 45000, 'high': 60000}),
+    # Water points is in mL of water, drop below 0 and an agent will die
+    # About 8 liters are all an agent should begin with
+    ('water', 'uniform', {'low': 7000, 'high': 9000}),
+    # Health points - general purpose medical well-being of agents
+    ('health', 'uniform', {'low': 85, 'high': 100}),
+    # Strength, 1-20, will determine if a zombie will overpower a human
+    ('strength', 'uniform', {'low': 1, 'high': 20}),
+    # The age of an agent, 20-100, will determine their speed/resilience
+    ('age', 'uniform', {'low': 18, 'high': 100}),
+    # The morality of an agent, how likely they are to behave morally in dire situations
+    ('morality', 'uniform', {'low': 1, 'high': 10}),
+]
+# Initial edge weights for the likelihood of contact
+ZOMBIE_EDGE_SCHEMA = [('weight', 'uniform', {'low': 1, 'high': 10})]
+
+# Gossip graphs: students are split into grades in the proportions
+# adv_gossip_config draws them (one in 13 is not a student), and edge weights
+# are drawn as adv_gossip_config draws them for new edges
+GOSSIP_GRADES = [('nonstudent', 1), ('freshman', 3), ('sophomore', 3), ('junior', 3), ('senior', 3)]
+GOSSIP_EDGE_SCHEMA = [('weight', 'uniform', {'low': 1, 'high': 10})]
+
+# Broadcast ranges found in the iot/*.csv device lists
+IOT_RANGES = [5, 20, 35, 50, 65, 80]
+
 def main():
      # v Generates a normal graph
      #normal(num_nodes, num_edges, seed)
      #zombie(300, 900, seed)
      iot('iot/r.csv', 25)
+     #iot_sweep('iot/r.csv', [5, 10, 15, 20, 25])
      
-def normal(num_nodes=num_nodes, num_edges=num_edges, seed=seed):
-     g = nx.gnm_random_graph(num_nodes, num_edges, seed, False)
-     nx.set_edge_attributes(g, 'weight', 1)
-     for n1,n2 in g.edges():
-          print n1,n2,
-          g.edge[n1][n2]['weight'] = rand.randint(1,9)
-          print g.edge[n1][n2]['weight']
-     write(g, 'custom_graphs/test1.graphml')
+def normal(num_nodes=num_nodes, num_edges=num_edges, seed=seed, processes=None):
+     stream_gnm_graphml('custom_graphs/test1.graphml', num_nodes, num_edges, seed,
+                        [], NORMAL_EDGE_SCHEMA, processes=processes)
      
 
 def iot(__csvfile__, range_of_router):
-     # New graph
-     g = nx.Graph()
-     
-     # Open csvfile in rb mode
-     csvfile = open(__csvfile__, 'rb')
+     iot_sweep(__csvfile__, [range_of_router])
+
+
+def iot_sweep(__csvfile__, ranges_of_router):
+     # One graph per range; the pairs within the largest range are found once,
+     # sorted by distance, and every smaller range takes a prefix of them
      
      # Get the name of the file without its file extension
      filename_no_ext = os.path.basename(__csvfile__)[0]
      
-     # Create attributes for the csv file
-     csv_fields = ['node_name', 'x', 'y', 'z']
+     # Read the devices and their coordinates
+     names, coordinates = ingest.read_device_rows(__csvfile__, ['x', 'y', 'z'])
      
-     # Create a csv
-     csv_reader = csv.DictReader(csvfile, fieldnames=csv_fields)
-     
-     print csv_reader
-     for row in csv_reader:
-          g.add_node(row['node_name'])
-          g.node[row['node_name']]['x'] = row['x']
-          g.node[row['node_name']]['y'] = row['y']
-          g.node[row['node_name']]['z'] = row['z']
-     
-     csvfile.close()
+     pair_distances = None
+     for range_of_router in sorted(ranges_of_router, reverse=True):
+          # New graph
+          g = nx.Graph()
+          for name, (x, y, z) in izip(names, coordinates.tolist()):
+               g.add_node(name, x=x, y=y, z=z)
           
-     import math
-     for node in g:
-          for node2 in g:
-            if node is not node2:
-                distance = math.sqrt(
-                                    (float(g.node[node]['x']) - float(g.node[node2]['x']))**2
-                                  +(float(g.node[node]['y']) - float(g.node[node2]['y']))**2
-                                  +(float(g.node[node]['z']) - float(g.node[node2]['z']))**2
-                                 )
-                if (distance <= range_of_router):
-                    g.add_edge(node, node2)
-    
-    
-    write(g, 'iot_graphs/' + filename_no_ext + '_' + str(range_of_router) + '.graphml')
+          if pair_distances is None:
+               pair_distances = spatial_index.sorted_pair_distances(coordinates, range_of_router)
+          
+          # Connect every pair of nodes within range
+          firsts, seconds = spatial_index.pairs_within(pair_distances, range_of_router)
+          g.add_edges_from((names[i], names[j]) for i, j in izip(firsts.tolist(), seconds.tolist()))
+          
+          write(g, 'iot_graphs/' + filename_no_ext + '_' + str(range_of_router) + '.graphml')
     
 
-def zombie(num_nodes=num_nodes, num_edges=num_edges, seed=seed):
-    # Create random graph
-    g = nx.gnm_random_graph(num_nodes, num_edges, seed, False)
-    
-    # Food points is in kCal, drop below 0 and an agent will die
-    # 52,500 calories is the amount of calories eating 2,500 calroies
-    # over the course of 3 weeks. Assume everyone is pretty well-fed.
-    helper.randomize_node_attribute(g, 'food', 45000, 60000)
-    
-    
-    # Water points is in mL of water, drop below 0 and an agent will die
-    # About 8 liters are all an agent should begin with
-    helper.randomize_node_attribute(g, 'water', 7000, 9000)
-    
-    # Health points - general purpose medical well-being of agents
-    helper.randomize_node_attribute(g, 'health', 85, 100)
-    
-    # Intelligence, 1-20, will determine the outcome of events that
-    # require brainpower, like crafting/finding weapons or helping others
-    # helper.randomize_node_attribute(g, 'intelligence', 1, 20)
-    
-    # Strength, 1-20, will determine if a zombie will overpower a human
-    helper.randomize_node_attribute(g, 'strength', 1, 20)
-    
-    # Morality, -10 to 10, will determine if an agent, as a human, is
-    # opportunistic and selfish or helpful
-    
-    # The age of an agent, 20-100, will determine their speed/resilience
-    helper.randomize_node_attribute(g, 'age', 18, 100)
+def zombie(num_nodes=num_nodes, num_edges=num_edges, seed=seed, processes=None):
+    # Random graph with the attributes of ZOMBIE_NODE_SCHEMA and ZOMBIE_EDGE_SCHEMA
+    stream_gnm_graphml('custom_graphs/small_zombie_adv.graphml', num_nodes, num_edges, seed,
+                       ZOMBIE_NODE_SCHEMA, ZOMBIE_EDGE_SCHEMA, processes=processes)
+
+
+def scale_free(num_nodes=num_nodes, average_degree=6, exponent=2.5, seed=seed, processes=None):
+    # Power-law degrees (a few hubs, many loners) with the zombie attributes
+    stream_chung_lu_graphml('custom_graphs/scale_free_zombie_adv.graphml',
+                            power_law_weights(num_nodes, average_degree, exponent), seed,
+                            ZOMBIE_NODE_SCHEMA, ZOMBIE_EDGE_SCHEMA, processes=processes)
+
+
+def school(num_nodes=num_nodes, friends_in_grade=8, friends_in_school=2, seed=seed, processes=None):
+    # Students with about friends_in_grade friends in their own grade and
+    # friends_in_school in the rest of the school, labelled by 'grade'
+    shares = np.cumsum([share for grade, share in GOSSIP_GRADES]) / float(sum(share for grade, share in GOSSIP_GRADES))
+    sizes = np.diff(np.concatenate([[0], np.round(shares * num_nodes)])).astype(int)
+    between = min(1.0, friends_in_school / float(max(num_nodes, 1)))
+    probabilities = [[min(1.0, friends_in_grade / float(max(size - 1, 1))) if r == s else between
+                      for s in range(len(sizes))] for r, size in enumerate(sizes)]
+    stream_sbm_graphml('custom_graphs/school_gossip.graphml', sizes, probabilities, seed, [],
+                       GOSSIP_EDGE_SCHEMA, 'grade', [grade for grade, share in GOSSIP_GRADES],
+                       processes=processes)
+
+
+def devices(num_nodes=num_nodes, seed=seed, processes=None):
+    # Devices scattered like the iot/*.csv ones, each with one of their ranges
+    stream_geometric_graphml('iot_graphs/random_devices.graphml', num_nodes, IOT_RANGES, seed,
+                             [], [], processes=processes)
     
-    # The morality of an agent, how likely they are to behave morally in dire situations
-    helper.randomize_node_attribute(g, 'morality', 1, 10)
     
-    # Initial edge weights for the likelihood of contact
-    helper.randomize_edge_attribute(g, 'weight', 1, 10) # Large range in weights
     
-    write(g, 'custom_graphs/small_zombie_adv.graphml')
+# Streaming generation
+#
+# A G(n,m) graph is produced as a stream of chunks: node chunks are blocks of
+# consecutive node ids, edge chunks are blocks of rows of the upper triangle of
+# the adjacency matrix, each holding about chunk_size edges.  How many edges
+# land in each block is drawn up front (sequential hypergeometric splits of m,
+# so the result is exactly G(n,m)); each chunk then draws its edges and
+# attributes from its own generator, keyed by the seed and the chunk number,
+# so a seed gives the same graph however many processes generate it.  Chunks
+# are formatted as GraphML by the workers and written out in order, so memory
+# stays bounded by a few chunks.
+
+def stream_gnm_graphml(path, num_nodes, num_edges, seed, node_schema, edge_schema,
+                       name=None, processes=None, chunk_size=chunk_size):
+    if name is None:
+        name = 'gnm_random_graph(' + str(num_nodes) + ',' + str(num_edges) + ')'
+    tasks = gnm_chunk_tasks(num_nodes, num_edges, seed, node_schema, edge_schema, chunk_size)
+    stream_graphml(path, tasks, node_schema, edge_schema, name, processes)
+
+
+# Writes the chunks of tasks to path in order.  arrays holds whatever the chunks
+# share (node columns computed up front, the Chung-Lu weights, device positions);
+# it is handed to every worker once rather than with each task.
+def stream_graphml(path, tasks, node_schema, edge_schema, name, processes=None, arrays={},
+                   directed=False):
+    graph_out = open(path, 'w')
+    try:
+        graph_out.write(graphml_header(node_schema, edge_schema, name, arrays.get('node_columns', []),
+                                       directed))
+        if processes == 1:
+            _init_worker(arrays)
+            try:
+                for text in imap(generate_chunk_graphml, tasks):
+                    graph_out.write(text)
+            finally:
+                _init_worker({})
+        else:
+            pool = multiprocessing.Pool(processes, _init_worker, (arrays,))
+            try:
+                for text in pool.imap(generate_chunk_graphml, tasks):
+                    graph_out.write(text)
+            finally:
+                pool.terminate()
+                pool.join()
+        graph_out.write(graphml_footer())
+    finally:
+        graph_out.close()
+
+
+_worker_arrays = {}
+
+def _init_worker(arrays):
+    global _worker_arrays
+    _worker_arrays = arrays
+
+
+# Tasks for the node chunks of a graph
+def node_chunk_tasks(num_nodes, seed, node_schema, chunk_size=chunk_size):
+    return [('nodes', seed, chunk, first, min(first + chunk_size, num_nodes), node_schema)
+            for chunk, first in enumerate(range(0, num_nodes, chunk_size))]
+
+
+# Tasks for every chunk of a G(n,m) graph, nodes first and then edges
+def gnm_chunk_tasks(num_nodes, num_edges, seed, node_schema, edge_schema, chunk_size=chunk_size):
+    num_pairs = num_nodes * (num_nodes - 1) // 2
+    if num_edges > num_pairs:
+        raise ValueError('A simple graph on ' + str(num_nodes) + ' nodes has at most ' + str(num_pairs) + ' edges')
+    tasks = node_chunk_tasks(num_nodes, seed, node_schema, chunk_size)
+
+    # Row blocks with about equally many pairs, then the edge count of each
+    rows = np.arange(num_nodes + 1, dtype=np.int64)
+    row_offsets = rows * (num_nodes - 1) - rows * (rows - 1) // 2
+    num_chunks = max(1, -(-num_edges // chunk_size))
+    bounds = np.searchsorted(row_offsets, np.linspace(0, num_pairs, num_chunks + 1), 'left')
+    bounds = np.unique(np.concatenate([[0], bounds, [num_nodes]]))
+    rng = helper.make_rng(seed, (0,))
+    pairs_left = num_pairs
+    edges_left = num_edges
+    for chunk in range(len(bounds) - 1):
+        lo, hi = int(bounds[chunk]), int(bounds[chunk + 1])
+        block_pairs = int(row_offsets[hi] - row_offsets[lo])
+        if block_pairs == pairs_left:
+            block_edges = edges_left
+        elif edges_left == 0 or block_pairs == 0:
+            block_edges = 0
+        else:
+            block_edges = int(rng.hypergeometric(block_pairs, pairs_left - block_pairs, edges_left))
+        pairs_left -= block_pairs
+        edges_left -= block_edges
+        if block_edges:
+            tasks.append(('gnm', seed, chunk, (num_nodes, lo, hi, block_edges), None, edge_schema))
+    return tasks
+
+
+def generate_chunk_graphml(task):
+    kind, seed, chunk, block, end, schema = task
+    if kind == 'nodes':
+        rng = helper.make_rng(seed, (1, chunk))
+        nodes = range(block, end)
+        columns = [(attr, values[block:end].tolist()) for attr, values in _worker_arrays.get('node_columns', [])]
+        columns += draw_schema(rng, len(nodes), schema)
+        return graphml_elements('    <node id="%d"', [nodes], 'node', columns)
+    rng = helper.make_rng(seed, (2, chunk))
+    sources, targets = EDGE_BLOCK_FUNCTIONS[kind](rng, *block)
+    columns = draw_schema(rng, len(sources), schema)
+    return graphml_elements('    <edge source="%d" target="%d"', [sources.tolist(), targets.tolist()],
+                            'edge', columns)
+
+
+# Edges (u, v), u < v, of one row block: block_edges distinct pairs chosen
+# uniformly among the pairs whose row is in [lo, hi)
+def gnm_block_edges(rng, num_nodes, lo, hi, block_edges):
+    rows = np.arange(lo, hi + 1, dtype=np.int64)
+    row_offsets = rows * (num_nodes - 1) - rows * (rows - 1) // 2
+    picked = sample_distinct(rng, int(row_offsets[-1] - row_offsets[0]), block_edges) + row_offsets[0]
+    row = np.searchsorted(row_offsets, picked, 'right') - 1
+    sources = lo + row
+    targets = sources + 1 + (picked - row_offsets[row])
+    return sources, targets
+
+
+# count distinct integers chosen uniformly from [0, size), in increasing order.
+# Sparse draws are repeated until enough distinct values were seen, then cut
+# down at random; dense draws pick the values to leave out instead.
+def sample_distinct(rng, size, count):
+    if count * 2 > size:
+        keep = np.ones(size, dtype=bool)
+        keep[sample_distinct(rng, size, size - count)] = False
+        return np.flatnonzero(keep)
+    chosen = np.empty(0, dtype=np.int64)
+    while len(chosen) < count:
+        extra = rng.randint(0, size, size=int((count - len(chosen)) * 1.05) + 16, dtype=np.int64)
+        chosen = np.unique(np.concatenate([chosen, extra]))
+    if len(chosen) > count:
+        chosen = np.sort(rng.choice(chosen, count, replace=False))
+    return chosen
+
+
+# Heavy-tailed graphs: a Chung-Lu graph joins u and v with probability about
+# w_u * w_v / sum(w), so node degrees follow the expected degrees w (any degree
+# sequence, as the configuration model takes).  Each row u draws its number of
+# edges to later nodes from a Poisson distribution and their endpoints in
+# proportion to weight, and repeated pairs are merged; that joins u and v with
+# probability 1 - exp(-w_u * w_v / sum(w)) (the Norros-Reittu variant), in
+# O(n + m) numpy work.  Rows are chunked by expected edge count like G(n,m).
+
+def stream_chung_lu_graphml(path, weights, seed, node_schema, edge_schema, name=None,
+                            processes=None, chunk_size=chunk_size):
+    weights = np.asarray(weights, dtype=float)
+    if name is None:
+        name = 'chung_lu_graph(' + str(len(weights)) + ')'
+    cumulative = np.zeros(len(weights) + 1)
+    np.cumsum(weights, out=cumulative[1:])
+    tasks = node_chunk_tasks(len(weights), seed, node_schema, chunk_size)
+    if cumulative[-1] > 0:
+        expected = weights * (cumulative[-1] - cumulative[1:]) / cumulative[-1]
+        for chunk, (lo, hi) in enumerate(_row_blocks(np.cumsum(expected), chunk_size)):
+            tasks.append(('chung_lu', seed, chunk, (lo, hi), None, edge_schema))
+    stream_graphml(path, tasks, node_schema, edge_schema, name, processes, {'cumulative': cumulative})
+
+
+# Expected degrees following a power law with the given exponent: the i-th
+# largest is proportional to (i + 1) ** (-1 / (exponent - 1)), scaled to the
+# average degree and capped at max_degree (by default sqrt(n * average_degree),
+# above which some pairs would need a probability over 1)
+def power_law_weights(num_nodes, average_degree, exponent=2.5, max_degree=None):
+    if max_degree is None:
+        max_degree = (num_nodes * average_degree) ** 0.5
+    weights = (np.arange(num_nodes) + 1.0) ** (-1.0 / (exponent - 1))
+    for attempt in range(100):
+        weights *= average_degree * num_nodes / weights.sum()
+        if weights[0] <= max_degree * (1 + 1e-9):
+            break
+        np.minimum(weights, max_degree, out=weights)
+    return weights
+
+
+def chung_lu_block_edges(rng, lo, hi):
+    cumulative = _worker_arrays['cumulative']
+    total = cumulative[-1]
+    rows = np.arange(lo, hi)
+    counts = rng.poisson((cumulative[rows + 1] - cumulative[rows]) * (total - cumulative[rows + 1]) / total)
+    sources = np.repeat(rows, counts)
+    # Endpoints after u, chosen in proportion to weight
+    draws = cumulative[sources + 1] + rng.random_sample(len(sources)) * (total - cumulative[sources + 1])
+    targets = np.minimum(np.searchsorted(cumulative, draws, 'right') - 1, len(cumulative) - 2)
+    keys = np.unique(sources * len(cumulative) + targets)
+    sources = keys // len(cumulative)
+    return sources, keys - sources * len(cumulative)
+
+
+# Clustered graphs: a stochastic block model splits the nodes into consecutive
+# blocks (school grades, say) and joins each pair in blocks r and s with
+# probability probabilities[r][s].  Pairs are independent, so every chunk of
+# rows draws its own binomial edge count and then that many distinct pairs.
+
+def stream_sbm_graphml(path, block_sizes, probabilities, seed, node_schema, edge_schema,
+                       block_attr=None, block_labels=None, name=None, processes=None,
+                       chunk_size=chunk_size):
+    if name is None:
+        name = 'stochastic_block_model(' + ','.join(str(size) for size in block_sizes) + ')'
+    starts = np.concatenate([[0], np.cumsum(block_sizes)]).astype(np.int64)
+    num_nodes = int(starts[-1])
+    tasks = node_chunk_tasks(num_nodes, seed, node_schema, chunk_size)
+    chunk = 0
+    for r in range(len(block_sizes)):
+        for s in range(r, len(block_sizes)):
+            p = probabilities[r][s]
+            if p <= 0:
+                continue
+            rows = np.arange(block_sizes[r] + 1, dtype=np.int64)
+            if r == s:
+                row_offsets = rows * (block_sizes[r] - 1) - rows * (rows - 1) // 2
+            else:
+                row_offsets = rows * block_sizes[s]
+            for lo, hi in _row_blocks(p * row_offsets[1:], chunk_size):
+                block = (int(starts[r]), int(block_sizes[r]), int(starts[s]), int(block_sizes[s]), lo, hi, p)
+                tasks.append(('sbm', seed, chunk, block, None, edge_schema))
+                chunk += 1
+    arrays = {}
+    if block_attr is not None:
+        labels = np.asarray(block_labels if block_labels is not None else range(len(block_sizes)))
+        arrays['node_columns'] = [(block_attr, np.repeat(labels, block_sizes))]
+    stream_graphml(path, tasks, node_schema, edge_schema, name, processes, arrays)
+
+
+# Edges of rows [lo, hi) of block r with block s (r <= s)
+def sbm_block_edges(rng, start_r, size_r, start_s, size_s, lo, hi, p):
+    if start_r == start_s:
+        rows = np.array([lo, hi], dtype=np.int64)
+        row_offsets = rows * (size_r - 1) - rows * (rows - 1) // 2
+        count = rng.binomial(int(row_offsets[1] - row_offsets[0]), p)
+        sources, targets = gnm_block_edges(rng, size_r, lo, hi, count)
+        return start_r + sources, start_r + targets
+    num_pairs = (hi - lo) * size_s
+    picked = sample_distinct(rng, num_pairs, rng.binomial(num_pairs, p))
+    return start_r + lo + picked // size_s, start_s + picked % size_s
+
+
+# Spatial graphs: devices placed uniformly at random in a square (or cube) of
+# the given side and connected like iot_spy connects the devices of a CSV file:
+# within one shared range (undirected, as iot_graph_xyz), or, when ranges is a
+# list of values, within each device's own range drawn from it (directed, as
+# iot_graph).  Devices are numbered by x coordinate and cut into slabs at least
+# one range wide, so each chunk only compares its slab with the next one.
+
+def stream_geometric_graphml(path, num_nodes, ranges, seed, node_schema, edge_schema,
+                             dimensions=2, side=300.0, name=None, processes=None,
+                             chunk_size=chunk_size):
+    if name is None:
+        name = 'random_geometric_graph(' + str(num_nodes) + ')'
+    rng = helper.make_rng(seed, (3,))
+    points = rng.random_sample((num_nodes, dimensions)) * side
+    points = points[np.argsort(points[:, 0], kind='mergesort')]
+    node_columns = [(axis, points[:, k]) for k, axis in enumerate(['x', 'y', 'z'][:dimensions])]
+    directed = isinstance(ranges, (list, tuple))
+    if directed:
+        device_ranges = np.asarray(ranges, dtype=float)[rng.randint(0, len(ranges), size=num_nodes)]
+        node_columns.append(('range', device_ranges))
+        radius = None
+        largest = max(ranges)
+        reach = np.mean(device_ranges ** dimensions) if num_nodes else 0.0
+    else:
+        radius = largest = ranges
+        reach = ranges ** dimensions / 2.0
+
+    # Slabs holding about chunk_size expected edges each, but at least one
+    # range wide
+    ball = math.pi ** (dimensions / 2.0) / math.gamma(dimensions / 2.0 + 1)
+    expected_edges = num_nodes * num_nodes * ball * reach / side ** dimensions
+    num_slabs = max(1, min(int(math.ceil(expected_edges / chunk_size)), int(side // max(largest, 1e-12))))
+    bounds = np.searchsorted(points[:, 0], np.linspace(0, side, num_slabs + 1)[1:-1])
+    bounds = [0] + bounds.tolist() + [num_nodes, num_nodes]
+    tasks = node_chunk_tasks(num_nodes, seed, node_schema, chunk_size)
+    for chunk in range(num_slabs):
+        if bounds[chunk] < bounds[chunk + 1]:
+            block = (bounds[chunk], bounds[chunk + 1], bounds[chunk + 2], radius)
+            tasks.append(('geometric', seed, chunk, block, None, edge_schema))
+    arrays = {'node_columns': node_columns, 'points': points}
+    if directed:
+        arrays['ranges'] = device_ranges
+    stream_graphml(path, tasks, node_schema, edge_schema, name, processes, arrays, directed)
+
+
+# Edges with their lower endpoint in the slab [lo, mid), looked up among the
+# devices of that slab and the next one, [lo, hi)
+def geometric_block_edges(rng, lo, mid, hi, radius):
+    points = _worker_arrays['points'][lo:hi]
+    if radius is None:
+        sources, targets = spatial_index.variable_radius_pairs(points, _worker_arrays['ranges'][lo:hi])
+    else:
+        sources, targets = spatial_index.fixed_radius_pairs(points, radius)
+    keep = np.minimum(sources, targets) < mid - lo
+    return lo + sources[keep], lo + targets[keep]
+
+
+EDGE_BLOCK_FUNCTIONS = {
+    'gnm': gnm_block_edges,
+    'chung_lu': chung_lu_block_edges,
+    'sbm': sbm_block_edges,
+    'geometric': geometric_block_edges,
+}
+
+
+# Consecutive row blocks [lo, hi) holding about chunk_size of some count each,
+# given its running total after every row
+def _row_blocks(cumulative_counts, chunk_size):
+    if len(cumulative_counts) == 0:
+        return []
+    num_chunks = max(1, int(math.ceil(cumulative_counts[-1] / float(chunk_size))))
+    targets = np.linspace(0, cumulative_counts[-1], num_chunks + 1)[1:-1]
+    bounds = np.searchsorted(cumulative_counts, targets, 'left') + 1
+    bounds = np.unique(np.concatenate([[0], bounds, [len(cumulative_counts)]]))
+    return zip(bounds[:-1].tolist(), bounds[1:].tolist())
+
+
+def draw_schema(rng, num_values, schema):
+    return [(attr, helper.draw_attribute_values(num_values, distribution, rng, **params))
+            for attr, distribution, params in schema]
+
+
+# GraphML text for one chunk: start is the element's opening tag (with %d
+# slots for its ids), columns the (attribute, values) pairs of its data
+def graphml_elements(start, ids, kind, columns):
+    if not columns:
+        template = start + ' />\n'
+        return ''.join(template % element for element in izip(*ids))
+    template = start + '>\n'
+    for attr, values in columns:
+        template += '      <data key="' + graphml_key_id(kind, attr) + '">%s</data>\n'
+    template += '    </' + kind + '>\n'
+    data = [[graphml_value(value) for value in values] for attr, values in columns]
+    return ''.join(template % element for element in izip(*(ids + data)))
+
+
+def graphml_key_id(kind, attr):
+    return escape(kind + '_' + attr, {'"': '&quot;'})
+
+
+def graphml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        # repr keeps every digit (str rounds to 12), so positions read back exactly
+        return repr(value)
+    if isinstance(value, basestring):
+        return escape(value)
+    return str(value)
+
+
+def graphml_type(distribution, params):
+    if distribution == 'uniform':
+        return 'int'
+    if distribution == 'boolean':
+        return 'boolean'
+    if distribution == 'normal':
+        return 'double'
+    value = params['values'][0]
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, long)):
+        return 'int'
+    if isinstance(value, float):
+        return 'double'
+    return 'string'
+
+
+# GraphML type of a column of values computed up front
+def graphml_column_type(values):
+    return {'b': 'boolean', 'i': 'int', 'f': 'double'}.get(values.dtype.kind, 'string')
+
+
+def graphml_header(node_schema, edge_schema, name, node_columns=(), directed=False):
+    header = ["<?xml version='1.0' encoding='utf-8'?>\n",
+              '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+              'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+              'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns '
+              'http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n']
+    keys = [('edge', attr, graphml_type(distribution, params)) for attr, distribution, params in edge_schema]
+    keys += [('node', attr, graphml_column_type(values)) for attr, values in node_columns]
+    keys += [('node', attr, graphml_type(distribution, params)) for attr, distribution, params in node_schema]
+    for kind, attr, attr_type in keys:
+        header.append('  <key attr.name=' + quoteattr(attr) + ' attr.type="' + attr_type
+                      + '" for="' + kind + '" id="' + graphml_key_id(kind, attr) + '" />\n')
+    header.append('  <key attr.name="name" attr.type="string" for="graph" id="graph_name" />\n')
+    header.append('  <graph edgedefault="' + ('directed' if directed else 'undirected') + '">\n')
+    header.append('    <data key="graph_name">' + escape(name) + '</data>\n')
+    return ''.join(header)
+
+
+def graphml_footer():
+    return '  </graph>\n</graphml>\n'
     
     
     
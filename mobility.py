@@ -0,0 +1,233 @@
+import itertools
+import random as rand
+
+import numpy as np
+
+import ingest
+import spatial_index
+
+
+
+# Key under graph.graph where the positions of moving devices are kept
+MOBILITY_KEY = 'mobility'
+
+
+
+####################################################################################
+'''
+Starts tracking the positions of a graph's devices so that they can move between
+rounds (see move_step). Devices sit in a grid of cells as wide as the largest
+range, so every device within range of one is in its own cell or a neighboring
+one. A device j is linked from device i when it lies within i's range, as in
+spatial_index.variable_radius_pairs. Devices follow a trajectory if one is given,
+and otherwise the random waypoint model when speed is above zero: each heads for
+a random point of the devices' bounding box at speed per round and pauses up to
+max_pause rounds on arriving. The waypoints and pauses come from a numpy generator
+seeded from the random module, so random.seed makes the movement repeatable.
+    Args:
+        graph: A networkx DiGraph instance, whose edges match the positions
+        nodes: The devices
+        points: An (N, d) array of their coordinates
+        ranges: An array of their ranges
+        trajectory: A read_trajectory dictionary, or None
+        speed: The random waypoint distance per round
+        max_pause: The most rounds a device pauses at a waypoint
+'''
+####################################################################################
+def track_devices(graph, nodes, points, ranges, trajectory=None, speed=0.0, max_pause=0):
+    points = np.array(points, dtype=float)
+    ranges = np.asarray(ranges, dtype=float)
+    largest = ranges.max() if len(ranges) else 0.0
+    state = {'nodes': list(nodes), 'position': dict((node, i) for i, node in enumerate(nodes)),
+             'points': points, 'ranges': ranges, 'cell_size': largest if largest > 0 else 1.0,
+             'trajectory': None, 'waypoint': None}
+    state['cell_of'] = grid_cells(state, points)
+    state['cells'] = {}
+    for i, cell in enumerate(map(tuple, state['cell_of'].tolist())):
+        state['cells'].setdefault(cell, set()).add(i)
+
+    if trajectory is not None:
+        state['trajectory'] = {}
+        for round_num, (names, round_points) in trajectory.iteritems():
+            unknown = [name for name in names if name not in state['position']]
+            if unknown:
+                raise ValueError('The trajectory moves unknown devices: ' + ', '.join(unknown[:5]))
+            positions = np.array([state['position'][name] for name in names], dtype=np.int64)
+            state['trajectory'][round_num] = (positions, round_points)
+    elif speed > 0 and len(points):
+        low = points.min(axis=0)
+        high = points.max(axis=0)
+        rng = np.random.RandomState(rand.getrandbits(32))
+        state['waypoint'] = {'speed': float(speed), 'max_pause': int(max_pause), 'low': low, 'high': high,
+                             'rng': rng, 'targets': _random_points(rng, low, high, len(points)),
+                             'pause': np.zeros(len(points), dtype=np.int64)}
+    graph.graph[MOBILITY_KEY] = state
+####################################################################################
+
+
+
+####################################################################################
+'''
+Reads a trajectory file of round,node,x,y[,z] rows: the position each listed
+device moves to at the start of a round. Devices keep their position in rounds
+that do not list them.
+    Args:
+        path: The trajectory file
+        dimensions: The number of coordinates on every row
+
+    Returns:
+        A dictionary from round number to the devices moving then and an
+        (N, dimensions) array of where they move to
+'''
+####################################################################################
+def read_trajectory(path, dimensions=2):
+    rounds = []
+    names = []
+    points = []
+    for block in ingest.read_field_blocks(path, 2 + dimensions, ','):
+        rounds.append(block[:, 0].astype(np.int64))
+        names += block[:, 1].tolist()
+        points.append(block[:, 2:].astype(float))
+    if not rounds:
+        return {}
+    rounds = np.concatenate(rounds)
+    points = np.concatenate(points)
+
+    # Rows of a round keep their file order, so a device's last row wins
+    order = np.argsort(rounds, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(rounds[order])) + 1
+    trajectory = {}
+    for rows in np.split(order, bounds):
+        trajectory[int(rounds[rows[0]])] = ([names[row] for row in rows.tolist()], points[rows])
+    return trajectory
+####################################################################################
+
+
+
+####################################################################################
+'''
+Moves the tracked devices for a round, from the trajectory or the random waypoint
+model, and adds the edges that appear and disappear to the given lists, as
+before_round_start hands them to the engine.
+    Args:
+        graph: A networkx graph instance, tracked by track_devices
+        round_num: The number of the current round
+        add_edge_list: A list the new edges are added to
+        remove_edge_list: A list the lost edges are added to
+'''
+####################################################################################
+def move_step(graph, round_num, add_edge_list, remove_edge_list):
+    state = graph.graph[MOBILITY_KEY]
+    if state['trajectory'] is not None:
+        if round_num not in state['trajectory']:
+            return
+        positions, points = state['trajectory'][round_num]
+    elif state['waypoint'] is not None:
+        positions, points = _waypoint_step(state)
+    else:
+        return
+    added, removed = move_devices(graph, positions, points)
+    add_edge_list.extend(added)
+    remove_edge_list.extend(removed)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Moves some tracked devices and finds how the edges change. Only the moved devices
+are checked again, each against the devices in its own and the neighboring grid
+cells; the grid itself changes only for the devices that crossed into another
+cell. Devices no longer in the graph move but get no edges.
+    Args:
+        graph: A networkx graph instance, tracked by track_devices
+        positions: An integer array of the tracked positions of the moved devices
+        points: An array of their new coordinates
+
+    Returns:
+        The lists of edges to add and to remove, in device order
+'''
+####################################################################################
+def move_devices(graph, positions, points):
+    state = graph.graph[MOBILITY_KEY]
+    positions = np.asarray(positions, dtype=np.int64)
+    state['points'][positions] = points
+
+    cells = grid_cells(state, state['points'][positions])
+    crossed = np.flatnonzero((cells != state['cell_of'][positions]).any(axis=1))
+    for k in crossed.tolist():
+        i = int(positions[k])
+        state['cells'][tuple(state['cell_of'][i].tolist())].discard(i)
+        state['cells'].setdefault(tuple(cells[k].tolist()), set()).add(i)
+    state['cell_of'][positions] = cells
+
+    nodes = state['nodes']
+    position = state['position']
+    wanted = set()
+    present = set()
+    for i in np.unique(positions).tolist():
+        node = nodes[i]
+        if node not in graph.node:
+            continue
+        for neighbor in graph.succ[node]:
+            present.add((i, position[neighbor]))
+        for neighbor in graph.pred[node]:
+            present.add((position[neighbor], i))
+        candidates = np.array([j for j in neighbor_cell_members(state, i)
+                               if j != i and nodes[j] in graph.node], dtype=np.int64)
+        if not len(candidates):
+            continue
+        distances = spatial_index.exact_distances(state['points'], np.full(len(candidates), i, dtype=np.int64), candidates)
+        wanted.update((i, j) for j in candidates[distances <= state['ranges'][i]].tolist())
+        wanted.update((j, i) for j in candidates[distances <= state['ranges'][candidates]].tolist())
+
+    added = [(nodes[i], nodes[j]) for i, j in sorted(wanted - present)]
+    removed = [(nodes[i], nodes[j]) for i, j in sorted(present - wanted)]
+    return added, removed
+####################################################################################
+
+
+
+####################################################################################
+'''
+Grid helpers.
+    grid_cells: The integer cell coordinates of an (N, d) array of points
+    neighbor_cell_members: The tracked positions of the devices in a device's own
+                           and neighboring cells
+'''
+####################################################################################
+def grid_cells(state, points):
+    return np.floor(np.asarray(points, dtype=float) / state['cell_size']).astype(np.int64)
+
+def neighbor_cell_members(state, i):
+    cell = state['cell_of'][i].tolist()
+    members = []
+    for offset in itertools.product((-1, 0, 1), repeat=len(cell)):
+        members.extend(state['cells'].get(tuple(c + o for c, o in zip(cell, offset)), ()))
+    return members
+####################################################################################
+
+
+
+def _random_points(rng, low, high, count):
+    return low + rng.random_sample((count, len(low))) * (high - low)
+
+def _waypoint_step(state):
+    # Paused devices count down; the others head for their waypoint and, on
+    # reaching it, draw a pause and the next waypoint
+    waypoint = state['waypoint']
+    pause = waypoint['pause']
+    moving = np.flatnonzero(pause == 0)
+    pause[pause > 0] -= 1
+    points = state['points'][moving]
+    delta = waypoint['targets'][moving] - points
+    distances = np.sqrt((delta ** 2).sum(axis=1))
+    arrived = distances <= waypoint['speed']
+    steps = delta * (waypoint['speed'] / np.where(arrived, 1.0, distances))[:, np.newaxis]
+    new_points = np.where(arrived[:, np.newaxis], waypoint['targets'][moving], points + steps)
+
+    arrivals = moving[arrived]
+    waypoint['targets'][arrivals] = _random_points(waypoint['rng'], waypoint['low'], waypoint['high'], len(arrivals))
+    pause[arrivals] = waypoint['rng'].randint(0, waypoint['max_pause'] + 1, size=len(arrivals))
+    moved = distances > 0
+    return moving[moved], new_points[moved]
@@ -30,7 +30,7 @@ A logically sound place to put data processing is at the end of this method.
 def simulation_driver():
    global max_weight
    # Read in a graph
-   graph = nx.read_graphml('simplemodel.graphml')
+   graph = helper.read_graph('simplemodel.graphml')
    max_weight = helper.max_weight(graph)
    helper.output_graph_information(graph)
 
@@ -253,11 +253,11 @@ def init(graph, node, sim_name):
    dict = nx.get_edge_attributes(graph, 'weight')
    
    # Write 1 weight to all edges
-   nx.set_edge_attributes(graph, 'weight', 1)
+   helper.create_edge_attribute(graph, 'weight', 1)
    
    # Restore initial edges
    for n1,n2 in dict:
-      graph.edge[n1][n2]['weight'] = dict[n1,n2]
+      helper.create_single_edge_attribute(graph, n1, n2, 'weight', dict[n1,n2])
    
    
    # Set an arbitrary node
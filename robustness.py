@@ -0,0 +1,151 @@
+import random
+
+import graph_index
+
+
+
+# The removal orders removal_curves computes curves for
+STRATEGIES = ['random', 'degree', 'traffic']
+
+
+
+####################################################################################
+'''
+Orders the nodes of a graph for removal.
+    Args:
+        graph: A networkx graph instance.
+        strategy: 'random', 'degree' (most neighbors first, counting in- and
+                  out-edges of directed graphs) or 'traffic' (most traffic first)
+        traffic: A dictionary of per-node traffic, for 'traffic'
+        seed: The seed of the 'random' order
+
+    Returns:
+        A list of every node, in the order they are removed
+'''
+####################################################################################
+def removal_order(graph, strategy, traffic=None, seed=None):
+    nodes = list(graph)
+    if strategy == 'random':
+        random.Random(seed).shuffle(nodes)
+    elif strategy == 'degree':
+        degree = graph.degree()
+        nodes.sort(key=lambda node: -degree[node])
+    elif strategy == 'traffic':
+        nodes.sort(key=lambda node: -traffic.get(node, 0))
+    else:
+        raise ValueError('Unknown removal strategy: ' + str(strategy))
+    return nodes
+####################################################################################
+
+
+
+####################################################################################
+'''
+Computes how a graph falls apart as nodes are removed in a given order, for every
+number of removed nodes at once, with the Newman-Ziff algorithm: the nodes are
+added back in reverse order and their components merged with a union-find, so
+the whole curve takes a single near-linear pass over the edges. Components are
+weak ones, with edge directions ignored, so for a directed graph the pair
+connectivity is an upper bound of the reachability of
+critical_nodes.reachability_spread, which it equals on symmetric graphs.
+    Args:
+        graph: A networkx graph instance.
+        order: The nodes in the order they are removed (see removal_order)
+
+    Returns:
+        A list with an entry for 0, 1, ..., len(order) removed nodes: a tuple of the
+        fraction of nodes removed, the size of the largest component over the
+        number of nodes, and the pair connectivity, the share of ordered pairs of
+        the remaining nodes (a node paired with itself included) in one component
+'''
+####################################################################################
+def percolation_curve(graph, order):
+    index = graph_index.get_neighbor_index(graph)
+    offsets, neighbors = index['all']
+    offsets = offsets.tolist()
+    neighbors = neighbors.tolist()
+    num_nodes = len(order)
+
+    parent = range(len(index['nodes']))
+    size = [0] * len(parent)
+    largest = 0
+    pairs = 0
+    curve = [None] * (num_nodes + 1)
+    curve[num_nodes] = (1.0, 0.0, 0.0)
+    for added, node in enumerate(reversed(order), 1):
+        i = index['position'][node]
+        size[i] = 1
+        pairs += 1
+        largest = max(largest, 1)
+        for neighbor in neighbors[offsets[i]:offsets[i + 1]]:
+            if not size[neighbor]:
+                continue # Not added yet
+            root_i = _find(parent, i)
+            root_neighbor = _find(parent, neighbor)
+            if root_i == root_neighbor:
+                continue
+            if size[root_i] < size[root_neighbor]:
+                root_i, root_neighbor = root_neighbor, root_i
+            pairs += 2 * size[root_i] * size[root_neighbor]
+            parent[root_neighbor] = root_i
+            size[root_i] += size[root_neighbor]
+            largest = max(largest, size[root_i])
+        removed = num_nodes - added
+        curve[removed] = (removed / float(num_nodes), largest / float(num_nodes), pairs / float(added ** 2))
+    return curve
+####################################################################################
+
+
+
+####################################################################################
+'''
+Percolation curves of a graph for several removal orders.
+    Args:
+        graph: A networkx graph instance.
+        traffic: A dictionary of per-node traffic, or None to leave out the
+                 'traffic' order
+        seed: The seed of the 'random' order
+        strategies: The removal orders to compute
+
+    Returns:
+        A dictionary from strategy to its percolation_curve
+'''
+####################################################################################
+def removal_curves(graph, traffic=None, seed=None, strategies=STRATEGIES):
+    curves = {}
+    for strategy in strategies:
+        if strategy == 'traffic' and traffic is None:
+            continue
+        curves[strategy] = percolation_curve(graph, removal_order(graph, strategy, traffic, seed))
+    return curves
+####################################################################################
+
+
+
+####################################################################################
+'''
+The smallest fraction of removed nodes at which a percolation curve's pair
+connectivity falls below a threshold.
+    Args:
+        curve: A percolation_curve
+        threshold: The pair connectivity to get below
+
+    Returns:
+        The fraction of nodes removed, or None if the curve never gets below
+'''
+####################################################################################
+def critical_fraction(curve, threshold):
+    for fraction, largest, connectivity in curve[:-1]:
+        if connectivity < threshold:
+            return fraction
+    return None
+####################################################################################
+
+
+
+def _find(parent, i):
+    # Path halving
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
@@ -1,13 +1,26 @@
 import networkx as nx
+import numpy as np
 import random as rand
 import copy
 import datetime
+import os
 import traceback as tb
+from itertools import izip
 from time import sleep
 
 import simdefaults as defaults
+import graph_binary
+import graph_metrics
+import graph_index
+import graph_stats
+import graphml_stream
+import mobility
 
 
+# Directory holding the name lists, and the lists loaded from it so far
+assets_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+_asset_cache = {}
+
 
 ####################################################################################
 # Returns an integer value with the number of flagged nodes given an attribute     #
@@ -74,7 +87,9 @@ def total_percent_flagged(graph, num_flagged, num_simulations):
 
 ####################################################################################
 '''
-Pass in a graph, get the integer maximum weight of all edges
+Pass in a graph, get the integer maximum weight of all edges. Read from the
+graph's statistics cache (see graph_stats), which is kept current as simhelper
+modifies the graph.
     Args:
         graph: A graph for our simulation
 
@@ -83,11 +98,7 @@ Pass in a graph, get the integer maximum weight of all edges
 '''
 ####################################################################################
 def max_weight(graph):
-    max_weight = float('-inf')
-    dict = nx.get_edge_attributes(graph, 'weight')
-    for val in dict:
-        max_weight = max(max_weight, dict[val])
-    return max_weight
+    return graph_stats.max_weight(graph)
 ####################################################################################
 
 
@@ -124,19 +135,19 @@ def chance(percentage_chance):
 
 ####################################################################################
 '''
-Dumps information about the given graph.
+Dumps information about the given graph, read from its statistics cache.
     Args:
         graph: A graph for our simulation
 '''
 ####################################################################################
 def output_graph_information(graph):
     print '*' * defaults.asterisk_space_count
-    print 'Graph has ' + str(graph.number_of_nodes()) + ' node(s) and ' + str(graph.number_of_edges()) + ' edge(s).'
-    print 'Density: ' + str(nx.density(graph))
+    print 'Graph has ' + str(graph_stats.number_of_nodes(graph)) + ' node(s) and ' + str(graph_stats.number_of_edges(graph)) + ' edge(s).'
+    print 'Density: ' + str(graph_stats.density(graph))
     print 'Max weight of edges: ' + str(max_weight(graph))
     if not nx.is_directed(graph):
         print 'Graph is undirected.'
-        if nx.is_connected(graph):
+        if graph_stats.is_connected(graph):
             print 'Graph is completely connected.'
         else:
             print 'Graph is disjoint.'
@@ -386,6 +397,28 @@ Creates an edge attribute with an initial value.
 ####################################################################################
 def create_edge_attribute(graph, attr, init_value):
     nx.set_edge_attributes(graph, attr, init_value)
+    if (attr == 'weight'):
+        graph_stats.invalidate_graph_stats(graph)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Sets an attribute on a single edge. Weight changes are passed on to the graph's
+statistics cache so its max/min weight stay current.
+    Args:
+        graph: A graph for our simulation
+        u: The source node of an edge
+        v: The destination node of an edge
+        attr: An attribute name
+        value: The new value of the attribute
+'''
+####################################################################################
+def set_edge_attribute(graph, u, v, attr, value):
+    if (attr == 'weight'):
+        graph_stats.record_weight_change(graph, u, v, value)
+    graph.edge[u][v][attr] = value
 ####################################################################################
 
 
@@ -402,7 +435,7 @@ Creates a single edge attribute with an initial value.
 '''
 ####################################################################################
 def create_single_edge_attribute(graph, u, v, attr, init_value):
-    graph.edge[u][v][attr] = init_value
+    set_edge_attribute(graph, u, v, attr, init_value)
 ####################################################################################
 
 
@@ -419,7 +452,7 @@ Creates an edge attribute with an initial value across a list of edges.
 ####################################################################################
 def create_edge_list_attribute(graph, edge_list, attr, init_value):
     for u,v in edge_list:
-        graph.edge[u][v][attr] = init_value
+        set_edge_attribute(graph, u, v, attr, init_value)
 ####################################################################################
 
 
@@ -435,10 +468,13 @@ Randomizes attributes of all edges in a graph to a value in a specified range.
 '''
 ####################################################################################
 def randomize_edge_attribute(graph, attr, low, high):
+    directed = nx.is_directed(graph)
     for source in graph.edge:
         for dest in graph.edge[source]:
-                if source < dest or nx.is_directed(graph):
+                if source < dest or directed:
                     graph.edge[source][dest][attr] = rand.randint(low, high)
+    if (attr == 'weight'):
+        graph_stats.invalidate_graph_stats(graph)
 ####################################################################################
 
 
@@ -456,7 +492,7 @@ Randomizes attributes of a single edge in a graph to a value in a specified rang
 '''
 ####################################################################################
 def randomize_single_edge_attribute(graph, u, v, attr, low, high):
-    graph.edge[u][v][attr] = rand.randint(low, high)
+    set_edge_attribute(graph, u, v, attr, rand.randint(low, high))
 ####################################################################################
 
 
@@ -474,7 +510,7 @@ Randomizes attributes of all edges in a graph to a value in a specified range.
 ####################################################################################
 def randomize_edge_list_attribute(graph, edge_list, attr, low, high):
     for u,v in edge_list:
-        graph.edge[u][v][attr] = rand.randint(low, high)
+        set_edge_attribute(graph, u, v, attr, rand.randint(low, high))
 ####################################################################################
 
 
@@ -490,9 +526,10 @@ are set to true.
 '''
 ####################################################################################
 def randomize_edge_attribute_boolean(graph, attr, true_chance):
+    directed = nx.is_directed(graph)
     for source in graph.edge:
         for dest in graph.edge[source]:
-            if source < dest or nx.is_directed(graph):
+            if source < dest or directed:
                 graph.edge[source][dest][attr] = chance(true_chance)
 ####################################################################################
 
@@ -533,6 +570,130 @@ def randomize_edge_list_attribute_boolean(graph, edge_list, attr, true_chance):
 
 
 
+####################################################################################
+'''
+Returns a numpy random generator for a seed. Seeds may be any non-negative integer
+(larger ones than numpy accepts are split into 32-bit words), None for a generator
+seeded from the random module (so random.seed still governs it), or an existing
+generator, which is returned unchanged so that several draws can share one stream. A stream key gives independent, reproducible
+generators from one integer seed, e.g. one per chunk of a generated graph.
+    Args:
+        seed: An integer seed, None, or a numpy RandomState
+        stream: A tuple of non-negative integers mixed into an integer seed
+
+    Returns:
+        A numpy RandomState
+'''
+####################################################################################
+def make_rng(seed=None, stream=()):
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    if seed is None:
+        # Drawn from the random module, so random.seed makes the draw repeatable
+        seed = rand.getrandbits(64)
+    words = []
+    while True:
+        words.append(seed & 0xffffffff)
+        seed >>= 32
+        if seed == 0:
+            # The word count goes first so that streams of different seeds
+            # never share a key
+            if stream:
+                words = [len(words)] + words + list(stream)
+            return np.random.RandomState(words)
+####################################################################################
+
+
+
+####################################################################################
+'''
+Draws an array of attribute values in a single numpy call.
+    Args:
+        num_values: The number of values to draw
+        distribution: One of
+                      'uniform' - integers, params low and high (both inclusive)
+                      'boolean' - params true_chance (like chance())
+                      'normal' - floats, params mean and std
+                      'choice' - params values and, optionally, probabilities
+        seed: An integer seed, None, or a numpy RandomState (see make_rng)
+        params: The parameters of the distribution
+
+    Returns:
+        A list of num_values plain Python values.
+'''
+####################################################################################
+def draw_attribute_values(num_values, distribution, seed=None, **params):
+    rng = make_rng(seed)
+    if (distribution == 'uniform'):
+        values = rng.randint(params['low'], params['high'] + 1, size=num_values)
+    elif (distribution == 'boolean'):
+        values = rng.random_sample(num_values) < params['true_chance']
+    elif (distribution == 'normal'):
+        values = rng.normal(params['mean'], params['std'], size=num_values)
+    elif (distribution == 'choice'):
+        chosen = rng.choice(len(params['values']), size=num_values, p=params.get('probabilities'))
+        return [params['values'][i] for i in chosen]
+    else:
+        raise ValueError('Unknown attribute distribution: ' + str(distribution))
+    return values.tolist()
+####################################################################################
+
+
+
+####################################################################################
+'''
+Randomizes an attribute of every node in a graph with one seeded draw of the whole
+value array, attached to the nodes in a single pass. The same graph and seed always
+give the same values.
+    Args:
+        graph: A graph for our simulation
+        attr: An attribute name
+        distribution: The distribution to draw from (see draw_attribute_values)
+        seed: An integer seed, None, or a numpy RandomState (see make_rng)
+        params: The parameters of the distribution
+'''
+####################################################################################
+def bulk_randomize_node_attribute(graph, attr, distribution, seed=None, **params):
+    values = draw_attribute_values(graph.number_of_nodes(), distribution, seed, **params)
+    for data, value in izip(graph.node.itervalues(), values):
+        data[attr] = value
+####################################################################################
+
+
+
+####################################################################################
+'''
+Randomizes an attribute of every edge in a graph with one seeded draw of the whole
+value array, attached to the edges in a single pass. Undirected edges get a single
+value, shared by both directions.
+    Args:
+        graph: A graph for our simulation
+        attr: An attribute name
+        distribution: The distribution to draw from (see draw_attribute_values)
+        seed: An integer seed, None, or a numpy RandomState (see make_rng)
+        params: The parameters of the distribution
+'''
+####################################################################################
+def bulk_randomize_edge_attribute(graph, attr, distribution, seed=None, **params):
+    # Walk the adjacency directly; both directions of an undirected edge share
+    # one data dictionary, so only take it from the first endpoint visited
+    directed = nx.is_directed(graph)
+    edge_data = []
+    seen = set()
+    for u, neighbors in graph.adj.iteritems():
+        for v, data in neighbors.iteritems():
+            if (directed or v not in seen):
+                edge_data.append(data)
+        seen.add(u)
+    values = draw_attribute_values(len(edge_data), distribution, seed, **params)
+    for data, value in izip(edge_data, values):
+        data[attr] = value
+    if (attr == 'weight'):
+        graph_stats.invalidate_graph_stats(graph)
+####################################################################################
+
+
+
 ####################################################################################
 '''
 Subgraph completion check, takes only a graph argument.
@@ -670,14 +831,16 @@ exceeded a density limit.
 '''
 ####################################################################################
 def exceeded_density_limit(graph, density_limit):
-    return (nx.density(graph) > density_limit)
+    return (graph_stats.density(graph) > density_limit)
 ####################################################################################
 
 
 
 ####################################################################################
 '''
-Returns a deep copy of a graph provided to the function
+Returns a deep copy of a graph provided to the function. A cached neighbor
+index is copied without its read-only CSR arrays, which the copy shares, and
+cached statistics are not copied at all.
     Args:
         graph: The graph that shall be copied
 		
@@ -686,7 +849,22 @@ Returns a deep copy of a graph provided to the function
 '''
 ####################################################################################
 def copy_graph(graph):
-    return copy.deepcopy(graph)
+    # The neighbor index arrays are read-only, so the copy can share them
+    # rather than deep-copying them
+    # Cached statistics are left out and rebuilt if the copy is ever asked for them
+    # Device positions are only moved on the graph itself, so the copy goes without
+    index = graph.graph.pop(graph_index.INDEX_KEY, None)
+    stats = graph.graph.pop(graph_stats.STATS_KEY, None)
+    positions = graph.graph.pop(mobility.MOBILITY_KEY, None)
+    graph_copy = copy.deepcopy(graph)
+    if positions is not None:
+        graph.graph[mobility.MOBILITY_KEY] = positions
+    if index is not None:
+        graph.graph[graph_index.INDEX_KEY] = index
+        graph_copy.graph[graph_index.INDEX_KEY] = graph_index.copy_index(index)
+    if stats is not None:
+        graph.graph[graph_stats.STATS_KEY] = stats
+    return graph_copy
 ####################################################################################
 
 
@@ -694,6 +872,8 @@ def copy_graph(graph):
 ####################################################################################
 '''
 Modifies the graph and adds and removes edges and nodes that are provided.
+The cached neighbor index is dropped when edges or nodes are added, and patched
+when nodes are only removed. Cached graph statistics are updated with each change.
     Args:
         graph: The current graph for the simulation
         add_node_list: A list of nodes to be added
@@ -720,9 +900,19 @@ Modifies the graph and specifically deals with removing edges.
 ####################################################################################
 def modify_graph_edges(graph, add_edge_list, remove_edge_list):
     for v1,v2 in remove_edge_list:
+        graph_stats.record_edge_removal(graph, v1, v2)
         graph.remove_edge(v1, v2)
     for v1,v2 in add_edge_list:
+        if (graph.has_edge(v1, v2)):
+            continue
+        for v in set([v1, v2]):
+            if (v not in graph):
+                graph.add_node(v)
+                graph_stats.record_node_addition(graph, v)
         graph.add_edge(v1, v2)
+        graph_stats.record_edge_addition(graph, v1, v2)
+    if (add_edge_list or remove_edge_list):
+        graph_index.invalidate_neighbor_index(graph)
 ####################################################################################
 
 
@@ -738,9 +928,16 @@ Modifies the graph and specifically deals with removing nodes.
 ####################################################################################
 def modify_graph_nodes(graph, add_node_list, remove_node_list):
     for v in remove_node_list:
+        graph_stats.record_node_removal(graph, v)
         graph.remove_node(v)
     for v in add_node_list:
-        graph.add_node(v)
+        if (v not in graph):
+            graph.add_node(v)
+            graph_stats.record_node_addition(graph, v)
+    if (add_node_list):
+        graph_index.invalidate_neighbor_index(graph)
+    elif (remove_node_list):
+        graph_index.remove_nodes_from_index(graph, remove_node_list)
 ####################################################################################
 
 
@@ -848,6 +1045,29 @@ def betweenness_centrality(graph):
 
 
 
+####################################################################################
+'''
+Returns a dictionary of all nodes in a graph and their approximate betweenness
+centrality, from just enough random shortest paths that every value is within
+epsilon of the exact one with probability 1 - delta. The number of paths does not
+grow with the graph (see graph_metrics.path_sample_size). Meant for graphs too
+large for the exact betweenness_centrality.
+    Args:
+        graph: A networkx graph instance
+        epsilon: The largest acceptable error on any node's betweenness
+        delta: The acceptable chance that some value misses the error bound
+
+    Returns:
+        A dictionary of nodes and their approximate betweenness centrality, and
+        the error bound reached by the sample
+'''
+####################################################################################
+def approx_betweenness_centrality(graph, epsilon=0.05, delta=0.1):
+     return graph_metrics.approx_betweenness_centrality(graph, epsilon, delta)
+####################################################################################
+
+
+
 ####################################################################################
 '''
 Returns a sorted list from an unsorted dictionary.
@@ -934,6 +1154,26 @@ def to_undirected(g):
 
 
 
+####################################################################################
+'''
+Reads a graph file for a simulation. Binary CSR files (.csr, see graph_binary) are
+memory mapped and come with their neighbor index already attached; anything else
+is read as GraphML, incrementally (see graphml_stream).
+    Args:
+        path: The path of a .graphml or .csr file
+        
+    Returns:
+        A networkx graph instance.
+'''
+####################################################################################
+def read_graph(path):
+    if path.endswith('.csr'):
+        return graph_binary.read_csr_graph(path)
+    return graphml_stream.read_graphml(path)
+####################################################################################
+
+
+
 ####################################################################################
 '''
 Returns an iterator of neighbors given a graph and a node.
@@ -988,24 +1228,55 @@ def print_iterable_linebreak(_iterable):
 
 ####################################################################################
 '''
-Returns an iterator of neighbors given a graph and a node.
-NOTE: According to the networx documentation, this will return a list
-with precessors AND successors in the case of a directed graph.
+Returns a list of neighbors given a graph and a node, with predecessors AND
+successors in the case of a directed graph, each listed once. Read from the
+graph's cached neighbor index (see graph_index), which is built on first use.
     Args:
         graph: A networkx graph instance.
         node: A node for which we will get neighbors.
         
     Returns:
-        An iterable containing the neighbors of the passed in node.
+        A list containing the unique neighbors of the passed in node.
 '''
 ####################################################################################
 def get_unique_neighbors_list(g, node):
-    neighbor_list = list(nx.all_neighbors(g, node))
-    unique_list = []
-    for n in neighbor_list:
-        if n not in unique_list:
-            unique_list.append(n)
-    return unique_list
+    return graph_index.neighbor_list(g, node, 'all')
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns a list of the nodes a node has an edge to (its successors in the case of a
+directed graph). Read from the graph's cached neighbor index.
+    Args:
+        graph: A networkx graph instance.
+        node: A node for which we will get neighbors.
+        
+    Returns:
+        A list containing the out-neighbors of the passed in node.
+'''
+####################################################################################
+def get_out_neighbors_list(g, node):
+    return graph_index.neighbor_list(g, node, 'out')
+####################################################################################
+
+
+
+####################################################################################
+'''
+Returns a list of the nodes that have an edge to a node (its predecessors in the
+case of a directed graph). Read from the graph's cached neighbor index.
+    Args:
+        graph: A networkx graph instance.
+        node: A node for which we will get neighbors.
+        
+    Returns:
+        A list containing the in-neighbors of the passed in node.
+'''
+####################################################################################
+def get_in_neighbors_list(g, node):
+    return graph_index.neighbor_list(g, node, 'in')
 ####################################################################################
 
 
@@ -1039,6 +1310,31 @@ def get_list_from_file(file, n, line_limit=0):
 
 
 
+####################################################################################
+'''
+Returns the lines of a name list in the assets directory as an array of interned
+strings. Each list is read from disk once per process and kept in _asset_cache;
+later calls return the cached array.
+    Args:
+        name: The name of the asset file without its extension (i.e., 'male_names')
+
+    Returns:
+        A numpy object array holding one stripped line per entry.
+'''
+####################################################################################
+def load_asset(name):
+    if (name not in _asset_cache):
+        asset_file = open(os.path.join(assets_dir, name + '.txt'), 'r')
+        lines = [intern(line.strip()) for line in asset_file]
+        asset_file.close()
+        values = np.empty(len(lines), dtype=object)
+        values[:] = lines
+        _asset_cache[name] = values
+    return _asset_cache[name]
+####################################################################################
+
+
+
 ####################################################################################
 '''
 Returns a list of male names from the top n common first names for males.
@@ -1050,42 +1346,75 @@ Returns a list of male names from the top n common first names for males.
 '''
 ####################################################################################
 def get_list_of_male_names(number_of_results):
-    mf = open('assets/male_names.txt', 'r')
-    return get_list_from_file(mf, number_of_results, line_limit=1000)
+    return load_asset('male_names')[:min(number_of_results, 1000)].tolist()
 ####################################################################################
 
 
 
 ####################################################################################
 '''
-Returns a list of male names from the top n common first names for males.
+Returns a list of female names from the top n common first names for females.
     Args:
         number_of_results: The number of results to be returned (at MOST 1000)
         
     Returns:
-        A list of male names of size n.
+        A list of female names of size n.
 '''
 ####################################################################################
 def get_list_of_female_names(number_of_results):
-    ff = open('assets/female_names.txt', 'r')
-    return get_list_from_file(ff, number_of_results, line_limit=1000)
+    return load_asset('female_names')[:min(number_of_results, 1000)].tolist()
 ####################################################################################
 
 
 
 ####################################################################################
 '''
-Returns a list of male names from the top n common first names for males.
+Returns a list of last names from the top n common last names.
     Args:
         number_of_results: The number of results to be returned (at MOST 1000)
         
     Returns:
-        A list of male names of size n.
+        A list of last names of size n.
 '''
 ####################################################################################
 def get_list_of_last_names(number_of_results):
-    lnf = open('assets/last_names.txt', 'r')
-    return get_list_from_file(lnf, number_of_results, line_limit=1000)
+    return load_asset('last_names')[:min(number_of_results, 1000)].tolist()
+####################################################################################
+
+
+
+####################################################################################
+'''
+Draws n full names from a list of first names and a list of last names in one
+vectorized draw. With unique=True the names are a sample without replacement of
+the (first, last) combinations, drawn as distinct combination indices so no
+rejection loop is needed.
+    Args:
+        first_names: A numpy object array of first names (no duplicates if unique)
+        last_names: A numpy object array of last names
+        n: Number of names to draw
+        unique: Whether or not every returned name must be different
+        seed: An optional seed for the draw
+
+    Returns:
+        A list of n full names.
+'''
+####################################################################################
+def draw_full_names(first_names, last_names, n, unique=False, seed=None):
+    rng = make_rng(seed)
+    num_first = len(first_names)
+    num_last = len(last_names)
+    if (unique):
+        if (n > num_first * num_last):
+            raise ValueError('Cannot draw ' + str(n) + ' unique names from ' \
+                             + str(num_first * num_last) + ' combinations.')
+        combinations = rng.choice(num_first * num_last, n, replace=False)
+        first_idx = combinations // num_last
+        last_idx = combinations % num_last
+    else:
+        first_idx = rng.randint(0, num_first, size=n)
+        last_idx = rng.randint(0, num_last, size=n)
+    return (first_names[first_idx] + ' ' + last_names[last_idx]).tolist()
 ####################################################################################
 
 
@@ -1096,22 +1425,33 @@ Returns a list of n names from all possible name combinations. This is not gende
 specific, and will randomly grab names. If you would like gender-specific names, it
 would be wise to use the gender-specific name methods.
 
-Names are in the format First Last, and it is important to note that this method 
-offers no guarantee of name uniquess.
+Names are in the format First Last. By default this method offers no guarantee of
+name uniqueness; with unique=True every name is different, drawn uniformly from
+all distinct first/last combinations.
 
     Args:
-        n: Number of names the function will return (can be any amount)
+        n: Number of names the function will return (can be any amount, or at most
+           the number of combinations if unique)
+        unique: Whether or not every returned name must be different
+        seed: An optional seed for the draw
 
     Returns:
         A list of n full names.
 '''
 ####################################################################################
-def get_names(n):
-    ln = get_list_of_last_names(1000)
-    fn  = get_list_of_female_names(1000)
-    mn = get_list_of_male_names(1000)
-    return [rand.choice(mn) + ' ' + rand.choice(ln) if bool(rand.getrandbits(1))  \
-                else rand.choice(fn) + ' ' + rand.choice(ln) for i in range(n)]
+def get_names(n, unique=False, seed=None):
+    ln = load_asset('last_names')
+    fn = load_asset('female_names')
+    mn = load_asset('male_names')
+    if (unique):
+        # Some first names are in both lists, and would repeat combinations
+        return draw_full_names(np.unique(np.concatenate([mn, fn])), ln, n, unique, seed)
+    rng = make_rng(seed)
+    is_male = rng.randint(0, 2, size=n).astype(bool)
+    first = np.where(is_male,
+                     mn[rng.randint(0, len(mn), size=n)],
+                     fn[rng.randint(0, len(fn), size=n)])
+    return (first + ' ' + ln[rng.randint(0, len(ln), size=n)]).tolist()
 ####################################################################################
 
 
@@ -1119,20 +1459,21 @@ def get_names(n):
 ####################################################################################
 '''
 Returns a list of n female names from all possible name combinations.
-Names are in the format First Last, and it is important to note that this method 
-offers no guarantee of name uniquess.
+Names are in the format First Last. By default this method offers no guarantee of
+name uniqueness; with unique=True every name is different.
 
     Args:
-        n: Number of names the function will return (can be any amount)
+        n: Number of names the function will return (can be any amount, or at most
+           the number of combinations if unique)
+        unique: Whether or not every returned name must be different
+        seed: An optional seed for the draw
 
     Returns:
         A list of n full names.
 '''
 ####################################################################################
-def get_female_names(n):
-    ln = get_list_of_last_names(1000)
-    fn  = get_list_of_female_names(1000)
-    return [rand.choice(fn) + ' ' + rand.choice(ln) for i in range(n)]
+def get_female_names(n, unique=False, seed=None):
+    return draw_full_names(load_asset('female_names'), load_asset('last_names'), n, unique, seed)
 ####################################################################################
 
 
@@ -1140,20 +1481,21 @@ def get_female_names(n):
 ####################################################################################
 '''
 Returns a list of n male names from all possible name combinations.
-Names are in the format First Last, and it is important to note that this method 
-offers no guarantee of name uniquess.
+Names are in the format First Last. By default this method offers no guarantee of
+name uniqueness; with unique=True every name is different.
 
     Args:
-        n: Number of names the function will return (can be any amount)
+        n: Number of names the function will return (can be any amount, or at most
+           the number of combinations if unique)
+        unique: Whether or not every returned name must be different
+        seed: An optional seed for the draw
 
     Returns:
         A list of n full names.
 '''
 ####################################################################################
-def get_male_names(n):
-    ln = get_list_of_last_names(1000)
-    mn = get_list_of_male_names(1000)
-    return [rand.choice(mn) + ' ' + rand.choice(ln) for i in range(n)]
+def get_male_names(n, unique=False, seed=None):
+    return draw_full_names(load_asset('male_names'), load_asset('last_names'), n, unique, seed)
 ####################################################################################
 
 
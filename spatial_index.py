@@ -0,0 +1,182 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+
+# Search radii are padded by this relative amount so that the KD-tree, which
+# compares squared distances, never misses a pair the exact check would keep
+RADIUS_PAD = 1e-9
+
+# Above this many distinct per-node ranges, sources are binned instead of
+# being queried once per range value
+MAX_RANGE_GROUPS = 32
+
+
+
+####################################################################################
+'''
+Finds every pair of points within a fixed distance of each other, using a KD-tree
+so that only nearby points are compared. Candidates are checked again with the
+same arithmetic as math.sqrt(dx**2 + dy**2 [+ dz**2]) <= radius, so the result is
+exactly the set of pairs the plain nested loop would connect.
+    Args:
+        points: An (N, d) array of coordinates
+        radius: The maximum distance between connected points
+
+    Returns:
+        Two integer arrays (i, j) with i < j, sorted by i then j
+'''
+####################################################################################
+def fixed_radius_pairs(points, radius):
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2 or radius < 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = cKDTree(points).query_pairs(radius * (1 + RADIUS_PAD), output_type='ndarray')
+    i = np.minimum(pairs[:, 0], pairs[:, 1]).astype(np.int64)
+    j = np.maximum(pairs[:, 0], pairs[:, 1]).astype(np.int64)
+    keep = exact_distances(points, i, j) <= radius
+    return _sorted_pairs(i[keep], j[keep], len(points))
+####################################################################################
+
+
+
+####################################################################################
+'''
+Finds every directed pair (i, j), i != j, where point j lies within point i's own
+range. Either every pair within the largest range is found in one pass and kept
+in whichever directions the ranges allow, or, when ranges vary so much that this
+would examine too many pairs, sources are grouped by range (binned when there
+are many distinct ranges) and each group is matched against a KD-tree of all
+points with the group's largest range. Candidates are checked exactly like
+fixed_radius_pairs.
+    Args:
+        points: An (N, d) array of coordinates
+        ranges: An array of N ranges, one per source point
+
+    Returns:
+        Two integer arrays (i, j), sorted by i then j
+'''
+####################################################################################
+def variable_radius_pairs(points, ranges):
+    points = np.asarray(points, dtype=float)
+    ranges = np.asarray(ranges, dtype=float)
+    sources = np.flatnonzero(ranges >= 0)
+    if len(points) < 2 or len(sources) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    sources = sources[np.argsort(ranges[sources], kind='mergesort')]
+    values = np.unique(ranges[sources])
+    if len(values) <= MAX_RANGE_GROUPS:
+        groups = np.split(sources, np.searchsorted(ranges[sources], values[1:]))
+    else:
+        groups = np.array_split(sources, MAX_RANGE_GROUPS)
+
+    # Rough number of candidates each way examines: one pass at the largest
+    # range finds each pair once, the groups find only their own candidates
+    # but through a slower query
+    dimension = points.shape[1]
+    largest = values[-1]
+    one_pass_cost = len(points) * largest ** dimension / 2.0
+    grouped_cost = 2.0 * sum(len(group) * ranges[group].max() ** dimension for group in groups)
+
+    all_i = []
+    all_j = []
+    if one_pass_cost <= grouped_cost:
+        pairs = cKDTree(points).query_pairs(largest * (1 + RADIUS_PAD), output_type='ndarray')
+        a = pairs[:, 0].astype(np.int64)
+        b = pairs[:, 1].astype(np.int64)
+        distances = exact_distances(points, a, b)
+        forward = distances <= ranges[a]
+        backward = distances <= ranges[b]
+        all_i += [a[forward], b[backward]]
+        all_j += [b[forward], a[backward]]
+    else:
+        tree = cKDTree(points)
+        for group in groups:
+            radius = ranges[group].max() * (1 + RADIUS_PAD)
+            matches = cKDTree(points[group]).sparse_distance_matrix(tree, radius, output_type='ndarray')
+            i = group[matches['i']]
+            j = matches['j'].astype(np.int64)
+            distinct = i != j
+            i = i[distinct]
+            j = j[distinct]
+            keep = exact_distances(points, i, j) <= ranges[i]
+            all_i.append(i[keep])
+            all_j.append(j[keep])
+    return _sorted_pairs(np.concatenate(all_i), np.concatenate(all_j), len(points))
+####################################################################################
+
+
+
+####################################################################################
+'''
+Finds every pair of points within a largest distance once, with the distances
+ordered so that the pairs within any smaller distance are a prefix of them (see
+pairs_within). A sweep over ranges then needs a single KD-tree query.
+    Args:
+        points: An (N, d) array of coordinates
+        radius: The largest distance between connected points
+
+    Returns:
+        A tuple (i, j, distances) of arrays with i < j, sorted by distance
+'''
+####################################################################################
+def sorted_pair_distances(points, radius):
+    points = np.asarray(points, dtype=float)
+    i, j = fixed_radius_pairs(points, radius)
+    distances = exact_distances(points, i, j)
+    order = np.argsort(distances, kind='mergesort')
+    return i[order], j[order], distances[order]
+####################################################################################
+
+
+
+####################################################################################
+'''
+The pairs of sorted_pair_distances within a distance no larger than the one they
+were found for; exactly the pairs fixed_radius_pairs would find for it.
+    Args:
+        pair_distances: The (i, j, distances) of sorted_pair_distances
+        radius: The maximum distance between connected points
+
+    Returns:
+        Two integer arrays (i, j) with i < j, sorted by i then j
+'''
+####################################################################################
+def pairs_within(pair_distances, radius):
+    i, j, distances = pair_distances
+    end = np.searchsorted(distances, radius, side='right')
+    order = np.lexsort((j[:end], i[:end]))
+    return i[:end][order], j[:end][order]
+####################################################################################
+
+
+
+####################################################################################
+'''
+Euclidean distances between pairs of points, summing the squared coordinate
+differences left to right before the square root, as the original loops did.
+    Args:
+        points: An (N, d) array of coordinates
+        i: An integer array of first points
+        j: An integer array of second points
+
+    Returns:
+        An array of distances
+'''
+####################################################################################
+def exact_distances(points, i, j):
+    squared = np.zeros(len(i))
+    for axis in range(points.shape[1]):
+        squared += (points[i, axis] - points[j, axis]) ** 2
+    return np.sqrt(squared)
+####################################################################################
+
+
+
+def _sorted_pairs(i, j, num_points):
+    # Sorting one combined key is much faster than np.lexsort on large inputs
+    keys = i * num_points + j
+    keys.sort()
+    i = keys // num_points
+    return i, keys - i * num_points
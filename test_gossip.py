@@ -0,0 +1,50 @@
+import networkx as nx
+
+import pytest
+
+import simhelper as helper
+import adv_gossip_config as config
+
+
+'''
+The popular and unpopular nodes as they were picked before popularity_ranks, with
+repeated min() and max() calls over the centrality dictionary.
+'''
+def repeated_selection(dict_cent):
+    num_nodes = len(dict_cent)
+    ten_per_nodes = int(num_nodes * .1)
+    pop_nodes = dict()
+    unpop_nodes = dict()
+    for i in range(ten_per_nodes):
+        found_node = min(dict_cent, key=dict_cent.get)
+        pop_nodes[found_node] = dict_cent[found_node]
+        del dict_cent[found_node]
+    dict_cent.update(pop_nodes)
+    for i in range(ten_per_nodes):
+        found_node = max(dict_cent, key=dict_cent.get)
+        unpop_nodes[found_node] = dict_cent[found_node]
+        del dict_cent[found_node]
+    return pop_nodes, unpop_nodes
+
+'''
+Test that popularity_ranks picks the same nodes as the repeated selection, ties
+included.
+'''
+def test_popularity_ranks_match_repeated_selection():
+    graphs = [nx.path_graph(30), nx.complete_graph(20), nx.star_graph(25),
+              nx.relabel_nodes(nx.gnm_random_graph(200, 400, seed=3), lambda v: 'n' + str(v)),
+              nx.barabasi_albert_graph(150, 2, seed=7)]
+    for g in graphs:
+        assert config.popularity_ranks(g) == repeated_selection(nx.degree_centrality(g))
+
+'''
+Test that the ranks are kept on the graph and found again after a node removal.
+'''
+def test_popularity_ranks_follow_node_removal():
+    g = nx.star_graph(29)
+    pop_nodes, unpop_nodes = config.popularity_ranks(g)
+    assert 0 in unpop_nodes
+    assert config.popularity_ranks(g) == (pop_nodes, unpop_nodes)
+    helper.modify_graph_nodes(g, [], [0])
+    assert config.popularity_ranks(g) == repeated_selection(nx.degree_centrality(g))
+    assert 0 not in config.popularity_ranks(g)[1]
@@ -0,0 +1,137 @@
+import networkx as nx
+
+import pytest
+
+import graph_metrics as metrics
+
+
+@pytest.fixture(scope='function')
+def setup_random_graph():
+    return nx.gnm_random_graph(60, 150, seed=7)
+
+@pytest.fixture(scope='function')
+def setup_random_digraph():
+    return nx.gnm_random_graph(60, 200, seed=7, directed=True)
+
+
+# With a budget that samples every node, the pivot estimate is exact
+def test_approx_betweenness_exact_when_every_node_is_a_pivot():
+    for g in [setup_random_graph(), setup_random_digraph()]:
+        approx, error_bound = metrics.approx_betweenness_centrality(g, epsilon=0.01, delta=0.1)
+        exact = nx.betweenness_centrality(g)
+        assert error_bound == 0.0
+        for node in g:
+            assert abs(approx[node] - exact[node]) < 1e-9
+
+def test_approx_closeness_exact_when_every_node_is_a_pivot():
+    for g in [setup_random_graph(), setup_random_digraph()]:
+        approx, error_bound = metrics.approx_closeness_centrality(g, epsilon=0.01, delta=0.1)
+        exact = nx.closeness_centrality(g)
+        assert error_bound == 0.0
+        for node in g:
+            assert abs(approx[node] - exact[node]) < 1e-9
+
+def test_approx_betweenness_within_bound():
+    g = nx.gnm_random_graph(400, 1200, seed=3)
+    approx, error_bound = metrics.approx_betweenness_centrality(g, epsilon=0.15, delta=0.1, seed=5)
+    assert error_bound > 0.0
+    exact = nx.betweenness_centrality(g)
+    for node in g:
+        assert abs(approx[node] - exact[node]) <= error_bound
+
+def test_approx_betweenness_samples_paths_within_bound():
+    g = nx.gnm_random_graph(300, 1500, seed=4, directed=True)
+    # Even the weak component size as vertex diameter bound leaves fewer draws
+    # than nodes, so paths are sampled rather than computed exactly
+    assert metrics.path_sample_size(len(g), 0.15, 0.1) < len(g)
+    approx, error_bound = metrics.approx_betweenness_centrality(g, epsilon=0.15, delta=0.1, seed=5)
+    assert error_bound > 0.0
+    exact = nx.betweenness_centrality(g)
+    for node in g:
+        assert abs(approx[node] - exact[node]) <= error_bound
+
+def test_approx_clustering_within_bound():
+    g = setup_random_graph()
+    approx, error_bound = metrics.approx_average_clustering(g, epsilon=0.02, delta=0.01, seed=5)
+    assert abs(approx - nx.average_clustering(g)) <= error_bound
+
+def test_approx_clustering_complete_and_star():
+    approx, error_bound = metrics.approx_average_clustering(nx.complete_graph(10), seed=1)
+    assert approx == 1.0
+    approx, error_bound = metrics.approx_average_clustering(nx.star_graph(10), seed=1)
+    assert approx == 0.0
+
+def test_find_graph_betweenness_approx_reports_bound():
+    g = setup_random_graph()
+    metrics.find_graph_betweenness_approx(g)
+    result = metrics.dictionary_to_write_out["Betweenness (approx): "]
+    assert result['error_bound'] == 0.0
+    assert result['confidence'] == 0.9
+    assert len(result['value']) == 60
+
+
+def test_full_run_through_matches_networkx():
+    g = setup_random_graph()
+    g.add_edge(100, 101)
+    for processes in [1, 2]:
+        metrics.dictionary_to_write_out.clear()
+        results = metrics.full_run_through(g, processes=processes, use_cache=False)
+        betweenness = nx.betweenness_centrality(g)
+        closeness = nx.closeness_centrality(g)
+        for node in g:
+            assert abs(results["Betweenness: "][node] - betweenness[node]) < 1e-9
+            assert abs(results["Closeness Centrality:"][node] - closeness[node]) < 1e-9
+        assert abs(results["Clustering of Graph:"] - nx.average_clustering(g)) < 1e-9
+        assert results["Density: "] == nx.density(g)
+        assert results["Degree Frequency: "] == nx.degree_histogram(g)
+        assert results["Graph Centrality:"] == nx.degree_centrality(g)
+        assert results["Number of graphs:"] == nx.number_connected_components(g)
+        assert results["Disjoint: "] and not results["Node Connectivity: "]
+        assert results["Number of edges:"] == g.number_of_edges()
+
+
+def test_full_run_through_reads_back_cached_metrics(tmpdir, monkeypatch):
+    g = nx.relabel_nodes(setup_random_graph(), lambda v: 'n' + str(v))
+    cache_dir = str(tmpdir)
+    metrics.dictionary_to_write_out.clear()
+    first = dict(metrics.full_run_through(g, processes=1, cache_dir=cache_dir))
+
+    def fail(*args):
+        raise AssertionError('heavy metrics recomputed')
+    monkeypatch.setattr(metrics, 'run_heavy_metrics', fail)
+    # Same topology in a different order, with new weights: all cached
+    h = nx.Graph()
+    h.add_edges_from(reversed(g.edges()), weight=4)
+    h.add_nodes_from(g)
+    metrics.dictionary_to_write_out.clear()
+    assert metrics.full_run_through(h, processes=1, cache_dir=cache_dir) == first
+
+    h.add_edge('n0', 'n1')
+    with pytest.raises(AssertionError):
+        metrics.full_run_through(h, processes=1, cache_dir=cache_dir)
+
+def test_metrics_cache_keeps_tuple_nodes(tmpdir):
+    g = nx.grid_2d_graph(3, 4)
+    cache_dir = str(tmpdir)
+    metrics.dictionary_to_write_out.clear()
+    first = dict(metrics.full_run_through(g, processes=1, cache_dir=cache_dir))
+    metrics.dictionary_to_write_out.clear()
+    assert dict(metrics.full_run_through(g, processes=1, cache_dir=cache_dir)) == first
+    # Only the cache file itself is left behind
+    assert [f.basename for f in tmpdir.listdir()] == [metrics.graph_fingerprint(g) + '.json']
+
+def test_graph_fingerprint():
+    g = setup_random_graph()
+    assert metrics.graph_fingerprint(g) == metrics.graph_fingerprint(nx.Graph(g.edges()[::-1]))
+    assert metrics.graph_fingerprint(g) != metrics.graph_fingerprint(g.to_directed())
+    h = g.copy()
+    nx.set_edge_attributes(h, 'weight', 2)
+    assert metrics.graph_fingerprint(g) == metrics.graph_fingerprint(h)
+    assert metrics.graph_fingerprint(g, True) != metrics.graph_fingerprint(h, True)
+
+def test_find_graph_closeness_approx_names_distance_bound():
+    g = setup_random_graph()
+    metrics.find_graph_closeness_centrality_approx(g, epsilon=0.3, seed=2)
+    result = metrics.dictionary_to_write_out["Closeness Centrality (approx):"]
+    assert 'error_bound' not in result
+    assert result['average_distance_error_bound'] > 0.0
@@ -2,7 +2,10 @@ import networkx as nx
 
 import pytest
 
+import graph_index
 import simhelper as helper
+import graph_binary
+import graph_stats
 
 # Run in command line as 'pytest simtest.py' if you are not familiar with pytest
 # You will need to pip install pytest if you don't have it installed.
@@ -315,4 +318,224 @@ def test_unique_neighbor_list_digraph():
     
 def test_max_betweenness_on_crossgraph():
     g = setup_cross_graph()
-    assert (helper.get_max_betweenness_node(g) == '1')
\ No newline at end of file
+    assert (helper.get_max_betweenness_node(g) == '1')
+
+# The cached neighbor index should agree with networkx for every view
+def test_neighbor_index_views_digraph():
+    g = nx.gnm_random_graph(50, 200, seed=11, directed=True)
+    for node in g:
+        assert sorted(helper.get_unique_neighbors_list(g, node)) == sorted(set(nx.all_neighbors(g, node)))
+        assert sorted(helper.get_out_neighbors_list(g, node)) == sorted(g.successors(node))
+
+def test_neighbor_index_follows_modify_graph():
+    g = setup_cross_graph()
+    assert sorted(helper.get_unique_neighbors_list(g, '1')) == ['2', '3', '4', '5']
+    helper.modify_graph(g, [('2', '3')], [('1', '4')], [], [])
+    assert sorted(helper.get_unique_neighbors_list(g, '1')) == ['2', '3', '5']
+    assert sorted(helper.get_unique_neighbors_list(g, '2')) == ['1', '3']
+    helper.modify_graph(g, [], [], [], ['3'])
+    assert sorted(helper.get_unique_neighbors_list(g, '1')) == ['2', '5']
+    assert helper.get_unique_neighbors_list(g, '2') == ['1']
+
+def test_neighbor_index_follows_invalidated_edits():
+    g = nx.DiGraph([(0, 1), (1, 2)])
+    assert graph_index.neighbor_list(g, 0, 'out') == [1]
+    # Direct edge edits are followed by an explicit invalidation
+    g.remove_edge(0, 1)
+    g.add_edge(0, 2)
+    graph_index.invalidate_neighbor_index(g)
+    assert helper.get_out_neighbors_list(g, 0) == [2]
+    assert sorted(helper.get_in_neighbors_list(g, 2)) == [0, 1]
+    helper.modify_graph(g, [(2, 0)], [], [], [])
+    assert helper.get_unique_neighbors_list(g, 0) == [2]
+    copy = helper.copy_graph(g)
+    assert copy.graph[graph_index.INDEX_KEY] is not g.graph[graph_index.INDEX_KEY]
+    helper.modify_graph(copy, [], [], [], [2])
+    assert helper.get_unique_neighbors_list(g, 0) == [2]
+    assert helper.get_unique_neighbors_list(copy, 0) == []
+
+
+def test_name_lists_are_loaded_once():
+    first = helper.get_list_of_male_names(1000)
+    assert len(first) == 1000
+    assert helper.load_asset('male_names') is helper.load_asset('male_names')
+    assert helper.get_list_of_last_names(3) == ['Smith', 'Johnson', 'Williams']
+
+def test_get_names_seeded():
+    names = helper.get_names(500, seed=4)
+    assert len(names) == 500
+    assert names == helper.get_names(500, seed=4)
+    for name in names:
+        first, last = name.split(' ')
+        assert last in helper.get_list_of_last_names(1000)
+
+def test_get_names_follow_random_seed():
+    import random
+    random.seed(7)
+    names = helper.get_names(50)
+    male_names = helper.get_male_names(50)
+    random.seed(7)
+    assert helper.get_names(50) == names
+    assert helper.get_male_names(50) == male_names
+
+def test_get_names_unique():
+    names = helper.get_male_names(20000, unique=True, seed=1)
+    assert len(set(names)) == 20000
+    names = helper.get_names(50000, unique=True, seed=2)
+    assert len(set(names)) == 50000
+    with pytest.raises(ValueError):
+        helper.get_female_names(1000 * 1000 + 1, unique=True)
+
+
+def test_bulk_randomize_node_attribute_seeded():
+    g = setup_many_node_graph()
+    helper.bulk_randomize_node_attribute(g, 'test', 'uniform', 15203968721, low=0, high=10)
+    values = nx.get_node_attributes(g, 'test')
+    assert min(values.values()) == 0 and max(values.values()) == 10
+    helper.bulk_randomize_node_attribute(g, 'test', 'uniform', 15203968721, low=0, high=10)
+    assert nx.get_node_attributes(g, 'test') == values
+
+def test_bulk_randomize_node_attribute_boolean():
+    g = setup_many_node_graph()
+    helper.bulk_randomize_node_attribute(g, 'test', 'boolean', 3, true_chance=.50)
+    perc_nodes = helper.num_flagged(g, 'test') / float(len(g.node))
+    assert perc_nodes >= .49 and perc_nodes <= .51
+
+def test_bulk_randomize_edge_attribute():
+    g = setup_very_long_chain_graph()
+    rng = helper.make_rng(5)
+    helper.bulk_randomize_edge_attribute(g, 'test', 'choice', rng, values=['a', 'b'], probabilities=[0.25, 0.75])
+    helper.bulk_randomize_edge_attribute(g, 'normal', 'normal', rng, mean=10.0, std=1.0)
+    values = nx.get_edge_attributes(g, 'test').values()
+    assert len(values) == g.number_of_edges()
+    perc_a = values.count('a') / float(len(values))
+    assert perc_a >= .24 and perc_a <= .26
+    normal = nx.get_edge_attributes(g, 'normal').values()
+    assert abs(sum(normal) / len(normal) - 10.0) < .05
+
+
+def check_stats_match(g):
+    assert graph_stats.number_of_edges(g) == g.number_of_edges()
+    assert graph_stats.density(g) == nx.density(g)
+    assert graph_stats.degree_histogram(g) == nx.degree_histogram(g)
+    weights = nx.get_edge_attributes(g, 'weight').values()
+    assert graph_stats.max_weight(g) == max(weights)
+    assert graph_stats.min_weight(g) == min(weights)
+    assert graph_stats.is_connected(g) == nx.is_connected(g)
+
+def test_graph_stats_follow_modify_graph():
+    g = nx.path_graph(6)
+    helper.create_edge_attribute(g, 'weight', 3)
+    helper.create_single_edge_attribute(g, 0, 1, 'weight', 9)
+    check_stats_match(g)
+    helper.modify_graph(g, [(5, 0), (2, 7)], [(2, 3)], [8], [])
+    helper.create_edge_list_attribute(g, [(5, 0), (2, 7)], 'weight', 1)
+    check_stats_match(g)
+    helper.modify_graph(g, [], [], [], [0, 8])
+    check_stats_match(g)
+    helper.create_single_edge_attribute(g, 2, 7, 'weight', 5)
+    check_stats_match(g)
+    assert helper.max_weight(g) == 5
+    assert not helper.exceeded_density_limit(g, nx.density(g))
+
+def test_graph_stats_follow_config_weight_writes():
+    import simconfig
+    g = nx.path_graph(4)
+    helper.create_edge_attribute(g, 'weight', 5)
+    helper.create_single_edge_attribute(g, 0, 1, 'weight', 50)
+    assert helper.max_weight(g) == 50
+    # init writes 1 over every weight and then restores them
+    simconfig.init(g, 0, 'run_name')
+    check_stats_match(g)
+    # Direct writes are followed by an explicit invalidation
+    g.edge[0][1]['weight'] = 1
+    graph_stats.invalidate_graph_stats(g)
+    check_stats_match(g)
+
+
+def test_read_graph_binary_csr(tmpdir):
+    path = str(tmpdir.join('g.csr'))
+    for g in [nx.read_graphml('custom_graphs/xsmall_zombie_adv.graphml'),
+              nx.gnm_random_graph(40, 120, seed=2, directed=True)]:
+        g.add_node('lonely', label=u'caf\xe9')
+        graph_binary.write_graph_csr(path, g)
+        h = helper.read_graph(path)
+        assert h.is_directed() == g.is_directed()
+        assert dict(h.nodes(data=True)) == dict(g.nodes(data=True))
+        assert set(h.edges()) == set(g.edges()) or not g.is_directed()
+        for u, v, data in g.edges_iter(data=True):
+            assert h.edge[u][v] == data
+        # The attached index views the file and matches a freshly built one
+        for node in g:
+            assert sorted(graph_index.neighbor_list(h, node, 'all')) == sorted(set(nx.all_neighbors(g, node)))
+            assert sorted(graph_index.neighbor_list(h, node, 'out')) == sorted(g.neighbors(node))
+
+def test_edge_list_to_csr(tmpdir):
+    edges = tmpdir.join('edges.txt')
+    edges.write('# comment\n1 2 0.5\n2 1 0.7\n3 3 1\n\n \t\n4 1 2\n1 2 0.9\n')
+    path = str(tmpdir.join('g.csr'))
+    for directed in [False, True]:
+        for nodetype in [int, str]:
+            graph_binary.edge_list_to_csr(str(edges), path, directed, nodetype=nodetype,
+                                          attr_names=['weight'])
+            h = helper.read_graph(path)
+            ref = nx.read_edgelist(str(edges), nodetype=nodetype, data=[('weight', float)],
+                                   create_using=nx.DiGraph() if directed else nx.Graph())
+            assert h.is_directed() == directed
+            assert sorted(h.nodes()) == sorted(ref.nodes())
+            # The last line for an edge wins, as with read_edgelist
+            assert sorted(h.edges(data=True)) == sorted(ref.edges(data=True))
+
+def test_edge_list_to_csr_strips_inline_comments(tmpdir):
+    edges = tmpdir.join('edges.txt')
+    edges.write('1 2 0.5\n   # indented comment\n2 3 0.7 # trailing comment\n3 4 1#no space\n')
+    path = str(tmpdir.join('g.csr'))
+    for nodetype in [int, str]:
+        graph_binary.edge_list_to_csr(str(edges), path, False, nodetype=nodetype, attr_names=['weight'])
+        h = helper.read_graph(path)
+        ref = nx.read_edgelist(str(edges), nodetype=nodetype, data=[('weight', float)])
+        assert sorted(h.edges(data=True)) == sorted(ref.edges(data=True))
+
+def test_edge_list_to_csr_keeps_large_ids(tmpdir):
+    # Ids past 2**53 stay distinct even when the weights are floats
+    big = 2 ** 62
+    edges = tmpdir.join('edges.txt')
+    edges.write('%d %d 0.5\n%d %d 1.5\n' % (big, big + 1, big + 1, big + 2))
+    path = str(tmpdir.join('g.csr'))
+    graph_binary.edge_list_to_csr(str(edges), path, False, nodetype=int, attr_names=['weight'])
+    h = helper.read_graph(path)
+    assert sorted(h.nodes()) == [big, big + 1, big + 2]
+    assert h.edge[big + 1][big + 2]['weight'] == 1.5
+
+def test_read_graph_streams_graphml(tmpdir):
+    path = str(tmpdir.join('g.csr'))
+    for name in ['custom_graphs/xsmall_zombie_adv.graphml', 'simplemodel.graphml', 'test.graphml']:
+        g = nx.read_graphml(name)
+        h = helper.read_graph(name)
+        assert type(h) is type(g)
+        assert h.graph == g.graph
+        assert dict(h.nodes(data=True)) == dict(g.nodes(data=True))
+        assert h.number_of_edges() == g.number_of_edges()
+        for u, v, data in g.edges_iter(data=True):
+            assert h.edge[u][v] == data
+        # The typed arrays convert to the same binary graph
+        graph_binary.graphml_to_csr(name, path)
+        c = helper.read_graph(path)
+        assert dict(c.nodes(data=True)) == dict(g.nodes(data=True))
+        for u, v, data in g.edges_iter(data=True):
+            assert c.edge[u][v] == data
+
+def test_graphml_arrays_name_unsupported_features(tmpdir):
+    import graphml_stream
+    name = tmpdir.join('ports.graphml')
+    name.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+               '<graph id="G" edgedefault="undirected">\n'
+               '<node id="a"><port name="p"/></node><node id="b"/>\n'
+               '<edge source="a" target="b"/>\n'
+               '</graph></graphml>\n')
+    with pytest.raises(NotImplementedError) as error:
+        graph_binary.graphml_to_csr(str(name), str(tmpdir.join('g.csr')))
+    assert 'ports' in str(error.value)
+    # The networkx fallback still reads the file
+    assert graphml_stream.read_graphml(str(name)).edges() == [('a', 'b')]
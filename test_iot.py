@@ -1,9 +1,13 @@
 import networkx as nx
+import random
 
 import pytest
 
+import critical_nodes
 import iot_spy as config
+import simengine as engine
 import simhelper as helper
+import spatial_index
 
 
 '''
@@ -45,15 +49,9 @@ def test_cross_graph():
     for node in g:
         g.node[node]['online'] = True # Each node should be online at first
         g.node[node]['broadcast_delay'] = 0
-        for hasnode in g:
-            g.node[node]['has_' + hasnode] = False # Every node should not have each other's information
     
     ug = helper.to_directed(g)
-    
-    
-    for u in ug.edge:
-        for v in ug.edge[u]:
-            ug.edge[u][v]['broadcast_information'] = None
+    config.reset_information(ug) # Every node should not have each other's information
     
     return ug
 
@@ -103,25 +101,126 @@ def test_graph_finished():
     g = test_cross_graph()
     for node in g.node:
         for node2 in g.node:
-            g.node[node]['has_' + node2] = True
+            config.give_information(g, node, node2)
             
     assert config.finished_hook(g, 0, 'run_name') == 1
     
     
+'''
+Test that information bitsets only count the information of nodes still in the
+graph, both for finishing and for the information spread.
+'''
+def test_information_bitsets_ignore_removed_nodes():
+    g = test_cross_graph()
+    config.init(g, 'run_name')
+    assert config.finished_hook(g, 0, 'run_name') == 0
+    for node in ['1', '2', '3', '4']:
+        for node2 in ['1', '2', '3', '4']:
+            config.give_information(g, node, node2)
+    assert not config.give_information(g, '1', '2')
+    assert config.popcount(g.node['1']['has']) == 4
+    helper.modify_graph_nodes(g, [], ['5'])
+    assert config.finished_hook(g, 0, 'run_name') == 1
+    set_config_variable_dicts(g)
+    config.on_finished_simulation(1, [g], 'run_name')
+    assert config.graph_information_spread.pop() == 1.0
+    del config.nodes_to_remove[:]
+    
+    
+'''
+Test that the tracked 'lacks' bitsets match ones computed from scratch as nodes
+receive information, and after a node is removed.
+'''
+def test_lacks_follow_received_information():
+    g = setup_test_graph()
+    config.init(g, 'run_name')
+    rng = random.Random(4)
+    for step in range(40):
+        if step == 20:
+            helper.modify_graph_nodes(g, [], ['4'])
+        config.update_lacks(g)
+        for node in g:
+            expected = 0
+            for neighbor in g.successors(node):
+                expected |= ~g.node[neighbor]['has']
+            everyone = config.everyone_mask(g)
+            assert config.node_lacks(g, node) & everyone == expected & everyone
+        nodes = list(g)
+        config.give_information(g, rng.choice(nodes), rng.choice(nodes))
+    
+    
+'''
+Test that after a removal only the component that held the removed node is
+simulated again, and that the combined result matches simulating the whole
+graph from scratch.
+'''
+def test_warm_start_after_removal():
+    g = test_cross_graph()
+    g.add_edge('6', '7')
+    g.add_edge('7', '6')
+    for node in ['6', '7']:
+        g.node[node]['online'] = True
+        g.node[node]['broadcast_delay'] = 0
+    config.reset_information(g)
+    max_rounds_no_update = config.max_rounds_no_update
+    config.max_rounds_no_update = 20
+    try:
+        set_config_variable_dicts(g)
+        config.init(g, 'run_name')
+        engine.simulate(g, 1, 'run_name')
+        assert config.graph_information_spread.pop() == 29 / 49.0
+        del config.nodes_to_remove[:]
+
+        affected = config.removal_affected_nodes(g, ['1'])
+        assert affected == set(['1', '2', '3', '4', '5'])
+        helper.modify_graph_nodes(g, [], ['1'])
+        config.warm_simulate(g, config.finished_graphs, affected, 'run_name')
+        finished = config.finished_graphs[0]
+        assert config.has_information(finished, '6', '7')
+        for node in ['2', '3', '4', '5']:
+            assert config.popcount(finished.node[node]['has']) == 1
+        assert config.graph_information_spread.pop() == 8 / 36.0
+        del config.nodes_to_remove[:]
+    finally:
+        config.max_rounds_no_update = max_rounds_no_update
+        config.current_graph_information_spread = 1.0
+    
+'''
+Test that the critical node search removes the center of the cross graph, the one
+node that separates it, and that the reachability spread it measures with matches
+the spread a simulation of the graph ends with.
+'''
+def test_critical_nodes_cross_graph():
+    g = test_cross_graph()
+    g.add_edge('6', '7')
+    g.add_edge('7', '6')
+    for node in ['6', '7']:
+        g.node[node]['online'] = True
+        g.node[node]['broadcast_delay'] = 0
+    config.reset_information(g)
+    assert critical_nodes.reachability_spread(g) == 29 / 49.0
+    assert critical_nodes.reachability_spread(g, ['1']) == 8 / 36.0
+    assert critical_nodes.simulated_spread(g, ['6']) == 26 / 36.0
+
+    for processes in [1, 2]:
+        removed, spreads, measured = critical_nodes.find_critical_nodes(g, 0.5, processes=processes, seed=1)
+        assert removed == ['1']
+        assert spreads == [8 / 36.0]
+    
 '''
 Tests whether or not a graph will appropriately set broadcast_information
 on all relevant nodes using the cross graph.
 '''
 def test_cross_graph_center_edge_spread():
     g = test_cross_graph()
-    g.node['1']['has_1'] = True
+    config.give_information(g, '1', '1')
     
     config.before_round_start(g, [], [], [], [], 0, 'run_name')
     
     assert(len(g.edge['1']) == 4)
     
     for edge_to in g.edge['1']:
-        assert(g.edge['1'][edge_to]['broadcast_information'] == '1')
+        assert(config.broadcast_information(g, '1', edge_to) == '1')
 
         
 '''
@@ -132,11 +231,11 @@ node does not recieve the broadcast.
 def test_cross_graph_center_edge_receives_four_transmissions():
     g = test_cross_graph()
     set_config_variable_dicts(g)
-    # 'has_1' is odd in this context, but whatever
-    g.node['2']['has_1'] = True
-    g.node['3']['has_1'] = True
-    g.node['4']['has_1'] = True
-    g.node['5']['has_1'] = True
+    # Node 1's information everywhere but at node 1 is odd in this context, but whatever
+    config.give_information(g, '2', '1')
+    config.give_information(g, '3', '1')
+    config.give_information(g, '4', '1')
+    config.give_information(g, '5', '1')
     
     config.before_round_start(g, [], [], [], [], 0, 'run_name')
 
@@ -148,7 +247,7 @@ def test_cross_graph_center_edge_receives_four_transmissions():
     assert(len(g.edge['1']) == 4)
     
     # Test that the information DID NOT get spread to the center node
-    assert not g.node['1']['has_1']
+    assert not config.has_information(g, '1', '1')
     
     # Test that there is a broadcast_delay on each node that is not 0
     assert g.node['2']['broadcast_delay'] > 0
@@ -178,7 +277,7 @@ def test_cross_graph_center_edge_spread():
     g = test_cross_graph()
     set_config_variable_dicts(g)
     
-    g.node['1']['has_1'] = True
+    config.give_information(g, '1', '1')
     
     config.before_round_start(g, [], [], [], [], 0, 'run_name')
     
@@ -187,7 +286,7 @@ def test_cross_graph_center_edge_spread():
     config.after_round_end(g, [], [], [], [], 0, 'run_name')
     
     for edge_to in g.edge['1']:
-        assert(g.edge['1'][edge_to]['broadcast_information'] is None)
+        assert(config.broadcast_information(g, '1', edge_to) is None)
         
  
 '''
@@ -198,7 +297,7 @@ def test_cross_graph_center_information_spread():
     g = test_cross_graph()
     set_config_variable_dicts(g)
     
-    g.node['1']['has_1'] = True
+    config.give_information(g, '1', '1')
     
     config.before_round_start(g, [], [], [], [], 0, 'run_name')
     
@@ -208,11 +307,76 @@ def test_cross_graph_center_information_spread():
         config.on_node(g, gc, node, 0, 'run_name')
         
     for node in g:
-        assert(g.node[node]['has_1'])
+        assert(config.has_information(g, node, '1'))
     
     
 
-    
+
+'''
+Tests that resolving a round's receptions all at once gives the same result as
+the per-node path on the cross graph: the four leaves collide at the center and
+back off, and the center's broadcast reaches every leaf.
+'''
+def test_cross_graph_receptions_resolved_at_once():
+    g = test_cross_graph()
+    set_config_variable_dicts(g)
+    for node in ['2', '3', '4', '5']:
+        config.give_information(g, node, node)
+
+    config.before_round_start(g, [], [], [], [], 1, 'run_name')
+    gc = helper.copy_graph(g)
+    config.special_node_handle(g, gc, 1, 'run_name')
+    for node in g:
+        config.on_node(g, gc, node, 1, 'run_name') # Already resolved, so skipped
+
+    assert config.current_broadcasts_received_overall['1'] == 4
+    assert config.current_broadcasts_received_successfully['1'] == 0
+    for node in ['2', '3', '4', '5']:
+        assert not config.has_information(g, '1', node)
+        assert config.current_interference_failures[node] == 1
+        assert 1 <= g.node[node]['broadcast_delay'] <= len(g.edge['1']) + config.rand_extra
+
+    config.after_round_end(g, [], [], [], [], 1, 'run_name')
+    for node in ['2', '3', '4', '5']:
+        assert config.broadcast_information(g, node, '1') is None
+
+    config.give_information(g, '1', '1')
+    config.before_round_start(g, [], [], [], [], 2, 'run_name')
+    config.special_node_handle(g, helper.copy_graph(g), 2, 'run_name')
+    for node in g:
+        assert config.has_information(g, node, '1')
+    assert config.last_update_round == 2
+    config.last_update_round = 0
+
+'''
+Test that resolving a round's receptions at once and node by node give the same
+receptions and, from the same random.seed, the same back-off delays.
+'''
+def test_receptions_match_per_node_path():
+    results = []
+    for at_once in [True, False]:
+        g = helper.to_directed(nx.relabel_nodes(nx.gnm_random_graph(40, 120, seed=2), lambda v: str(v)))
+        for node in g:
+            g.node[node]['online'] = node != '7'
+            g.node[node]['broadcast_delay'] = 0
+        config.reset_information(g)
+        set_config_variable_dicts(g)
+        for node in ['1', '4', '9', '16', '25', '36']:
+            config.give_information(g, node, node)
+        config.before_round_start(g, [], [], [], [], 1, 'run_name')
+        gc = helper.copy_graph(g)
+        random.seed(5)
+        if at_once:
+            config.special_node_handle(g, gc, 1, 'run_name')
+        for node in nx.nodes(g):
+            config.on_node(g, gc, node, 1, 'run_name')
+        results.append((dict((node, g.node[node]['broadcast_delay']) for node in g),
+                        dict((node, g.node[node]['has']) for node in g),
+                        dict(config.current_interference_failures)))
+        config.after_round_end(g, [], [], [], [], 1, 'run_name')
+    assert any(results[0][0].values())
+    assert results[0] == results[1]
+
 '''
 These CSV Graph tests will test that our CSV graph readin works with a given 
 input, given that the test.csv is (with commas, of course):
@@ -264,4 +428,176 @@ def test_csv_graph_distance_100():
     for node in all_nodes_list:
         for n in all_nodes_list:
             if not node == n:
-                assert(n in g.edge[node])
\ No newline at end of file
+                assert(n in g.edge[node])
+
+
+def brute_force_pairs(points, ranges):
+    import math
+    pairs = set()
+    for i, p in enumerate(points):
+        for j, q in enumerate(points):
+            if i != j and math.sqrt(sum((a - b)**2 for a, b in zip(p, q))) <= ranges[i]:
+                pairs.add((i, j))
+    return pairs
+
+def test_spatial_index_fixed_radius_matches_nested_loop():
+    rng = random.Random(3)
+    points = [(rng.uniform(0, 50), rng.uniform(0, 50), rng.choice([0, 5])) for i in range(200)]
+    points += [points[0], (3.0, 4.0, 0.0), (0.0, 0.0, 0.0)] # Duplicates and a pair exactly 5 apart
+    firsts, seconds = spatial_index.fixed_radius_pairs(points, 5)
+    expected = set((i, j) for i, j in brute_force_pairs(points, [5] * len(points)) if i < j)
+    assert set(zip(firsts.tolist(), seconds.tolist())) == expected
+
+def test_radius_sweep_shares_sorted_pairs():
+    rng = random.Random(5)
+    points = [(rng.uniform(0, 50), rng.uniform(0, 50), rng.choice([0, 5])) for i in range(200)]
+    pair_distances = spatial_index.sorted_pair_distances(points, 12)
+    for radius in [0, 3, 5, 7.5, 12]:
+        firsts, seconds = spatial_index.pairs_within(pair_distances, radius)
+        expected = spatial_index.fixed_radius_pairs(points, radius)
+        assert firsts.tolist() == expected[0].tolist()
+        assert seconds.tolist() == expected[1].tolist()
+
+    graphs = config.iot_graphs_xyz('iot/test_xyz.csv', [10, 100])
+    for radius in [10, 100]:
+        g = setup_test_graph_from_test_xyz_csv(radius)
+        assert sorted(graphs[radius].edges()) == sorted(g.edges())
+
+    max_rounds_no_update = config.max_rounds_no_update
+    config.max_rounds_no_update = 20
+    try:
+        results = config.radius_sweep('iot/test_xyz.csv', 10, processes=1)
+    finally:
+        config.max_rounds_no_update = max_rounds_no_update
+    assert sorted(results) == [5, 10]
+    assert results[5] == (2, 12 / 100.0)
+    assert results[10] == (16, 82 / 100.0)
+
+def test_spatial_index_variable_radius_matches_nested_loop():
+    rng = random.Random(4)
+    points = [(rng.uniform(0, 50), rng.uniform(0, 50)) for i in range(200)]
+    # Similar ranges take the single pass, one huge range the grouped queries
+    for ranges in [[rng.choice([3, 4, 5]) for p in points],
+                   [rng.uniform(0, 4) for p in points[1:]] + [100]]:
+        sources, targets = spatial_index.variable_radius_pairs(points, ranges)
+        assert set(zip(sources.tolist(), targets.tolist())) == brute_force_pairs(points, ranges)
+
+def test_streamed_geometric_graph_matches_iot_spy(tmpdir):
+    import make_graph
+    path = str(tmpdir.join('devices.graphml'))
+    for ranges, dimensions in [(12.0, 3), (make_graph.IOT_RANGES, 2)]:
+        make_graph.stream_geometric_graphml(path, 300, ranges, 8, [], [], dimensions=dimensions,
+                                            side=150.0, processes=1, chunk_size=100)
+        g = nx.read_graphml(path)
+        points = dict((node, tuple(data[axis] for axis in 'xyz' if axis in data)) for node, data in g.nodes(data=True))
+        nodes = list(g)
+        ranges_of = [ranges if dimensions == 3 else g.node[node]['range'] for node in nodes]
+        expected = set((nodes[i], nodes[j]) for i, j in brute_force_pairs([points[node] for node in nodes], ranges_of))
+        assert g.is_directed() == (dimensions == 2)
+        if g.is_directed():
+            assert set(g.edges()) == expected
+        else:
+            assert set(map(frozenset, g.edges())) == set(map(frozenset, expected))
+
+def test_device_store_round_trip(tmpdir):
+    import device_store
+    store = device_store.read_device_csv('iot/test.csv', ['x', 'y', 'range'])
+    assert store['names'] == ['1', '2', '3', '4', '5', '6', '7']
+    assert store['range'].tolist() == [3, 5, 1, 10, 4.99, 3.01, 1]
+    path = str(tmpdir.join('devices.csr'))
+    device_store.write_device_store(path, store)
+    loaded = device_store.load_device_store(path)
+    assert loaded['names'] == store['names']
+    for field in ['x', 'y', 'range']:
+        assert loaded[field].tolist() == store[field].tolist()
+    g = setup_test_graph()
+    stored = config.iot_graph(path)
+    assert list(stored.node) == list(g.node)
+    assert sorted(stored.edges()) == sorted(g.edges())
+    with pytest.raises(ValueError):
+        device_store.open_devices(path, ['x', 'y', 'z'])
+
+def test_device_readers_share_one_parser(tmpdir):
+    import device_store
+    import ingest
+    path = tmpdir.join('devices.csv')
+    path.write('# devices\nb,0,0,2\na,1,0,2\n\nb,5,0,2\nc,6,0,1\n')
+    store = device_store.read_device_csv(str(path), ['x', 'y', 'range'])
+    arrays = ingest.ingest_devices(str(path), ['x', 'y', 'range'])
+    assert store['names'] == arrays['nodes'] == ['b', 'a', 'c']
+    for field in ['x', 'y', 'range']:
+        assert store[field].tolist() == arrays['node_columns'][field].tolist()
+    assert store['x'].tolist() == [5, 1, 6]
+
+def test_mobile_devices_follow_trajectory(tmpdir):
+    import mobility
+    path = tmpdir.join('trajectory.csv')
+    path.write('1,7,0,1\n1,3,3,1\n2,7,8,14\n')
+    trajectory_file = config.mobility_trajectory
+    config.mobility_trajectory = str(path)
+    try:
+        g = setup_test_graph()
+        config.track_mobility(g, 'iot/test.csv')
+    finally:
+        config.mobility_trajectory = trajectory_file
+    state = g.graph[mobility.MOBILITY_KEY]
+    original = set(g.edges())
+    for round_num, moved in [(1, True), (2, True), (3, False)]:
+        add_edge_list = []
+        remove_edge_list = []
+        mobility.move_step(g, round_num, add_edge_list, remove_edge_list)
+        assert bool(add_edge_list or remove_edge_list) == moved
+        helper.modify_graph(g, add_edge_list, remove_edge_list, [], [])
+        nodes = state['nodes']
+        expected = brute_force_pairs(state['points'].tolist(), state['ranges'].tolist())
+        assert set(g.edges()) == set((nodes[i], nodes[j]) for i, j in expected)
+    # Device 7 is back where it started, device 3 stays moved
+    assert ('3', '2') not in original and ('3', '2') in set(g.edges())
+
+def test_random_waypoints_follow_random_seed():
+    import mobility
+    points = []
+    for attempt in range(2):
+        g = nx.DiGraph()
+        g.add_nodes_from(range(20))
+        random.seed(3)
+        mobility.track_devices(g, range(20), [[i, i % 5] for i in range(20)], [2.0] * 20,
+                               speed=1.5, max_pause=2)
+        for round_num in range(1, 6):
+            mobility.move_step(g, round_num, [], [])
+        points.append(g.graph[mobility.MOBILITY_KEY]['points'].tolist())
+    assert points[0] == points[1]
+
+def test_driver_skips_simulation_below_reachability_bound():
+    saved = (config.csv_file, config.graph_disconnect_level_threshold, config.current_graph_information_spread,
+             config.graph_information_spread, config.all_nodes_removed, config.finished_graphs,
+             config.reachability_spread_bound)
+    config.csv_file = 'iot/test.csv'
+    config.graph_disconnect_level_threshold = 0.6
+    config.current_graph_information_spread = 1.0
+    config.graph_information_spread = []
+    config.all_nodes_removed = []
+    config.finished_graphs = []
+    try:
+        config.simulation_driver()
+        # 29 of the 49 device pairs can ever reach each other
+        assert config.graph_information_spread == []
+        assert config.reachability_spread_bound == 29 / 49.0
+        assert config.finished_graphs == [] and config.all_nodes_removed == []
+    finally:
+        (config.csv_file, config.graph_disconnect_level_threshold, config.current_graph_information_spread,
+         config.graph_information_spread, config.all_nodes_removed, config.finished_graphs,
+         config.reachability_spread_bound) = saved
+
+def test_percolation_curve_of_path():
+    import robustness
+    g = nx.path_graph(5)
+    curve = robustness.percolation_curve(g, [2, 0, 1, 3, 4])
+    assert curve[0] == (0.0, 1.0, 1.0)
+    assert curve[1] == (0.2, 0.4, 0.5)
+    assert curve[2] == (0.4, 0.4, 5 / 9.0)
+    assert curve[4] == (0.8, 0.2, 1.0)
+    assert curve[5] == (1.0, 0.0, 0.0)
+    assert robustness.critical_fraction(curve, 0.6) == 0.2
+    assert robustness.removal_order(g, 'degree')[:3] == [1, 2, 3]
+    assert set(robustness.removal_curves(g)) == set(['random', 'degree'])
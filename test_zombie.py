@@ -4,6 +4,7 @@ import pytest
 
 import simhelper as helper
 import adv_zombie_config as config
+import make_graph
 
 test_food_amount = 50000
 test_water_amount = 10000
@@ -169,4 +170,54 @@ def test_dehydration_damage():
     config.after_round_end(g, [], [], [], [], 1, 'run_name')
     
     assert g.node['1']['health'] < 100
-    assert g.node['2']['health'] < 100
\ No newline at end of file
+    assert g.node['2']['health'] < 100
+
+'''
+Test that a streamed zombie graph is a seeded G(n,m) graph with the zombie schema,
+the same whether it is generated serially or by a pool.
+'''
+def test_streamed_zombie_graph(tmpdir):
+    paths = [str(tmpdir.join('serial.graphml')), str(tmpdir.join('pool.graphml'))]
+    for path, processes in zip(paths, [1, 2]):
+        make_graph.stream_gnm_graphml(path, 200, 600, 11, make_graph.ZOMBIE_NODE_SCHEMA,
+                                      make_graph.ZOMBIE_EDGE_SCHEMA, processes=processes, chunk_size=64)
+    assert open(paths[0]).read() == open(paths[1]).read()
+    g = nx.read_graphml(paths[0])
+    assert len(g) == 200 and g.number_of_edges() == 600
+    for attr, distribution, params in make_graph.ZOMBIE_NODE_SCHEMA:
+        values = nx.get_node_attributes(g, attr).values()
+        assert len(values) == 200
+        assert min(values) >= params['low'] and max(values) <= params['high']
+    assert set(nx.get_edge_attributes(g, 'weight').values()) <= set(range(1, 11))
+
+def test_sample_distinct():
+    rng = helper.make_rng(3)
+    for size, count in [(10**12, 1000), (100, 70), (5, 5), (5, 0)]:
+        chosen = make_graph.sample_distinct(rng, size, count)
+        assert len(set(chosen.tolist())) == count
+        assert list(chosen) == sorted(chosen) and (count == 0 or 0 <= chosen[0] <= chosen[-1] < size)
+
+def test_streamed_chung_lu_and_block_graphs(tmpdir):
+    weights = make_graph.power_law_weights(2000, 6)
+    assert abs(weights.mean() - 6) < 1e-9 and weights.max() <= (2000 * 6) ** 0.5 + 1e-6
+    paths = [str(tmpdir.join('serial.graphml')), str(tmpdir.join('pool.graphml'))]
+    for path, processes in zip(paths, [1, 2]):
+        make_graph.stream_chung_lu_graphml(path, weights, 4, make_graph.ZOMBIE_NODE_SCHEMA,
+                                           make_graph.ZOMBIE_EDGE_SCHEMA, processes=processes, chunk_size=500)
+    assert open(paths[0]).read() == open(paths[1]).read()
+    g = nx.read_graphml(paths[0])
+    assert len(g) == 2000 and g.number_of_selfloops() == 0
+    assert 5 < 2.0 * g.number_of_edges() / len(g) < 7
+    assert g.degree('0') > 10 * g.degree('1999') and set(g.node['5']) == set(g.node['1500'])
+
+    for path, processes in zip(paths, [1, 2]):
+        make_graph.stream_sbm_graphml(path, [30, 40], [[1.0, 0.0], [0.0, 0.1]], 4, [],
+                                      make_graph.GOSSIP_EDGE_SCHEMA, 'grade', ['freshman', 'senior'],
+                                      processes=processes, chunk_size=50)
+    assert open(paths[0]).read() == open(paths[1]).read()
+    g = nx.read_graphml(paths[0])
+    grades = nx.get_node_attributes(g, 'grade')
+    assert sorted(grades.values()) == ['freshman'] * 30 + ['senior'] * 40
+    assert all(grades[u] == grades[v] for u, v in g.edges())
+    assert nx.number_of_edges(g.subgraph(str(i) for i in range(30))) == 30 * 29 / 2
+    assert set(nx.get_edge_attributes(g, 'weight').values()) <= set(range(1, 11))